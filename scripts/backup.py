@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Backup and restore bot state
+
+    python scripts/backup.py                 # incremental backup into settings.backup_dir
+    python scripts/backup.py --list          # list manifests
+    python scripts/backup.py --restore DIR   # restore the latest backup under DIR and verify it
+
+Suitable for cron; the bot can also run backups itself when
+BACKUP_INTERVAL_SECONDS is set.
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.services.backup_service import BackupService, BackupError
+
+def main():
+    parser = argparse.ArgumentParser(description="Backup and restore bot state")
+    parser.add_argument("--restore", metavar="DIR", help="restore into DIR instead of backing up")
+    parser.add_argument("--manifest", help="manifest to restore (default: latest)")
+    parser.add_argument("--list", action="store_true", help="list available backups")
+    args = parser.parse_args()
+
+    service = BackupService()
+
+    if args.list:
+        for path in service.manifests():
+            manifest = service.load_manifest(path)
+            print(f"{path.name}: {len(manifest['files'])} files, archive {manifest['archive'] or '-'}")
+        return
+
+    if args.restore:
+        try:
+            manifest = Path(args.manifest) if args.manifest else None
+            restored = service.restore(args.restore, manifest)
+        except BackupError as e:
+            print(f"❌ Restore failed: {e}")
+            sys.exit(1)
+        print(f"✅ Restored and verified {len(restored)} files into {args.restore}")
+        return
+
+    # Stay out of the bot's way when run from cron on the same host
+    if hasattr(os, "nice"):
+        os.nice(10)
+    manifest = service.run_backup()
+    print(f"✅ Backup written: {manifest['archive'] or 'no changes'}")
+
+if __name__ == "__main__":
+    main()
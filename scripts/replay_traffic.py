@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Replay recorded traffic against this build with a fake Gemini and Telegram
+
+    python scripts/replay_traffic.py data/traces/trace-*.jsonl                  # recorded pace
+    python scripts/replay_traffic.py data/traces/*.jsonl --speed 10             # 10x faster
+    python scripts/replay_traffic.py data/traces/*.jsonl --speed 0 \\
+        --report new.json --baseline old.json --max-regression 10               # as fast as possible, gate on p95
+
+Traces are written by the bot when traffic_record_enabled is set. Model
+calls take their recorded latency (times --model-scale), so the report
+measures the bot's own queueing and overhead around them.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.core.replay import TraceReplayer, compare, load_trace, write_report
+
+def print_report(report: dict):
+    print(f"Replayed {report['handled']}/{report['updates']} updates from {report['chats']} chats "
+          f"in {report['wall_seconds']}s ({report['model_calls']} model calls)")
+    print(f"{'group':<10} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name, row in report["latency_ms"].items():
+        print(f"{name:<10} {row['count']:>6} {row['p50']:>9} {row['p95']:>9} {row['p99']:>9} {row['max']:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded traffic traces")
+    parser.add_argument("traces", nargs="+", help="trace-YYYYMMDD.jsonl files")
+    parser.add_argument("--speed", type=float, default=1.0, help="pace multiplier; 0 = as fast as possible")
+    parser.add_argument("--model-scale", type=float, default=1.0, help="multiplier on recorded model latency")
+    parser.add_argument("--seed", type=int, default=0, help="seed for synthesized text")
+    parser.add_argument("--report", help="write the JSON report here")
+    parser.add_argument("--baseline", help="earlier report to compare p95 against")
+    parser.add_argument("--max-regression", type=float, help="exit 1 if overall p95 grew by more than this %%")
+    args = parser.parse_args()
+
+    updates, calls = load_trace(args.traces)
+    if not updates:
+        print("❌ No updates in the given traces")
+        sys.exit(1)
+
+    report = asyncio.run(TraceReplayer(updates, calls, args.speed, args.model_scale, args.seed).run())
+    print_report(report)
+    if args.report:
+        write_report(report, args.report)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\np95 vs {args.baseline}:")
+        for name, old, new, change in compare(baseline, report):
+            print(f"{name:<10} {old:>9} -> {new:>9} ms ({change:+.1f}%)")
+        overall = {name: change for name, _, _, change in compare(baseline, report)}.get("all")
+        if args.max_regression is not None and overall is not None and overall > args.max_regression:
+            print(f"❌ Overall p95 regressed {overall:+.1f}% (limit {args.max_regression}%)")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
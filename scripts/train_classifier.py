@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Train the local category classifier
+
+    python scripts/train_classifier.py                # train on all samples, write settings.category_model_path
+    python scripts/train_classifier.py --benchmark    # k-fold accuracy vs the keyword rules, batch latency
+
+Samples are label<TAB>headline lines (settings.category_samples_path).
+The bot picks the model up on its next start.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.config.settings import settings
+from src.services.category_classifier import DEFAULT_DIMENSIONS, CategoryModel, load_samples
+from src.services.category_detector import CategoryDetector
+
+def benchmark(samples, dimensions: int, alpha: float, folds: int, batch: int):
+    rules = CategoryDetector()
+    shuffled = list(samples)
+    random.Random(0).shuffle(shuffled)
+
+    model_correct = rules_correct = 0
+    for fold in range(folds):
+        test = shuffled[fold::folds]
+        train = [sample for i, sample in enumerate(shuffled) if i % folds != fold]
+        model = CategoryModel.train(train, dimensions, alpha)
+        predictions = model.predict([text for _, text in test])
+        model_correct += sum(label == predicted for (label, _), (predicted, _) in zip(test, predictions))
+        rules_correct += sum(label == rules.keyword_category(text) for label, text in test)
+    print(f"{folds}-fold accuracy: model {model_correct / len(samples):.1%}, "
+          f"keyword rules {rules_correct / len(samples):.1%} ({len(samples)} samples)")
+
+    model = CategoryModel.train(samples, dimensions, alpha)
+    texts = [text for _, text in samples] * (batch // len(samples) + 1)
+    texts = texts[:batch]
+    started = time.perf_counter()
+    model.predict(texts)
+    elapsed = time.perf_counter() - started
+    print(f"Batch of {batch}: {elapsed * 1000:.1f} ms ({elapsed / batch * 1e6:.0f} µs per headline)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local category classifier")
+    parser.add_argument("--samples", default=settings.category_samples_path, help="label<TAB>text file")
+    parser.add_argument("--output", default=settings.category_model_path, help="model file to write")
+    parser.add_argument("--dimensions", type=int, default=DEFAULT_DIMENSIONS, help="hashed feature buckets")
+    parser.add_argument("--alpha", type=float, default=0.05, help="additive smoothing")
+    parser.add_argument("--benchmark", action="store_true", help="evaluate instead of writing a model")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=500, help="headlines in the latency batch")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    if not samples:
+        print(f"❌ No samples in {args.samples}")
+        sys.exit(1)
+
+    if args.benchmark:
+        benchmark(samples, args.dimensions, args.alpha, args.folds, args.batch)
+        return
+
+    model = CategoryModel.train(samples, args.dimensions, args.alpha)
+    model.save(args.output)
+    print(f"✅ Trained on {len(samples)} samples, {len(model.labels)} labels -> {args.output}")
+
+if __name__ == "__main__":
+    main()
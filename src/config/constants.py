@@ -12,6 +12,13 @@ MENU_SPEED50 = "⚡ ಸ್ಪೀಡ್ 50 (ತ್ವರಿತ ಸುದ್ದಿ
 MENU_SEGMENT = "🎬 ಕಸ್ಟಮ್ ಸೆಗ್ಮೆಂಟ್"
 MENU_STOP = "❌ ನಿಲ್ಲಿಸಿ"
 
+# Translation targets, keyed like the files in localization/
+TRANSLATION_LANGUAGES = {
+    "english": "English",
+    "hindi": "Hindi (हिन्दी)",
+    "telugu": "Telugu (తెలుగు)",
+}
+
 # Trusted Sources
 TRUSTED_SOURCES = [
     "thehindu.com", "indianexpress.com", "hindustantimes.com",
@@ -25,4 +32,28 @@ TRUSTED_SOURCES = [
 
 # File Extensions
 ALLOWED_DOCUMENT_EXTENSIONS = ['.txt', '.docx', '.doc']
-ALLOWED_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif']
\ No newline at end of file
+ALLOWED_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif']
+
+# Model Routes (evaluated in order, first match wins)
+# flows: prompt classes served ("*" matches any); max_input_chars / max_target_words
+# are upper bounds on prompt length and requested output length. Costs are USD per 1k tokens.
+MODEL_ROUTES = [
+    {"name": "quick", "flows": ["speed50", "av"], "model": "models/gemini-1.5-flash-8b",
+     "max_output_tokens": 1024, "temperature": 0.7, "max_input_chars": 6000,
+     "cost_per_1k_input": 0.0000375, "cost_per_1k_output": 0.00015},
+    {"name": "package", "flows": ["pkg"], "model": "models/gemini-1.5-flash",
+     "max_output_tokens": 4096, "temperature": 0.7,
+     "cost_per_1k_input": 0.000075, "cost_per_1k_output": 0.0003},
+    {"name": "segment_short", "flows": ["segment"], "model": "models/gemini-1.5-flash",
+     "max_output_tokens": 4096, "temperature": 0.8, "max_target_words": 750,
+     "cost_per_1k_input": 0.000075, "cost_per_1k_output": 0.0003},
+    {"name": "segment_long", "flows": ["segment"], "model": "models/gemini-1.5-pro",
+     "max_output_tokens": 8192, "temperature": 0.8,
+     "cost_per_1k_input": 0.00125, "cost_per_1k_output": 0.005},
+    {"name": "translation", "flows": ["translation"], "model": "models/gemini-1.5-flash",
+     "max_output_tokens": 4096, "temperature": 0.2,
+     "cost_per_1k_input": 0.000075, "cost_per_1k_output": 0.0003},
+    {"name": "default", "flows": ["*"], "model": "models/gemini-1.5-flash",
+     "max_output_tokens": 4096, "temperature": 0.7,
+     "cost_per_1k_input": 0.000075, "cost_per_1k_output": 0.0003},
+]
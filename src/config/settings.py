@@ -2,7 +2,7 @@
 Configuration management with environment-specific settings
 """
 from pydantic import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -12,12 +12,27 @@ class Settings(BaseSettings):
     
     # AI Configuration
     gemini_api_key: str
+    gemini_fallback_model: str = "models/gemini-1.5-flash-8b"
+    model_routes_file: str = ""
+    enable_context_cache: bool = True
+    context_cache_ttl_seconds: int = 3600
+    context_cache_refresh_margin_seconds: int = 300
+    context_cache_min_tokens: int = 32768  # the API rejects smaller prefixes; they are sent inline
+    ai_max_workers: int = 8
+    ai_hedge_enabled: bool = True
+    ai_hedge_percentile: float = 95
+    ai_hedge_min_samples: int = 20
+    ai_breaker_failure_ratio: float = 0.5
+    ai_breaker_min_calls: int = 10
+    ai_breaker_window: int = 20
+    ai_breaker_reset_seconds: int = 30
     
     # Database (SQLite for local development)
     database_url: str = "sqlite:///data/bot.db"
     
     # Features
     enable_web_search: bool = True
+    enable_article_fetch: bool = True
     enable_analytics: bool = True
     max_file_size_mb: int = 10
     
@@ -25,13 +40,137 @@ class Settings(BaseSettings):
     uploads_dir: str = "data/uploads"
     exports_dir: str = "data/exports"
     templates_dir: str = "data/templates"
+
+    # Script exports: "txt" or "docx" (styled from docx_template, python-docx's default if absent)
+    export_format: str = "txt"
+    docx_template: str = "script_template.docx"  # under templates_dir
+
+    # Article retrieval for web research
+    article_cache_dir: str = "data/http_cache"
+    article_cache_fresh_seconds: int = 1800  # serve without revalidating for this long
+    article_fetch_count: int = 3
+    article_per_host_connections: int = 2
+    article_max_bytes: int = 1024 * 1024
+    article_max_chars: int = 4000
+    article_timeout_seconds: float = 8.0
+    search_cache_size: int = 256
+    search_cache_ttl_seconds: int = 4 * 3600  # live searches; pre-warmed hits last until the next pre-warm
+    
+    # Scheduled research pre-warm for recurring segment topics
+    prewarm_times: List[str] = ["06:30", "16:30"]  # HH:MM server local time; empty disables
+    prewarm_topics: List[str] = []  # always refreshed, ahead of the history's top topics
+    prewarm_top_n: int = 10
+    prewarm_history_days: int = 7
+    prewarm_budget_seconds: float = 180.0
+    prewarm_pause_seconds: float = 2.0  # between topics, and while generations are running
+    
+    # Export retention
+    export_max_age_seconds: int = 86400
+    export_max_total_bytes: int = 200 * 1024 * 1024
+    export_max_files: int = 500
+    export_min_age_seconds: int = 300  # never touch files still being sent
+    export_gzip_retained: bool = False
+    export_sweep_interval_seconds: int = 900
+    
+    # Backups
+    backup_dir: str = "data/backups"
+    backup_keep: int = 7
+    backup_interval_seconds: int = 0  # 0 = run scripts/backup.py from cron instead
+    backup_pages_per_step: int = 256
+    backup_step_sleep_seconds: float = 0.05
     
     # Rate Limiting
     rate_limit_per_minute: int = 20
     
+    # Translation (empty list disables the multi-language export)
+    translation_languages: List[str] = []
+    translation_max_chunk_chars: int = 3000
+    translation_concurrency: int = 6
+    translation_cache_size: int = 512
+    
+    # Token accounting (enable_analytics) and per-chat daily quotas (0 = unlimited)
+    usage_daily_token_quota: int = 0
+    usage_quota_overrides: Dict[int, int] = {}  # chat_id -> daily tokens
+    usage_flush_batch: int = 200  # pending (day, chat, flow) rows that force a flush
+    usage_flush_interval_seconds: int = 60
+    
+    # Category classifier (scripts/train_classifier.py writes the model)
+    category_model_path: str = "data/models/category.bin"
+    category_samples_path: str = "data/samples/categories.tsv"
+    category_min_confidence: float = 0.4  # below this the keyword rules decide
+    
+    # Near-match response reuse (flows without a threshold never reuse)
+    semantic_cache_size: int = 2000
+    semantic_cache_thresholds: Dict[str, float] = {"av": 0.93, "pkg": 0.93, "speed50": 0.95}
+    
+    # Segment length verification
+    segment_length_tolerance: float = 0.85  # accept output within 15% under the word target
+    segment_continuation_attempts: int = 2
+    
+    # Concurrency
+    concurrent_updates: int = 64  # updates handled at once; one chat's updates stay in order
+    interactive_concurrency: int = 8
+    batch_concurrency: int = 2
+    
+    # Graceful drain and checkpoints of unfinished work
+    drain_deadline_seconds: float = 60.0  # then batches stop at the next item
+    checkpoint_dir: str = "data/checkpoints"
+    checkpoint_save_interval_seconds: float = 5.0
+    checkpoint_max_age_seconds: int = 86400  # older checkpoints are not resumed
+    
+    # Traffic recording for replay (scripts/replay_traffic.py)
+    traffic_record_enabled: bool = False
+    traffic_record_dir: str = "data/traces"
+    traffic_record_salt: str = ""  # empty: chat aliases change on every restart
+    traffic_record_flush_every: int = 50
+    
+    # Health and warm-up
+    health_host: str = "0.0.0.0"
+    health_port: int = 8000
+    warmup_timeout_seconds: float = 20.0
+    warmup_ping_gemini: bool = True  # disable to warm up offline
+    
+    # Scale-out (several replicas sharing state_store_url)
+    scale_out_enabled: bool = False
+    replica_id: str = ""  # default: hostname-pid
+    state_store_url: str = "sqlite:///data/state.db"
+    shard_count: int = 64
+    lease_ttl_seconds: float = 15.0
+    rebalance_interval_seconds: float = 5.0
+    update_poll_interval_seconds: float = 0.2
+    update_claim_batch: int = 50
+    
+    # Outbound Telegram sends
+    send_global_rate: float = 25.0  # messages/second across all chats
+    send_chat_rate: float = 1.0  # messages/second per chat
+    send_chat_burst: int = 3
+    send_max_retries: int = 3
+    send_global_block_threshold_seconds: float = 30.0
+    
+    # Admin
+    admin_chat_ids: List[int] = []
+    
+    # Sessions
+    session_idle_timeout_seconds: int = 1800
+    session_sweep_interval_seconds: int = 300
+    max_buffered_headlines: int = 500
+    max_buffered_headline_chars: int = 200000
+    speed50_eager_generation: bool = True  # start each pasted headline before "done"
+    
+    # Pre-flight input validation
+    input_min_chars: int = 40
+    input_max_chars: int = 8000
+    input_min_script_ratio: float = 0.5  # Kannada + Latin letters over all non-space characters
+    input_repeat_window_seconds: int = 600
+    headline_min_chars: int = 10
+    
     # Logging
     log_level: str = "INFO"
     log_file: str = "data/bot.log"
+    log_format: str = "text"  # "text" or "json"
+    log_queue_size: int = 10000
+    log_sample_burst: int = 10
+    log_sample_window_seconds: int = 60
     
     class Config:
         env_file = ".env"
@@ -3,38 +3,71 @@ Main bot orchestration with improved error handling and monitoring
 """
 import asyncio
 import logging
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler
+import signal
+import time
+from telegram.ext import Application, CommandHandler, MessageHandler, TypeHandler, filters, ConversationHandler
 from telegram import Update
 
 from src.config.settings import settings
 from src.config.constants import *
-from src.utils.logger import setup_logging, get_logger
+from src.utils.logger import setup_logging, stop_logging, get_logger
+from src.core.conversation_handler import session_manager
+from src.core.drain import drain_controller
+from src.core.middleware import chat_rate_limiter, traffic_recorder
+from src.core.outbox import outbox
+from src.core.health import OK as HEALTH_OK, HealthServer, health_state
+from src.core.lanes import ChatOrderedUpdateProcessor
+from src.core.replicas import ReplicaCoordinator, ReplicaRunner
+from src.services.state_store import create_state_store
 from src.handlers.start_handler import StartHandler
 from src.handlers.news_handler import NewsHandler
 from src.handlers.speed50_handler import Speed50Handler
 from src.handlers.segment_handler import SegmentHandler
+from src.handlers.admin_handler import AdminHandler, is_admin_command
+from src.services.ai_service import add_call_listener
+from src.services.backup_service import BackupService
+from src.services.prewarm_service import ResearchPrewarmer, prewarm_times
+from src.services.usage_service import usage_ledger
+from src.utils.file_manager import FileManager
 
 class ClaudeNewsBot:
     def __init__(self):
         self.settings = settings
         self.logger = get_logger(__name__)
         self.app = None
+        self.replica_runner = None
+        self.session_manager = session_manager
+        self.file_manager = FileManager()
+        self.backup_service = BackupService()
         
         # Initialize handlers
         self.start_handler = StartHandler()
         self.news_handler = NewsHandler()
         self.speed50_handler = Speed50Handler()
         self.segment_handler = SegmentHandler()
+        self.admin_handler = AdminHandler()
+        self.research_prewarmer = ResearchPrewarmer(self.segment_handler.segment_service)
         
-    async def initialize(self):
-        """Initialize bot with all handlers and middleware"""
+    async def initialize(self, request=None):
+        """
+        Initialize bot with all handlers and middleware. request replaces the
+        Telegram HTTP transport (the replay harness passes a fake API).
+        """
         try:
             # Setup logging
             setup_logging()
             self.logger.info("Initializing Claude News Bot...")
             
-            # Create application
-            self.app = Application.builder().token(self.settings.telegram_token).build()
+            # Create application; in scale-out mode polling is owned by the ReplicaRunner.
+            # Chats are handled concurrently so one waiting generation can't stall the bot.
+            builder = Application.builder().token(self.settings.telegram_token).concurrent_updates(
+                ChatOrderedUpdateProcessor(self.settings.concurrent_updates, unordered=is_admin_command)
+            )
+            if self.settings.scale_out_enabled:
+                builder = builder.updater(None)
+            if request is not None:
+                builder = builder.request(request).get_updates_request(request)
+            self.app = builder.build()
             
             # Setup conversation handler
             conv_handler = ConversationHandler(
@@ -55,35 +88,194 @@ class ClaudeNewsBot:
                     SEGMENT_Q4: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.segment_handler.handle_segment_q4)],
                     SEGMENT_Q5: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.segment_handler.handle_segment_q5)],
                     SEGMENT_DURATION: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.segment_handler.handle_segment_duration)],
-                    SEGMENT_PROCESSING: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.segment_handler.process_segment)]
+                    SEGMENT_PROCESSING: [MessageHandler(filters.TEXT & ~filters.COMMAND, self.segment_handler.process_segment)],
+                    ConversationHandler.TIMEOUT: [TypeHandler(Update, self.session_manager.handle_timeout)]
                 },
-                fallbacks=[CommandHandler("start", self.start_handler.start)]
+                fallbacks=[CommandHandler("start", self.start_handler.start)],
+                conversation_timeout=self.settings.session_idle_timeout_seconds
             )
             
             # Add handlers
             self.app.add_handler(conv_handler)
             
+            # Over-limit updates get a "slow down" reply and stop here, in every mode
+            self.app.add_handler(TypeHandler(Update, chat_rate_limiter.check), group=-2)
+            
+            # Traffic recorder wraps the conversation handler: arrival in group -1, completion in group 1
+            if self.settings.traffic_record_enabled:
+                self.app.add_handler(TypeHandler(Update, traffic_recorder.before), group=-1)
+                self.app.add_handler(TypeHandler(Update, traffic_recorder.after), group=1)
+                add_call_listener(traffic_recorder.record_model_call)
+            
+            # Admin console (gated by settings.admin_chat_ids)
+            self.app.add_handler(CommandHandler("stats", self.admin_handler.stats))
+            self.app.add_handler(CommandHandler("memtop", self.admin_handler.memtop))
+            self.app.add_handler(CommandHandler("flushcache", self.admin_handler.flush_cache))
+            self.app.add_handler(CommandHandler("pause", self.admin_handler.pause))
+            self.app.add_handler(CommandHandler("resume", self.admin_handler.resume))
+            self.app.add_handler(CommandHandler("concurrency", self.admin_handler.concurrency))
+            
+            # Periodically expire abandoned sessions
+            if self.app.job_queue:
+                self.app.job_queue.run_repeating(
+                    self.session_manager.sweep_job,
+                    interval=self.settings.session_sweep_interval_seconds,
+                    name="session_sweep"
+                )
+                # Enforce retention on data/exports, including files left by failed sends
+                self.app.job_queue.run_repeating(
+                    self.file_manager.sweep_job,
+                    interval=self.settings.export_sweep_interval_seconds,
+                    first=self.settings.export_sweep_interval_seconds,
+                    name="export_sweep"
+                )
+                # Batch token usage into SQLite
+                self.app.job_queue.run_repeating(
+                    usage_ledger.flush_job,
+                    interval=self.settings.usage_flush_interval_seconds,
+                    first=self.settings.usage_flush_interval_seconds,
+                    name="usage_flush"
+                )
+                if self.settings.traffic_record_enabled:
+                    self.app.job_queue.run_repeating(
+                        traffic_recorder.flush_job, interval=30, first=30, name="traffic_flush"
+                    )
+                # Refresh research for recurring segment topics ahead of peak hours
+                for at in prewarm_times():
+                    self.app.job_queue.run_daily(
+                        self.research_prewarmer.prewarm_job, time=at, name=f"research_prewarm_{at:%H%M}"
+                    )
+                if self.settings.backup_interval_seconds > 0:
+                    self.app.job_queue.run_repeating(
+                        self.backup_service.backup_job,
+                        interval=self.settings.backup_interval_seconds,
+                        first=self.settings.backup_interval_seconds,
+                        name="backup"
+                    )
+            
             self.logger.info("Bot initialized successfully!")
             
         except Exception as e:
             self.logger.error(f"Failed to initialize bot: {e}")
             raise
         
+    # Warm-up: each step runs in a worker thread and reports to the readiness endpoint
+    
+    def _warm_modules(self):
+        """docx and the HTML parser load on first use otherwise"""
+        from bs4 import BeautifulSoup
+        import docx  # noqa: F401
+        BeautifulSoup("<p></p>", "html.parser")
+    
+    def _warm_templates(self):
+        """Prompt prefixes and the keyword tables used for routing and categories"""
+        from src.services.prompt_cache import prompt_cache
+        for name in ("pkg", "speed50", "segment"):
+            if not prompt_cache.prefix(name):
+                raise RuntimeError(f"prompt prefix '{name}' is not registered")
+        # Loads the trained category model, if one has been built
+        self.news_handler.category_detector.detect_category("", "ರಾಜಕೀಯ")
+        self.segment_handler.segment_service.classify_topic_type("warm-up")
+    
+    def _warm_gemini(self):
+        """Build every model, then one cheap call to open the shared gRPC channel"""
+        ai_services = (
+            self.news_handler.ai_service,
+            self.speed50_handler.ai_service,
+            self.segment_handler.ai_service,
+            self.segment_handler.segment_service.ai_service,
+        )
+        for ai_service in ai_services:
+            ai_service.warm_up()
+        if self.settings.warmup_ping_gemini:
+            ai_services[0].ping()
+    
+    def _warm_http(self):
+        """Open the pooled connection used for web search"""
+        if self.settings.enable_web_search:
+            self.segment_handler.segment_service.warm_up_http()
+    
+    async def _warm_step(self, name: str, func):
+        try:
+            await asyncio.wait_for(asyncio.to_thread(func), timeout=self.settings.warmup_timeout_seconds)
+            health_state.mark(name, HEALTH_OK)
+        except Exception as e:
+            # Not fatal: the service initializes on first use instead
+            health_state.mark(name, f"error: {e or type(e).__name__}")
+            self.logger.warning("Warm-up step %s failed: %s", name, e or type(e).__name__)
+    
+    async def warm_up(self):
+        """Run every warm-up step concurrently before polling starts"""
+        steps = {
+            "modules": self._warm_modules,
+            "templates": self._warm_templates,
+            "gemini": self._warm_gemini,
+            "http": self._warm_http,
+        }
+        for name in steps:
+            health_state.register(name)
+        started = time.monotonic()
+        await asyncio.gather(*(self._warm_step(name, func) for name, func in steps.items()))
+        self.logger.info("Warm-up finished in %.2fs: %s", time.monotonic() - started, health_state.checks)
+    
     async def start(self):
-        """Start bot with graceful shutdown handling"""
+        """Warm up, then poll until SIGINT/SIGTERM"""
+        health_server = HealthServer(health_state)
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        
         try:
+            # Liveness is served from the start; readiness waits for warm-up and polling
+            await health_server.start()
             self.logger.info("Starting Claude News Bot...")
-            await self.app.run_polling(allowed_updates=Update.ALL_TYPES)
-        except KeyboardInterrupt:
-            self.logger.info("Bot stopped by user")
+            await self.warm_up()
+            await self.app.initialize()
+            await self.app.start()
+            if self.settings.scale_out_enabled:
+                store = create_state_store()
+                usage_ledger.attach_store(store)
+                chat_rate_limiter.attach_store(store)
+                self.replica_runner = ReplicaRunner(self.app, ReplicaCoordinator(store), store)
+                await self.replica_runner.start()
+                self.logger.info("Replica started: %s", self.replica_runner.coordinator.stats())
+            else:
+                await self.app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            health_state.accepting = True
+            await drain_controller.resume(self.app.bot, self.app.create_task)
+            await stop_event.wait()
+            self.logger.info("Bot stopped by signal")
         except Exception as e:
             self.logger.error(f"Bot error: {e}")
             raise
         finally:
+            health_state.accepting = False
             await self.shutdown()
+            await health_server.stop()
     
     async def shutdown(self):
-        """Graceful shutdown"""
+        """
+        Graceful shutdown: stop taking updates, let in-flight generations
+        finish up to drain_deadline_seconds, checkpoint whatever is left for
+        the next start, then stop the application.
+        """
         self.logger.info("Shutting down bot...")
+        drain_controller.begin()
+        if self.replica_runner:
+            await self.replica_runner.stop()
+            self.replica_runner = None
         if self.app:
-            await self.app.shutdown()
\ No newline at end of file
+            if self.app.updater and self.app.updater.running:
+                await self.app.updater.stop()
+            await drain_controller.drain()
+            if self.app.running:
+                await self.app.stop()
+            await self.app.shutdown()
+        await outbox.close()
+        await asyncio.to_thread(usage_ledger.flush)
+        await asyncio.to_thread(traffic_recorder.flush)
+        stop_logging()
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""
+Conversation session management with idle expiry
+"""
+import time
+from typing import Dict, Optional
+
+from telegram.ext import ContextTypes
+
+from src.config.settings import settings
+from src.models.user import ChatSession
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class SessionManager:
+    """Holds one ChatSession per chat and expires sessions left idle"""
+
+    def __init__(self, idle_timeout: Optional[int] = None):
+        self.idle_timeout = idle_timeout or settings.session_idle_timeout_seconds
+        self._sessions: Dict[int, ChatSession] = {}
+        self.expired_total = 0
+        self.logger = logger
+
+    @property
+    def live_sessions(self) -> int:
+        """Number of sessions currently held in memory"""
+        return len(self._sessions)
+
+    def get(self, chat_id: int) -> ChatSession:
+        """Return the chat's session, creating it if needed, and mark it active"""
+        session = self._sessions.get(chat_id)
+        if session is None:
+            session = ChatSession(chat_id)
+            self._sessions[chat_id] = session
+        else:
+            session.touch()
+        return session
+
+    def peek(self, chat_id: int) -> Optional[ChatSession]:
+        """Return the chat's session without creating or touching it"""
+        return self._sessions.get(chat_id)
+
+    def end(self, chat_id: int):
+        """Discard the chat's session"""
+        session = self._sessions.pop(chat_id, None)
+        if session is not None:
+            session.clear()
+
+    def expire_idle(self, now: Optional[float] = None) -> int:
+        """Drop sessions idle longer than the timeout. Returns how many were removed."""
+        now = time.monotonic() if now is None else now
+        stale = [chat_id for chat_id, session in self._sessions.items()
+                 if session.idle_for(now) > self.idle_timeout]
+        for chat_id in stale:
+            self.end(chat_id)
+        self.expired_total += len(stale)
+        return len(stale)
+
+    async def sweep_job(self, context: ContextTypes.DEFAULT_TYPE):
+        """Job queue callback that expires idle sessions and logs the live count"""
+        expired = self.expire_idle()
+        self.logger.info(f"Sessions: live={self.live_sessions} expired={expired}")
+
+    async def handle_timeout(self, update, context: ContextTypes.DEFAULT_TYPE):
+        """ConversationHandler.TIMEOUT callback"""
+        chat = getattr(update, "effective_chat", None)
+        if chat is not None:
+            self.end(chat.id)
+        if context.user_data is not None:
+            context.user_data.clear()
+
+# Global session manager instance
+session_manager = SessionManager()
@@ -0,0 +1,167 @@
+"""
+Graceful drain on shutdown and checkpoints of unfinished generation work
+"""
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from src.config.settings import settings
+from src.core.lanes import generation_lanes
+from src.models.checkpoint import Checkpoint
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+Resumer = Callable[[object, Checkpoint], Awaitable[None]]
+
+DRAIN_MESSAGE = (
+    "⏸ ಬಾಟ್ ನವೀಕರಣಗೊಳ್ಳುತ್ತಿದೆ. ನಿಮ್ಮ ಕೆಲಸ ಉಳಿಸಲಾಗಿದೆ; "
+    "ಫಲಿತಾಂಶಗಳನ್ನು ಕೆಲವೇ ಕ್ಷಣಗಳಲ್ಲಿ ಇಲ್ಲಿಯೇ ಕಳುಹಿಸಲಾಗುತ್ತದೆ."
+)
+RESUME_MESSAGE = "▶️ ಉಳಿಸಿದ ಕೆಲಸ ಮುಂದುವರಿಸಲಾಗುತ್ತಿದೆ..."
+
+class CheckpointStore:
+    """
+    One JSON file per job under checkpoint_dir, replaced atomically on
+    every save. Loading for resume claims each file by renaming it first, so
+    two processes sharing the directory never resume the same job.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_age: Optional[float] = None):
+        self.directory = Path(directory or settings.checkpoint_dir)
+        self.max_age = settings.checkpoint_max_age_seconds if max_age is None else max_age
+
+    def _path(self, job_id: str) -> Path:
+        return self.directory / f"{job_id}.json"
+
+    def save(self, checkpoint: Checkpoint):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(checkpoint.job_id)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(checkpoint.to_dict(), f, ensure_ascii=False)
+        tmp.replace(path)
+
+    def delete(self, checkpoint: Checkpoint):
+        self._path(checkpoint.job_id).unlink(missing_ok=True)
+
+    def pending(self) -> List[Path]:
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob("*.json"))
+
+    def claim_all(self, now: Optional[float] = None) -> List[Checkpoint]:
+        """Take every saved checkpoint off disk, oldest first; stale and unreadable ones are dropped"""
+        now = time.time() if now is None else now
+        claimed = []
+        for path in self.pending():
+            claim = path.with_suffix(".claimed")
+            try:
+                path.rename(claim)
+            except OSError:
+                continue  # another process got it first
+            try:
+                with open(claim, "r", encoding="utf-8") as f:
+                    checkpoint = Checkpoint.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError) as e:
+                logger.error("Discarding unreadable checkpoint %s: %s", path.name, e)
+                claim.unlink(missing_ok=True)
+                continue
+            claim.unlink(missing_ok=True)
+            if now - checkpoint.created_at > self.max_age:
+                logger.warning("Discarding stale checkpoint %s", checkpoint, extra={"chat_id": checkpoint.chat_id})
+                continue
+            claimed.append(checkpoint)
+        return sorted(claimed, key=lambda checkpoint: checkpoint.created_at)
+
+class DrainController:
+    """
+    Shutdown protocol for generation work:
+
+    1. begin(): `draining` is set; handlers park new heavy work as a
+       checkpoint instead of starting it.
+    2. drain(): wait up to the deadline for jobs and lane slots to finish.
+    3. Past the deadline `expired` is set; batch jobs save a checkpoint at
+       their next item boundary and return.
+
+    On the next start, resume() hands each saved checkpoint to the resumer
+    registered for its kind.
+    """
+
+    def __init__(self, store: Optional[CheckpointStore] = None):
+        self.store = store or CheckpointStore()
+        self.draining = False
+        self.expired = False
+        self.in_flight = 0
+        self.checkpointed = 0
+        self.resumed = 0
+        self._resumers: Dict[str, Resumer] = {}
+
+    def register(self, kind: str, resumer: Resumer):
+        self._resumers[kind] = resumer
+
+    @asynccontextmanager
+    async def job(self):
+        """Mark a block as heavy work the drain waits for"""
+        self.in_flight += 1
+        try:
+            yield self
+        finally:
+            self.in_flight -= 1
+
+    def park(self, checkpoint: Checkpoint):
+        """Save work that will not be finished by this process"""
+        self.store.save(checkpoint)
+        self.checkpointed += 1
+        logger.info("Checkpointed %s", checkpoint, extra={"chat_id": checkpoint.chat_id})
+
+    def begin(self):
+        if not self.draining:
+            self.draining = True
+            logger.info("Draining: %d jobs in flight", self.in_flight)
+
+    async def drain(self, deadline: Optional[float] = None, poll: float = 0.1) -> int:
+        """Wait for in-flight work up to deadline seconds. Returns how many jobs were still running."""
+        self.begin()
+        deadline = settings.drain_deadline_seconds if deadline is None else deadline
+        stop_at = time.monotonic() + deadline
+        while self.in_flight or generation_lanes.in_flight:
+            if time.monotonic() >= stop_at:
+                break
+            await asyncio.sleep(poll)
+        remaining = self.in_flight
+        if remaining:
+            logger.warning("Drain deadline reached with %d jobs in flight; checkpointing", remaining)
+        self.expired = True
+        return remaining
+
+    async def resume(self, bot, spawn: Optional[Callable[[Awaitable], object]] = None) -> int:
+        """Start every saved checkpoint; spawn schedules the coroutines (default asyncio.create_task)"""
+        spawn = spawn or asyncio.create_task
+        checkpoints = await asyncio.to_thread(self.store.claim_all)
+        started = 0
+        for checkpoint in checkpoints:
+            resumer = self._resumers.get(checkpoint.kind)
+            if resumer is None:
+                logger.error("No resumer for checkpoint kind %r", checkpoint.kind)
+                continue
+            spawn(resumer(bot, checkpoint))
+            started += 1
+        self.resumed += started
+        if started:
+            logger.info("Resumed %d checkpointed jobs", started)
+        return started
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "checkpointed": self.checkpointed,
+            "resumed": self.resumed,
+            "draining": self.draining,
+        }
+
+# Global drain controller
+drain_controller = DrainController()
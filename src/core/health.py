@@ -0,0 +1,106 @@
+"""
+Liveness and readiness reporting over a minimal HTTP endpoint
+"""
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+
+from src.config.settings import settings
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PENDING = "pending"
+OK = "ok"
+
+class HealthState:
+    """
+    Liveness is "the process is serving HTTP". Readiness additionally needs
+    every registered warm-up check to have passed.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.checks: Dict[str, str] = {}
+        self.accepting = False
+
+    def register(self, name: str):
+        self.checks[name] = PENDING
+
+    def mark(self, name: str, status: str):
+        self.checks[name] = status
+
+    @property
+    def ready(self) -> bool:
+        return self.accepting and all(status == OK for status in self.checks.values())
+
+    def snapshot(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "not_ready",
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1),
+            "accepting": self.accepting,
+            "checks": dict(self.checks),
+        }
+
+class HealthServer:
+    """
+    GET /health        -> 200 while the process is alive (Docker HEALTHCHECK)
+    GET /health/ready  -> 200 once warm-up passed and polling started, else 503
+    """
+
+    def __init__(self, state: HealthState, host: Optional[str] = None, port: Optional[int] = None):
+        self.state = state
+        self.host = host or settings.health_host
+        self.port = settings.health_port if port is None else port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        sockets = self._server.sockets or []
+        if sockets:
+            self.port = sockets[0].getsockname()[1]
+        logger.info("Health endpoint listening on %s:%d", self.host, self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def route(self, path: str):
+        """(status code, body) for a request path"""
+        if path == "/health":
+            return 200, {"status": "alive", "ready": self.state.ready}
+        if path == "/health/ready":
+            snapshot = self.state.snapshot()
+            return (200 if self.state.ready else 503), snapshot
+        return 404, {"error": "not found"}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Drain headers; the body (if any) is ignored
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) >= 2 else "/"
+            status, body = self.route(path)
+            payload = json.dumps(body).encode("utf-8")
+            reason = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}[status]
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+# Global health state
+health_state = HealthState()
@@ -0,0 +1,155 @@
+"""
+Concurrency lanes for generation work, adjustable at runtime
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from src.config.settings import settings
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class Lane:
+    """A concurrency limit that can be resized or paused while running"""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.paused = False
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self._condition = None
+        self._loop = None
+
+    def _cond(self) -> asyncio.Condition:
+        # Created lazily so the lane binds to the running event loop
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+    async def acquire(self):
+        cond = self._cond()
+        async with cond:
+            self.waiting += 1
+            try:
+                await cond.wait_for(lambda: not self.paused and self.in_flight < self.limit)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+
+    async def release(self):
+        cond = self._cond()
+        async with cond:
+            self.in_flight -= 1
+            self.completed += 1
+            cond.notify_all()
+
+    async def _wake(self):
+        cond = self._cond()
+        async with cond:
+            cond.notify_all()
+
+    async def set_limit(self, limit: int):
+        self.limit = max(1, limit)
+        await self._wake()
+
+    async def pause(self):
+        self.paused = True
+
+    async def resume(self):
+        self.paused = False
+        await self._wake()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "paused": self.paused,
+        }
+
+
+class GenerationLanes:
+    """Named lanes: 'interactive' for news/segments, 'batch' for Speed 50"""
+
+    def __init__(self, limits: Dict[str, int]):
+        self.lanes = {name: Lane(name, limit) for name, limit in limits.items()}
+
+    def get(self, name: str) -> Lane:
+        return self.lanes[name]
+
+    @asynccontextmanager
+    async def slot(self, name: str):
+        """Hold one slot in the named lane for the duration of the block"""
+        lane = self.lanes[name]
+        await lane.acquire()
+        try:
+            yield lane
+        finally:
+            await lane.release()
+
+    @property
+    def in_flight(self) -> int:
+        return sum(lane.in_flight for lane in self.lanes.values())
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(lane.waiting for lane in self.lanes.values())
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates from different chats concurrently and updates from one
+    chat in arrival order, so a long generation waiting on a (possibly
+    paused) lane holds up only its own chat. Updates for which unordered()
+    is true (admin commands) skip the per-chat queue, so /resume gets
+    through even from a chat whose own batch is waiting.
+    """
+
+    def __init__(self, max_concurrent_updates: int,
+                 unordered: Optional[Callable[[object], bool]] = None):
+        super().__init__(max_concurrent_updates)
+        self.unordered = unordered
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._holders: Dict[int, int] = {}
+
+    async def do_process_update(self, update: object, coroutine: "Awaitable[Any]") -> None:
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None or (self.unordered is not None and self.unordered(update)):
+            await coroutine
+            return
+        lock = self._chat_locks.setdefault(chat.id, asyncio.Lock())
+        self._holders[chat.id] = self._holders.get(chat.id, 0) + 1
+        try:
+            async with lock:
+                await coroutine
+        finally:
+            self._holders[chat.id] -= 1
+            if not self._holders[chat.id]:
+                # Idle chats don't keep a lock around
+                del self._holders[chat.id]
+                del self._chat_locks[chat.id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+# Global lanes instance
+generation_lanes = GenerationLanes({
+    "interactive": settings.interactive_concurrency,
+    "batch": settings.batch_concurrency,
+})
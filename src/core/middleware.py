@@ -0,0 +1,241 @@
+"""
+Update middleware: the per-chat rate limit, and the traffic recorder
+(anonymized update timing/shape traces and model-call latencies as compact
+JSONL, for replay with scripts/replay_traffic.py)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from src.config.constants import MENU_NEWS, MENU_SEGMENT, MENU_SPEED50, MENU_STOP
+from src.config.settings import settings
+from src.core.outbox import TokenBucket, outbox
+from src.services.state_store import StateStore
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SLOW_DOWN_MESSAGE = "⏳ ತುಂಬಾ ವೇಗವಾಗಿ ಸಂದೇಶಗಳು ಬರುತ್ತಿವೆ. ಈ ಸಂದೇಶವನ್ನು ಪರಿಗಣಿಸಲಾಗಿಲ್ಲ; ದಯವಿಟ್ಟು ಸ್ವಲ್ಪ ಸಮಯದ ನಂತರ ಮತ್ತೆ ಕಳುಹಿಸಿ."
+
+class ChatRateLimiter:
+    """
+    settings.rate_limit_per_minute per chat, checked in the first handler
+    group in single-process and scale-out mode alike. An update over the limit
+    is not handled; the chat gets one "slow down" reply per burst rather than
+    one per update. attach_store() moves the buckets into the shared state
+    store, so a chat keeps its budget when its shard moves to another replica.
+    Admin chats are never limited.
+    """
+
+    def __init__(self, per_minute: Optional[int] = None):
+        self.per_minute = per_minute or settings.rate_limit_per_minute
+        self.store: Optional[StateStore] = None
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._warned: Set[int] = set()
+        self.limited = 0
+
+    def attach_store(self, store: Optional[StateStore]):
+        """Keep the buckets in a state store shared by all replicas (None: back to local)"""
+        self.store = store
+
+    async def allow(self, chat_id: int) -> bool:
+        rate = self.per_minute / 60
+        if self.store is not None:
+            try:
+                return await asyncio.to_thread(
+                    self.store.take_token, f"chat:{chat_id}", rate, self.per_minute, time.time()
+                )
+            except Exception as e:
+                logger.error("Rate limit check failed, letting the update through: %s", e)
+                return True
+        now = time.monotonic()
+        if len(self._buckets) > 1000:
+            self._prune(now)
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(rate, self.per_minute)
+        if bucket.delay(now) > 0:
+            return False
+        bucket.consume(now)
+        return True
+
+    async def check(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat = update.effective_chat
+        if chat is None or chat.id in settings.admin_chat_ids:
+            return
+        if await self.allow(chat.id):
+            self._warned.discard(chat.id)
+            return
+        self.limited += 1
+        logger.warning("Rate limited update", extra={"chat_id": chat.id})
+        if chat.id not in self._warned:
+            self._warned.add(chat.id)
+            await outbox.send_text(context.bot, chat.id, SLOW_DOWN_MESSAGE)
+        raise ApplicationHandlerStop
+
+    def _prune(self, now: float):
+        """Forget chats whose bucket has fully refilled"""
+        for chat_id in list(self._buckets):
+            bucket = self._buckets[chat_id]
+            if bucket.delay(now) == 0 and bucket.tokens >= bucket.capacity:
+                del self._buckets[chat_id]
+                self._warned.discard(chat_id)
+
+TRACE_VERSION = 1
+
+# Keyboard answers and commands are recorded verbatim so a replay walks the
+# same conversation path; any other text is reduced to its shape.
+REPLAYABLE_CHOICES = frozenset({
+    MENU_NEWS, MENU_SPEED50, MENU_SEGMENT, MENU_STOP,
+    "📋 Paste Headlines", "📄 Upload Word Document", "🔴 Abort & Reset",
+    "📰 ಇತ್ತೀಚಿನ ಸುದ್ದಿ/ಘಟನೆಗಳು", "📚 ಸಾಮಾನ್ಯ ಜ್ಞಾನ/ಶಿಕ್ಷಣ", "🎭 ಮನರಂಜನೆ/ಸಂಸ್ಕೃತಿ",
+    "🔍 ವೆಬ್ ಸರ್ಚ್ + AI ಜ್ಞಾನ", "🧠 ಕೇವಲ AI ಜ್ಞಾನ", "🎯 ನೀವೇ ನಿರ್ಧರಿಸಿ",
+    "📊 ಸಂಕ್ಷಿಪ್ತ ಮಾಹಿತಿ", "📋 ಮಧ್ಯಮ ವಿವರಣೆ", "📖 ವಿಸ್ತೃತ ವಿವರಣೆ", "🎓 ಸಮಗ್ರ ಸ್ಕ್ರಿಪ್ಟ್",
+    "📺 ಟಿವಿ ನ್ಯೂಸ್ ಶೈಲಿ", "🎙️ ರೇಡಿಯೋ ಶೈಲಿ", "📖 ಶೈಕ್ಷಣಿಕ ಶೈಲಿ", "💬 ಸಂಭಾಷಣಾ ಶೈಲಿ",
+    "🎯 ಮುಖ್ಯ ವಿಷಯ ಮಾತ್ರ", "📝 ಉದಾಹರಣೆಗಳೊಂದಿಗೆ", "🌟 ಕಥೆಗಳು + ಉದಾಹರಣೆಗಳು", "🎭 ಸಂವಾದಾತ್ಮಕ ವಿಷಯ",
+    "❌ ರದ್ದುಮಾಡಿ", "done", "cancel", "stop", "❌ stop",
+})
+_DURATION_RE = re.compile(r"^\d{1,2}$")
+
+def replayable_choice(text: str) -> Optional[str]:
+    """The text itself if it is safe to record verbatim, else None"""
+    text = text.strip()
+    if text.lower() in REPLAYABLE_CHOICES or text in REPLAYABLE_CHOICES or _DURATION_RE.match(text):
+        return text
+    return None
+
+def text_shape(text: str) -> Dict[str, int]:
+    """Length, line count and headline count (++...++ or line separated) of a message"""
+    lines = [line for line in text.split("\n") if line.strip()]
+    if "++...++" in text:
+        headlines = len([part for part in text.split("++...++") if part.strip()])
+    else:
+        headlines = len(lines)
+    return {"n": len(text), "l": len(lines), "h": headlines}
+
+class TrafficRecorder:
+    """
+    Opt-in (traffic_record_enabled). Registered around the conversation
+    handler: before() stamps arrival in an early handler group and after()
+    writes the record, with handling time, from a late one. Model calls are
+    reported by AIService through a call listener. Chats appear only as
+    keyed hashes whose key is random per process unless traffic_record_salt
+    is set; message text is never written except REPLAYABLE_CHOICES.
+    """
+
+    def __init__(self, directory: Optional[str] = None, salt: Optional[str] = None,
+                 flush_every: Optional[int] = None):
+        self.directory = Path(directory or settings.traffic_record_dir)
+        salt = salt if salt is not None else settings.traffic_record_salt
+        self._key = salt.encode("utf-8")[:64] if salt else os.urandom(16)
+        self.flush_every = flush_every or settings.traffic_record_flush_every
+        self._arrivals: Dict[int, float] = {}
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.recorded = 0
+
+    def chat_alias(self, chat_id: Optional[int]) -> str:
+        if chat_id is None:
+            return "-"
+        return hashlib.blake2b(str(chat_id).encode(), key=self._key, digest_size=6).hexdigest()
+
+    def describe(self, update: Update) -> Dict[str, object]:
+        """Shape of an update with its content stripped"""
+        message = update.effective_message
+        chat = update.effective_chat
+        record: Dict[str, object] = {"k": "u", "c": self.chat_alias(chat.id if chat else None)}
+        if message is None:
+            record["s"] = "other"
+        elif message.document is not None:
+            document = message.document
+            record["s"] = "document"
+            record["x"] = os.path.splitext(document.file_name or "")[1].lower()
+            record["b"] = document.file_size or 0
+        elif message.text is not None:
+            text = message.text
+            if text.startswith("/"):
+                record["s"] = "command"
+                record["v"] = text.split()[0].split("@")[0]
+            else:
+                record["s"] = "text"
+                choice = replayable_choice(text)
+                if choice is not None:
+                    record["v"] = choice
+                else:
+                    record.update(text_shape(text))
+        else:
+            record["s"] = "other"
+        return record
+
+    async def before(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        self._arrivals[id(update)] = time.time()
+
+    async def after(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        arrived = self._arrivals.pop(id(update), None)
+        if arrived is None:
+            return
+        record = self.describe(update)
+        record["t"] = round(arrived, 3)
+        record["ms"] = int((time.time() - arrived) * 1000)
+        self._append(record)
+
+    def record_model_call(self, chat_id: Optional[int], flow: str, seconds: float,
+                          prompt_chars: int, output_chars: int, error: Optional[str] = None):
+        """AIService call listener; runs in worker threads"""
+        record = {
+            "k": "m", "t": round(time.time() - seconds, 3), "c": self.chat_alias(chat_id),
+            "f": flow, "ms": int(seconds * 1000), "in": prompt_chars, "out": output_chars,
+        }
+        if error:
+            record["e"] = error
+        self._append(record)
+
+    def _append(self, record: Dict[str, object]):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._buffer.append(line)
+            self.recorded += 1
+            should_flush = len(self._buffer) >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def path_for(self, now: Optional[float] = None) -> Path:
+        day = time.strftime("%Y%m%d", time.localtime(time.time() if now is None else now))
+        return self.directory / f"trace-{day}.jsonl"
+
+    def flush(self) -> int:
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if not lines:
+            return 0
+        try:
+            path = self.path_for()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with self._write_lock:
+                new = not path.exists()
+                with open(path, "a", encoding="utf-8") as f:
+                    if new:
+                        f.write(json.dumps({"k": "h", "v": TRACE_VERSION}, separators=(",", ":")) + "\n")
+                    f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            logger.error("Writing traffic trace failed, dropped %d records: %s", len(lines), e)
+            return 0
+        return len(lines)
+
+    async def flush_job(self, context):
+        """Job queue callback"""
+        await asyncio.to_thread(self.flush)
+
+# Global rate limiter (always registered) and recorder (inactive unless enabled)
+chat_rate_limiter = ChatRateLimiter()
+traffic_recorder = TrafficRecorder()
@@ -0,0 +1,226 @@
+"""
+Outbound Telegram delivery: rate-limited, prioritized and RetryAfter-aware
+"""
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+from telegram.error import RetryAfter
+
+from src.config.settings import settings
+from src.utils.formatter import split_message
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+INTERACTIVE = 0
+BATCH = 1
+
+class TokenBucket:
+    """In-process token bucket that can also be blocked until a given time"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = 0
+
+class _Job:
+    __slots__ = ("priority", "seq", "chat_id", "factory", "future", "attempts")
+
+    def __init__(self, priority: int, seq: int, chat_id: int, factory, future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.factory = factory
+        self.future = future
+        self.attempts = 0
+
+class Outbox:
+    """
+    Every queued send is a coroutine factory (so it can be retried). Sends to
+    one chat go out one at a time in submission order; across chats the
+    scheduler picks the highest-priority job whose chat bucket has a token,
+    then waits on the global bucket. RetryAfter blocks the chat (or, for
+    long flood waits, the whole outbox) and requeues the job at the front.
+    """
+
+    def __init__(self, global_rate: Optional[float] = None, chat_rate: Optional[float] = None,
+                 chat_burst: Optional[int] = None, max_retries: Optional[int] = None):
+        self.global_bucket = TokenBucket(global_rate or settings.send_global_rate,
+                                         global_rate or settings.send_global_rate)
+        self.chat_rate = chat_rate or settings.send_chat_rate
+        self.chat_burst = chat_burst or settings.send_chat_burst
+        self.max_retries = max_retries if max_retries is not None else settings.send_max_retries
+        self._queues: Dict[int, Deque[_Job]] = {}
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._busy = set()
+        self._deliveries = set()
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._scheduler = None
+        self.sent = 0
+        self.retry_after_events = 0
+
+    # Public API
+
+    async def submit(self, chat_id: int, factory: Callable[[], Awaitable], priority: int = INTERACTIVE):
+        """Queue factory() for delivery and wait for its result"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        job = _Job(priority, next(self._seq), chat_id, factory, future)
+        self._queues.setdefault(chat_id, deque()).append(job)
+        self._wakeup.set()
+        return await future
+
+    async def send_text(self, bot, chat_id: int, text: str, priority: int = INTERACTIVE, **kwargs):
+        """Send text, split into ordered chunks under Telegram's length limit"""
+        messages = []
+        for chunk in split_message(text):
+            messages.append(await self.submit(
+                chat_id, lambda chunk=chunk: bot.send_message(chat_id=chat_id, text=chunk, **kwargs), priority
+            ))
+        return messages
+
+    async def send_document(self, bot, chat_id: int, path: str, priority: int = INTERACTIVE, **kwargs):
+        """Send a file from disk; it is reopened on every attempt"""
+        async def send():
+            with open(path, "rb") as f:
+                return await bot.send_document(chat_id=chat_id, document=f, **kwargs)
+        return await self.submit(chat_id, send, priority)
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(len(q) for q in self._queues.values()),
+            "chats": len(self._queues),
+            "sent": self.sent,
+            "retry_after": self.retry_after_events,
+        }
+
+    async def close(self):
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+            await asyncio.gather(self._scheduler, return_exceptions=True)
+            self._scheduler = None
+
+    # Scheduling
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._scheduler is None or self._scheduler.done() or self._scheduler.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._scheduler = loop.create_task(self._run(), name="outbox")
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _next_job(self, now: float):
+        """(job, 0) for the best sendable job, or (None, seconds to wait)"""
+        best, wait = None, None
+        for chat_id, queue in self._queues.items():
+            if not queue or chat_id in self._busy:
+                continue
+            job = queue[0]
+            delay = self._bucket(chat_id).delay(now)
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            if best is None or (job.priority, job.seq) < (best.priority, best.seq):
+                best = job
+        return best, wait
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            if len(self._buckets) > 1000:
+                self._prune(now)
+            job, wait = self._next_job(now)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            global_delay = self.global_bucket.delay(now)
+            if global_delay > 0:
+                await asyncio.sleep(global_delay)
+                continue
+
+            self._queues[job.chat_id].popleft()
+            self.global_bucket.consume(now)
+            self._bucket(job.chat_id).consume(now)
+            self._busy.add(job.chat_id)
+            task = asyncio.get_running_loop().create_task(self._deliver(job))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    def _prune(self, now: float):
+        """Forget idle chats whose bucket has fully refilled"""
+        for chat_id in list(self._buckets):
+            bucket = self._buckets[chat_id]
+            if chat_id not in self._queues and chat_id not in self._busy and bucket.delay(now) == 0 \
+                    and bucket.tokens >= bucket.capacity:
+                del self._buckets[chat_id]
+
+    async def _deliver(self, job: _Job):
+        try:
+            result = await job.factory()
+        except RetryAfter as e:
+            job.attempts += 1
+            self.retry_after_events += 1
+            retry_after = float(getattr(e.retry_after, "total_seconds", lambda: e.retry_after)())
+            until = time.monotonic() + retry_after
+            self._bucket(job.chat_id).block(until)
+            if retry_after > settings.send_global_block_threshold_seconds:
+                # Long flood waits come from the global limit; hold everything
+                self.global_bucket.block(until)
+            logger.warning("Telegram RetryAfter %.1fs", retry_after, extra={"chat_id": job.chat_id})
+            if job.future.done():
+                # The submitter gave up (cancelled handler, drain); don't resend
+                pass
+            elif job.attempts > self.max_retries:
+                job.future.set_exception(e)
+            else:
+                self._queues.setdefault(job.chat_id, deque()).appendleft(job)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._busy.discard(job.chat_id)
+            queue = self._queues.get(job.chat_id)
+            if queue is not None and not queue:
+                del self._queues[job.chat_id]
+            self._wakeup.set()
+
+# Global outbox instance
+outbox = Outbox()
@@ -0,0 +1,460 @@
+"""
+Replay of recorded traffic traces (src/core/middleware.py) against the real
+handlers, with a fake Telegram API and a fake Gemini that answers with the
+recorded latencies, to compare tail latency between builds.
+"""
+import asyncio
+import io
+import itertools
+import json
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import TypeHandler
+from telegram.request import BaseRequest, RequestData
+
+from src.config.settings import settings
+from src.core.drain import CheckpointStore, drain_controller
+from src.core.outbox import outbox
+from src.services.prompt_cache import prompt_cache
+from src.services.semantic_cache import semantic_cache
+from src.utils.logger import get_logger, stop_logging
+
+logger = get_logger(__name__)
+
+REPLAY_BOT_ID = 1
+FIRST_CHAT_ID = 100_000
+
+# Handling budget for the last update once the whole trace has been fed
+SETTLE_TIMEOUT_SECONDS = 600
+
+# Documents are recorded by size only; these turn a size back into a headline count
+TXT_BYTES_PER_HEADLINE = 240
+DOCX_EMPTY_BYTES = 36_000
+DOCX_BYTES_PER_HEADLINE = 110
+
+# Defaults for flows that never appear in the trace
+DEFAULT_CALL_MS = 1500
+DEFAULT_OUTPUT_CHARS = 900
+
+_CONSONANTS = "ಕಖಗಘಚಛಜಝಟಠಡಢಣತಥದಧನಪಫಬಭಮಯರಲವಶಷಸಹಳ"
+_VOWEL_SIGNS = ["", "ಾ", "ಿ", "ೀ", "ು", "ೂ", "ೆ", "ೇ", "ೈ", "ೊ", "ೋ"]
+
+def load_trace(paths: Iterable[str]) -> Tuple[List[dict], List[dict]]:
+    """(update records, model call records) from trace files, each sorted by time"""
+    updates, calls = [], []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping malformed trace line in %s", path)
+                    continue
+                if record.get("k") == "u":
+                    updates.append(record)
+                elif record.get("k") == "m":
+                    calls.append(record)
+    updates.sort(key=lambda record: record["t"])
+    calls.sort(key=lambda record: record["t"])
+    return updates, calls
+
+def update_kind(record: dict) -> str:
+    """Report group of an update record"""
+    if record.get("s") == "text":
+        if "v" in record:
+            return "choice"
+        return "headlines" if record.get("h", 1) > 1 else "text"
+    return record.get("s", "other")
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile, as LatencyTracker computes it"""
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))]
+
+def summarize(latencies: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    """count/p50/p95/p99/max in milliseconds per group, plus "all" """
+    groups = dict(latencies)
+    groups["all"] = [value for values in latencies.values() for value in values]
+    summary = {}
+    for name, values in groups.items():
+        if not values:
+            continue
+        summary[name] = {
+            "count": len(values),
+            "p50": round(percentile(values, 50), 1),
+            "p95": round(percentile(values, 95), 1),
+            "p99": round(percentile(values, 99), 1),
+            "max": round(max(values), 1),
+        }
+    return summary
+
+def compare(baseline: dict, report: dict) -> List[Tuple[str, float, float, float]]:
+    """(group, baseline p95, new p95, change %) for groups present in both reports"""
+    rows = []
+    before, after = baseline.get("latency_ms", {}), report.get("latency_ms", {})
+    for name in sorted(set(before) & set(after)):
+        old, new = before[name]["p95"], after[name]["p95"]
+        change = (new - old) / old * 100 if old else 0.0
+        rows.append((name, old, new, round(change, 1)))
+    return rows
+
+class SyntheticText:
+    """Kannada-looking filler of a given shape; fresh words every call so no cache ever hits"""
+
+    def __init__(self, seed: int = 0):
+        self._random = random.Random(seed)
+
+    def word(self) -> str:
+        return "".join(
+            self._random.choice(_CONSONANTS) + self._random.choice(_VOWEL_SIGNS)
+            for _ in range(self._random.randint(2, 4))
+        )
+
+    def sentence(self, chars: int) -> str:
+        words: List[str] = []
+        length = 0
+        while length < max(chars, 1):
+            word = self.word()
+            words.append(word)
+            length += len(word) + 1
+        return " ".join(words)[:max(chars, 1)].strip() or self.word()
+
+    def message(self, chars: int, lines: int = 1, headlines: int = 1) -> str:
+        """Text of about chars characters with the recorded line and headline counts"""
+        if headlines > 1:
+            per_item = max(chars // headlines, 12)
+            items = [self.sentence(per_item) for _ in range(headlines)]
+            # More headlines than lines means they were pasted with ++...++ separators
+            return "++...++".join(items) if lines < headlines else "\n".join(items)
+        lines = max(lines, 1)
+        return "\n".join(self.sentence(max(chars // lines, 12)) for _ in range(lines))
+
+    def document(self, extension: str, size: int) -> bytes:
+        """A .txt or .docx file with the headline count a file of that size would hold"""
+        if extension == ".docx":
+            count = max(1, (size - DOCX_EMPTY_BYTES) // DOCX_BYTES_PER_HEADLINE)
+        else:
+            count = max(1, size // TXT_BYTES_PER_HEADLINE)
+        headlines = [self.sentence(70) for _ in range(count)]
+        if extension != ".docx":
+            return "\n".join(headlines).encode("utf-8")
+        from docx import Document
+        document = Document()
+        for headline in headlines:
+            document.add_paragraph(headline)
+        buffer = io.BytesIO()
+        document.save(buffer)
+        return buffer.getvalue()
+
+class FakeTelegram(BaseRequest):
+    """
+    Bot API stand-in: every method succeeds at once, sent messages are
+    counted, and getFile/downloads serve the synthesized documents.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, bytes] = {}
+        self.calls: Dict[str, int] = {}
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, parameters: dict) -> dict:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(parameters.get("chat_id", 0)), "type": "private"},
+            "from": {"id": REPLAY_BOT_ID, "is_bot": True, "first_name": "Replay"},
+        }
+        if "text" in parameters:
+            message["text"] = parameters["text"]
+        return message
+
+    def _result(self, method: str, parameters: dict):
+        if method == "getMe":
+            return {
+                "id": REPLAY_BOT_ID, "is_bot": True, "first_name": "Replay",
+                "username": "replay_bot", "can_join_groups": False,
+                "can_read_all_group_messages": False, "supports_inline_queries": False,
+            }
+        if method.startswith("send") and method != "sendChatAction":
+            return self._message(parameters)
+        if method in ("editMessageText", "editMessageReplyMarkup"):
+            return self._message(parameters)
+        if method == "getFile":
+            file_id = parameters["file_id"]
+            return {
+                "file_id": file_id, "file_unique_id": file_id,
+                "file_size": len(self.files.get(file_id, b"")), "file_path": f"documents/{file_id}",
+            }
+        if method == "getUpdates":
+            return []
+        return True
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> Tuple[int, bytes]:
+        if "/file/bot" in url:
+            file_id = url.rsplit("/", 1)[-1]
+            return 200, self.files.get(file_id, b"")
+        api_method = url.rsplit("/", 1)[-1]
+        self.calls[api_method] = self.calls.get(api_method, 0) + 1
+        parameters = request_data.parameters if request_data is not None else {}
+        body = {"ok": True, "result": self._result(api_method, parameters)}
+        return 200, json.dumps(body).encode("utf-8")
+
+class FakeGemini:
+    """
+    Answers each flow with the recorded latencies and output sizes, in
+    recorded order and cycling when the trace runs out. Recorded failures
+    are replayed as timeouts. model_scale stretches or shrinks every call.
+    """
+
+    def __init__(self, calls: List[dict], model_scale: float = 1.0, seed: int = 0):
+        self.model_scale = model_scale
+        self._samples: Dict[str, List[dict]] = {}
+        for call in calls:
+            self._samples.setdefault(call["f"], []).append(call)
+        self._all = list(calls)
+        self._positions: Dict[str, int] = {}
+        self._text = SyntheticText(seed)
+        self._lock = threading.Lock()
+        self.served = 0
+
+    def sample(self, flow: str) -> dict:
+        with self._lock:
+            samples = self._samples.get(flow) or self._all
+            self.served += 1
+            if not samples:
+                return {"ms": DEFAULT_CALL_MS, "out": DEFAULT_OUTPUT_CHARS}
+            position = self._positions.get(flow, 0)
+            self._positions[flow] = position + 1
+            return samples[position % len(samples)]
+
+    def generate(self, flow: str, prompt: str):
+        sample = self.sample(flow)
+        time.sleep(sample["ms"] / 1000 * self.model_scale)
+        if sample.get("e"):
+            raise TimeoutError(f"replayed {sample['e']}")
+        with self._lock:
+            text = self._text.message(max(sample.get("out", 0), 1))
+        usage = SimpleNamespace(
+            prompt_token_count=len(prompt) // 4,
+            candidates_token_count=len(text) // 4,
+            total_token_count=(len(prompt) + len(text)) // 4,
+        )
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    def model(self, flow: str) -> "_FlowModel":
+        return _FlowModel(self, flow)
+
+class _FlowModel:
+    """GenerativeModel stand-in bound to one flow"""
+
+    def __init__(self, gemini: FakeGemini, flow: str):
+        self._gemini = gemini
+        self._flow = flow
+
+    def generate_content(self, prompt, **kwargs):
+        return self._gemini.generate(self._flow, str(prompt))
+
+    def count_tokens(self, prompt):
+        return SimpleNamespace(total_tokens=len(str(prompt)) // 4)
+
+class _ReplayRoute:
+    """The real route's identity and pricing with a fake model"""
+
+    def __init__(self, route, model):
+        self.name = route.name if route is not None else "default"
+        self.model_name = route.model_name if route is not None else "replay"
+        self.model = model
+        self._route = route
+
+    def cost(self, input_tokens: int, output_tokens: int) -> float:
+        return self._route.cost(input_tokens, output_tokens) if self._route is not None else 0.0
+
+    def generation_config(self):
+        return None
+
+class _ReplayRouter:
+    """Keeps the real routing decisions (route stats stay meaningful) but answers from FakeGemini"""
+
+    routes: List = []
+
+    def __init__(self, router, gemini: FakeGemini):
+        self._router = router
+        self._gemini = gemini
+
+    def select(self, flow: str, input_chars: int, target_words: Optional[int] = None):
+        return _ReplayRoute(self._router.select(flow, input_chars, target_words), self._gemini.model(flow))
+
+@contextmanager
+def _overrides(**values):
+    previous = {name: getattr(settings, name) for name in values}
+    for name, value in values.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(settings, name, value)
+
+class TraceReplayer:
+    """
+    Feeds recorded updates into a ClaudeNewsBot at speed× their recorded
+    pace (0 = as fast as possible) and measures, per update, the time from
+    enqueue until the last handler group is done with it.
+    """
+
+    def __init__(self, updates: List[dict], calls: List[dict], speed: float = 1.0,
+                 model_scale: float = 1.0, seed: int = 0):
+        self.records = updates
+        self.speed = speed
+        self.gemini = FakeGemini(calls, model_scale, seed)
+        self.telegram = FakeTelegram()
+        self._text = SyntheticText(seed + 1)
+        self._chats: Dict[str, int] = {}
+        self._enqueued: Dict[int, Tuple[str, float]] = {}
+        self.latencies: Dict[str, List[float]] = {}
+        self._all_fed = False
+        self._settled = asyncio.Event()
+
+    def _chat_id(self, alias: str) -> int:
+        if alias not in self._chats:
+            self._chats[alias] = FIRST_CHAT_ID + len(self._chats)
+        return self._chats[alias]
+
+    def build_update(self, update_id: int, record: dict) -> dict:
+        """Bot API update dict reproducing a record's shape"""
+        chat_id = self._chat_id(record.get("c", "-"))
+        message = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Replay"},
+        }
+        shape = record.get("s")
+        if shape == "command":
+            command = record.get("v", "/start")
+            message["text"] = command
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+        elif shape == "document":
+            extension = record.get("x") or ".txt"
+            file_id = f"replay{update_id}"
+            self.telegram.files[file_id] = self._text.document(extension, record.get("b", 0))
+            message["document"] = {
+                "file_id": file_id, "file_unique_id": file_id,
+                "file_name": f"headlines{extension}", "file_size": len(self.telegram.files[file_id]),
+            }
+        elif "v" in record:
+            message["text"] = record["v"]
+        else:
+            message["text"] = self._text.message(record.get("n", 40), record.get("l", 1), record.get("h", 1))
+        return {"update_id": update_id, "message": message}
+
+    async def _done(self, update: Update, context):
+        entry = self._enqueued.pop(update.update_id, None)
+        if entry is not None:
+            kind, enqueued = entry
+            self.latencies.setdefault(kind, []).append((time.perf_counter() - enqueued) * 1000)
+        if not self._enqueued and self._all_fed:
+            self._settled.set()
+
+    def _install_fakes(self, bot):
+        from src.services.ai_service import AIService
+        services = {
+            id(service): service
+            for handler in (bot.news_handler, bot.speed50_handler, bot.segment_handler)
+            for service in (getattr(handler, "ai_service", None),
+                            getattr(getattr(handler, "segment_service", None), "ai_service", None))
+            if isinstance(service, AIService)
+        }
+        for service in services.values():
+            service.model = self.gemini.model("default")
+            service.fallback_model = None
+            service.router = _ReplayRouter(service.router, self.gemini)
+
+    async def run(self) -> dict:
+        from src.core.bot_manager import ClaudeNewsBot
+        semantic_cache.flush()
+        started = time.perf_counter()
+        with tempfile.TemporaryDirectory() as scratch, _overrides(
+            enable_web_search=False, enable_article_fetch=False, enable_context_cache=False,
+            enable_analytics=False, traffic_record_enabled=False, scale_out_enabled=False,
+        ):
+            store, cache_enabled = drain_controller.store, prompt_cache.enabled
+            drain_controller.store = CheckpointStore(scratch)
+            prompt_cache.enabled = False
+            bot = ClaudeNewsBot()
+            try:
+                await bot.initialize(request=self.telegram)
+                self._install_fakes(bot)
+                app = bot.app
+                app.add_handler(TypeHandler(Update, self._done), group=99)
+                await app.initialize()
+                await app.start()
+                try:
+                    await self._feed(app)
+                    if self._enqueued:
+                        await asyncio.wait_for(self._settled.wait(), SETTLE_TIMEOUT_SECONDS)
+                finally:
+                    await app.stop()
+                    await app.shutdown()
+                    await outbox.close()
+            finally:
+                drain_controller.store, prompt_cache.enabled = store, cache_enabled
+                stop_logging()
+        return self.report(time.perf_counter() - started)
+
+    async def _feed(self, app):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        first = self.records[0]["t"] if self.records else 0
+        for update_id, record in enumerate(self.records, 1):
+            if self.speed > 0:
+                delay = start + (record["t"] - first) / self.speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            update = Update.de_json(self.build_update(update_id, record), app.bot)
+            self._enqueued[update_id] = (update_kind(record), time.perf_counter())
+            await app.update_queue.put(update)
+        self._all_fed = True
+
+    def report(self, wall_seconds: float) -> dict:
+        return {
+            "updates": len(self.records),
+            "handled": sum(len(values) for values in self.latencies.values()),
+            "chats": len(self._chats),
+            "speed": self.speed,
+            "model_scale": self.gemini.model_scale,
+            "model_calls": self.gemini.served,
+            "telegram_calls": dict(sorted(self.telegram.calls.items())),
+            "wall_seconds": round(wall_seconds, 2),
+            "latency_ms": summarize(self.latencies),
+        }
+
+def write_report(report: dict, path: str):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,229 @@
+"""
+Scale-out mode: several bot processes sharing one StateStore
+
+Telegram allows one getUpdates poller per token, so the replica holding the
+"poller" lease fetches updates and queues them in the store by shard. Every
+replica (the poller included) consumes the shards it holds leases on, so
+each chat is handled by exactly one process and keeps its in-memory session
+there. Leases expire when a replica stops heartbeating and the survivors
+take its shards over.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import time
+import zlib
+from typing import Dict, Iterable, Optional, Set
+
+from telegram import Update
+from telegram.ext import Application, Updater
+
+from src.config.settings import settings
+from src.services.state_store import StateStore
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+POLLER_LEASE = "poller"
+
+def shard_for(chat_id: int, shard_count: int) -> int:
+    return zlib.crc32(str(chat_id).encode("ascii")) % shard_count
+
+def shard_owner(shard: int, replicas: Iterable[str]) -> str:
+    """
+    Rendezvous hashing: the replica with the highest weight for the shard. A
+    replica joining or leaving moves only the shards it wins or held.
+    """
+    def weight(replica: str) -> bytes:
+        return hashlib.blake2b(f"{replica}:{shard}".encode("utf-8"), digest_size=8).digest()
+    return max(replicas, key=weight)
+
+def default_replica_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class ReplicaCoordinator:
+    """Heartbeats, shard leases and poller election for one replica"""
+
+    def __init__(self, store: StateStore, replica_id: Optional[str] = None,
+                 shard_count: Optional[int] = None, lease_ttl: Optional[float] = None):
+        self.store = store
+        self.replica_id = replica_id or settings.replica_id or default_replica_id()
+        self.shard_count = shard_count or settings.shard_count
+        self.lease_ttl = lease_ttl or settings.lease_ttl_seconds
+        self.owned: Set[int] = set()
+        self.is_poller = False
+
+    def rebalance(self, now: Optional[float] = None) -> Set[int]:
+        """
+        Heartbeat, then hold the shards assigned to this replica among the live
+        ones by shard_owner, so a replica joining or leaving moves about 1/N of
+        the shards (and their conversations). Shards no longer assigned are
+        released so their new owner can take them right away; shards still
+        leased by a live peer are picked up once that lease is released or expires.
+        """
+        now = time.time() if now is None else now
+        self.store.heartbeat(self.replica_id, now)
+        live = self.store.live_replicas(now, self.lease_ttl)
+        if self.replica_id not in live:
+            live = sorted(live + [self.replica_id])
+        targets = {s for s in range(self.shard_count) if shard_owner(s, live) == self.replica_id}
+
+        for shard in self.owned - targets:
+            self.store.release(f"shard:{shard}", self.replica_id)
+        self.owned = {
+            shard for shard in targets
+            if self.store.try_acquire(f"shard:{shard}", self.replica_id, self.lease_ttl, now)
+        }
+        self.is_poller = self.store.try_acquire(POLLER_LEASE, self.replica_id, self.lease_ttl, now)
+        return self.owned
+
+    def owns(self, chat_id: int) -> bool:
+        return shard_for(chat_id, self.shard_count) in self.owned
+
+    def release_all(self):
+        """Hand everything over immediately on a clean shutdown"""
+        for shard in self.owned:
+            self.store.release(f"shard:{shard}", self.replica_id)
+        self.store.release(POLLER_LEASE, self.replica_id)
+        self.owned = set()
+        self.is_poller = False
+
+    def stats(self) -> dict:
+        return {"replica": self.replica_id, "shards": len(self.owned), "poller": self.is_poller}
+
+class ReplicaRunner:
+    """
+    Drives a replica inside the bot's event loop: periodic rebalancing, polling
+    while holding the poller lease (into the store, not the local application)
+    and feeding claimed updates for owned shards to the application.
+
+    Claimed updates stay in the store under a lease renewed on every rebalance
+    and are acked once handled, so a replica dying mid-update hands it to the
+    shard's next owner. A new batch is claimed only when every claimed update
+    has reached a handler.
+    """
+
+    def __init__(self, app: Application, coordinator: ReplicaCoordinator, store: StateStore):
+        self.app = app
+        self.coordinator = coordinator
+        self.store = store
+        self.ingress: asyncio.Queue = asyncio.Queue()
+        self.updater = Updater(app.bot, self.ingress)
+        self._held: Set[int] = set()  # claimed and not yet acked or released
+        self._waiting: Dict[int, int] = {}  # claimed, not yet handled: id -> chat_id
+        self._handling: Set[asyncio.Task] = set()
+        self._tasks = []
+
+    async def start(self):
+        await self.updater.initialize()
+        await self._coordinate()
+        self._tasks = [
+            asyncio.create_task(self._coordinate_loop(), name="replica_coordinate"),
+            asyncio.create_task(self._ingress_loop(), name="replica_ingress"),
+            asyncio.create_task(self._consume_loop(), name="replica_consume"),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._handling:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._handling, return_exceptions=True)
+        self._tasks = []
+        # Whatever was not handled goes straight back to the queue
+        await asyncio.to_thread(self.store.release_claims, list(self._held), self.coordinator.replica_id)
+        self._held.clear()
+        self._waiting.clear()
+        if self.updater.running:
+            await self.updater.stop()
+        await self.updater.shutdown()
+        await asyncio.to_thread(self.coordinator.release_all)
+
+    async def _coordinate(self):
+        await asyncio.to_thread(self.coordinator.rebalance)
+        if self.coordinator.is_poller and not self.updater.running:
+            logger.info("Replica %s took the poller lease", self.coordinator.replica_id)
+            await self.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        elif not self.coordinator.is_poller and self.updater.running:
+            logger.warning("Replica %s lost the poller lease", self.coordinator.replica_id)
+            await self.updater.stop()
+        await self._drop_moved()
+        if self._held:
+            await asyncio.to_thread(
+                self.store.renew_claims, list(self._held), self.coordinator.replica_id,
+                self.coordinator.lease_ttl, time.time()
+            )
+
+    async def _drop_moved(self):
+        """Give back claimed updates still waiting whose shard moved to another replica"""
+        moved = [row_id for row_id, chat_id in self._waiting.items() if not self.coordinator.owns(chat_id)]
+        if not moved:
+            return
+        for row_id in moved:
+            del self._waiting[row_id]
+            self._held.discard(row_id)
+        await asyncio.to_thread(self.store.release_claims, moved, self.coordinator.replica_id)
+        logger.info("Released %d queued updates for moved shards", len(moved))
+
+    async def _coordinate_loop(self):
+        while True:
+            await asyncio.sleep(settings.rebalance_interval_seconds)
+            try:
+                await self._coordinate()
+            except Exception as e:
+                logger.error("Replica rebalance failed: %s", e)
+
+    async def _ingress_loop(self):
+        # Rate limiting happens when the update is handled (see middleware.py),
+        # so over-limit chats get a reply instead of a silent drop
+        while True:
+            update = await self.ingress.get()
+            try:
+                chat_id = update.effective_chat.id if update.effective_chat else 0
+                payload = json.dumps(update.to_dict(), ensure_ascii=False)
+                shard = shard_for(chat_id, self.coordinator.shard_count)
+                await asyncio.to_thread(self.store.enqueue, shard, chat_id, payload)
+            except Exception as e:
+                logger.error("Failed to queue update: %s", e)
+
+    async def _consume_loop(self):
+        while True:
+            if self._waiting:
+                await asyncio.sleep(settings.update_poll_interval_seconds)
+                continue
+            try:
+                rows = await asyncio.to_thread(
+                    self.store.claim, sorted(self.coordinator.owned), settings.update_claim_batch,
+                    self.coordinator.replica_id, self.coordinator.lease_ttl, time.time()
+                )
+            except Exception as e:
+                logger.error("Failed to claim updates: %s", e)
+                rows = []
+            if not rows:
+                await asyncio.sleep(settings.update_poll_interval_seconds)
+                continue
+            for row_id, chat_id, payload in rows:
+                update = Update.de_json(json.loads(payload), self.app.bot)
+                self._held.add(row_id)
+                self._waiting[row_id] = chat_id
+                # Same path the application's own update fetcher takes
+                task = asyncio.create_task(
+                    self.app.update_processor.process_update(update, self._handle(row_id, chat_id, update))
+                )
+                self._handling.add(task)
+                task.add_done_callback(self._handling.discard)
+
+    async def _handle(self, row_id: int, chat_id: int, update: Update):
+        if self._waiting.pop(row_id, None) is None:
+            return  # released by _drop_moved while it waited
+        try:
+            await self.app.process_update(update)
+        except Exception as e:
+            logger.error("Failed to handle claimed update: %s", e, extra={"chat_id": chat_id})
+        try:
+            await asyncio.to_thread(self.store.ack, [row_id], self.coordinator.replica_id)
+        except Exception as e:
+            logger.error("Failed to ack update: %s", e, extra={"chat_id": chat_id})
+        self._held.discard(row_id)
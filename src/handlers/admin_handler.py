@@ -0,0 +1,227 @@
+"""
+Admin operations console: runtime stats and live controls
+"""
+import asyncio
+import resource
+import tracemalloc
+from typing import Dict, Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from src.config.settings import settings
+from src.core.conversation_handler import session_manager
+from src.core.drain import drain_controller
+from src.core.lanes import generation_lanes
+from src.core.outbox import outbox
+from src.services.ai_resilience import gemini_breaker, gemini_latency
+from src.services.cache_service import cache_registry
+from src.services.model_router import route_stats
+from src.services.usage_service import usage_ledger
+from src.utils.formatter import split_message
+from src.utils.logger import get_logger
+from src.utils.validator import input_validator
+
+logger = get_logger(__name__)
+
+ADMIN_COMMANDS = frozenset({"stats", "memtop", "flushcache", "pause", "resume", "concurrency"})
+
+def is_admin_command(update: object) -> bool:
+    """Whether update is one of the admin console commands (answered out of chat order)"""
+    message = getattr(update, "effective_message", None)
+    text = getattr(message, "text", None) or ""
+    if not text.startswith("/"):
+        return False
+    return text[1:].split(maxsplit=1)[0].split("@")[0].lower() in ADMIN_COMMANDS
+
+def _fmt_seconds(value: Optional[float]) -> str:
+    return f"{value:.2f}s" if value is not None else "-"
+
+def process_rss_bytes() -> int:
+    """Current resident set size, falling back to peak RSS where /proc is unavailable"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class AdminHandler:
+    """Admin-only commands, gated by settings.admin_chat_ids"""
+
+    def __init__(self):
+        self.logger = logger
+
+    def is_admin(self, update: Update) -> bool:
+        chat = update.effective_chat
+        return chat is not None and chat.id in settings.admin_chat_ids
+
+    async def _reject(self, update: Update) -> bool:
+        """Log and ignore non-admin callers. Returns True if the caller was rejected."""
+        if self.is_admin(update):
+            return False
+        chat = update.effective_chat
+        self.logger.warning("Rejected admin command", extra={"chat_id": chat.id if chat else None})
+        return True
+
+    def render_stats(self, usage: Optional[Dict[str, Dict[str, int]]] = None) -> str:
+        """The /stats report; usage is usage_ledger.summary(), read off the event loop by the caller"""
+        lines = ["📊 Runtime stats", ""]
+
+        lines.append(f"Generations in flight: {generation_lanes.in_flight}, queued: {generation_lanes.queue_depth}")
+        for name, lane in generation_lanes.stats().items():
+            state = "paused" if lane["paused"] else "running"
+            lines.append(
+                f"  {name}: {lane['in_flight']}/{lane['limit']} in flight, "
+                f"{lane['waiting']} waiting, {lane['completed']} done ({state})"
+            )
+
+        sends = outbox.stats()
+        lines.append(
+            f"Outbox: {sends['queued']} queued for {sends['chats']} chats, "
+            f"{sends['sent']} sent, {sends['retry_after']} flood waits"
+        )
+        drain = drain_controller.stats()
+        if drain["checkpointed"] or drain["resumed"]:
+            lines.append(f"Checkpoints: {drain['checkpointed']} saved at drain, {drain['resumed']} resumed")
+        if input_validator.rejected:
+            rejected = ", ".join(f"{reason}={count}" for reason, count in sorted(input_validator.rejected.items()))
+            lines.append(f"Rejected inputs: {rejected}")
+
+        lines.append("")
+        lines.append("Caches:")
+        for name, stats in cache_registry.stats().items():
+            rate = f"{stats['hit_rate']:.0%}" if stats["hit_rate"] is not None else "-"
+            lines.append(f"  {name}: hit rate {rate} ({stats.get('hits', 0)} hits)")
+
+        lines.append("")
+        lines.append(f"Gemini breaker: {gemini_breaker.state}")
+        for prompt_class, snap in gemini_latency.snapshot().items():
+            lines.append(
+                f"  {prompt_class}: p50 {_fmt_seconds(snap['p50'])}, p95 {_fmt_seconds(snap['p95'])}, "
+                f"p99 {_fmt_seconds(snap['p99'])} (n={snap['count']})"
+            )
+        errors = ", ".join(f"{name}={count}" for name, count in gemini_breaker.error_counts.items())
+        lines.append(f"  errors: {errors or 'none'}")
+        for route, snap in route_stats.snapshot().items():
+            lines.append(
+                f"  route {route}: {snap['calls']} calls, {snap['errors']} errors, "
+                f"p95 {_fmt_seconds(snap['p95'])}, ${snap['cost']:.4f}"
+            )
+
+        if usage:
+            lines.append("")
+            lines.append(f"Tokens today (quota rejections: {usage_ledger.quota_rejections}):")
+            for flow, totals in sorted(usage.items(), key=lambda item: -item[1]["total_tokens"]):
+                avg_ms = totals["latency_ms"] / totals["calls"] if totals["calls"] else 0
+                lines.append(
+                    f"  {flow}: {totals['total_tokens']} tokens "
+                    f"({totals['prompt_tokens']} in / {totals['candidate_tokens']} out), "
+                    f"{totals['calls']} calls, avg {avg_ms / 1000:.2f}s"
+                )
+
+        lines.append("")
+        lines.append(f"Live sessions: {session_manager.live_sessions} (expired {session_manager.expired_total})")
+        lines.append(f"Process RSS: {process_rss_bytes() / (1024 ** 2):.1f} MB")
+        return "\n".join(lines)
+
+    async def stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/stats - runtime overview"""
+        if await self._reject(update):
+            return
+        usage = await asyncio.to_thread(usage_ledger.summary)
+        # Many routes or chats push the report past Telegram's message limit
+        for chunk in split_message(self.render_stats(usage)):
+            await update.message.reply_text(chunk)
+
+    async def memtop(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/memtop [N|start|stop] - tracemalloc top-N allocation sites"""
+        if await self._reject(update):
+            return
+        arg = context.args[0] if context.args else "10"
+
+        if arg == "start":
+            tracemalloc.start()
+            await update.message.reply_text("tracemalloc started")
+            return
+        if arg == "stop":
+            tracemalloc.stop()
+            await update.message.reply_text("tracemalloc stopped")
+            return
+        if not tracemalloc.is_tracing():
+            await update.message.reply_text("tracemalloc is off. Use /memtop start first.")
+            return
+
+        try:
+            limit = max(1, min(int(arg), 50))
+        except ValueError:
+            await update.message.reply_text("Usage: /memtop [N|start|stop]")
+            return
+
+        snapshot = tracemalloc.take_snapshot()
+        top = snapshot.statistics("lineno")[:limit]
+        lines = [f"🧠 Top {limit} allocation sites"]
+        for stat in top:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size / 1024:.1f} KB ({stat.count}) {frame.filename}:{frame.lineno}")
+        await update.message.reply_text("\n".join(lines))
+
+    async def flush_cache(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/flushcache [name] - flush one or all caches"""
+        if await self._reject(update):
+            return
+        name = context.args[0] if context.args else None
+        if name and name not in cache_registry.names():
+            await update.message.reply_text(f"Unknown cache. Known: {', '.join(cache_registry.names())}")
+            return
+        flushed = cache_registry.flush(name)
+        await update.message.reply_text(f"Flushed: {', '.join(flushed) or 'nothing'}")
+
+    async def _lane_from_args(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        name = context.args[0] if context.args else "batch"
+        if name not in generation_lanes.lanes:
+            await update.message.reply_text(f"Unknown lane. Known: {', '.join(generation_lanes.lanes)}")
+            return None
+        return generation_lanes.get(name)
+
+    async def pause(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/pause [lane] - stop starting new work in a lane (default: batch)"""
+        if await self._reject(update):
+            return
+        lane = await self._lane_from_args(update, context)
+        if lane is None:
+            return
+        await lane.pause()
+        self.logger.warning("Lane %s paused by admin", lane.name,
+                            extra={"chat_id": update.effective_chat.id})
+        await update.message.reply_text(f"⏸ Lane {lane.name} paused")
+
+    async def resume(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/resume [lane] - resume a paused lane (default: batch)"""
+        if await self._reject(update):
+            return
+        lane = await self._lane_from_args(update, context)
+        if lane is None:
+            return
+        await lane.resume()
+        self.logger.warning("Lane %s resumed by admin", lane.name,
+                            extra={"chat_id": update.effective_chat.id})
+        await update.message.reply_text(f"▶️ Lane {lane.name} resumed")
+
+    async def concurrency(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """/concurrency <lane> <limit> - change a lane's concurrency limit"""
+        if await self._reject(update):
+            return
+        if not context.args or len(context.args) != 2 or not context.args[1].isdigit():
+            await update.message.reply_text("Usage: /concurrency <lane> <limit>")
+            return
+        lane = await self._lane_from_args(update, context)
+        if lane is None:
+            return
+        await lane.set_limit(int(context.args[1]))
+        self.logger.warning("Lane %s concurrency set to %d by admin", lane.name, lane.limit,
+                            extra={"chat_id": update.effective_chat.id})
+        await update.message.reply_text(f"Lane {lane.name} limit: {lane.limit}")
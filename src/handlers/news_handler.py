@@ -1,13 +1,20 @@
 """
 News script generation handler
 """
+import asyncio
 import os
 from telegram import Update
 from telegram.ext import ContextTypes
 from src.services.ai_service import AIService
 from src.services.category_detector import CategoryDetector
+from src.services.translation_service import TranslationService
+from src.config.constants import NEWS_CONTENT
+from src.config.settings import settings
 from src.utils.file_manager import FileManager
+from src.core.lanes import generation_lanes
+from src.core.outbox import BATCH, outbox
 from src.utils.logger import get_logger
+from src.utils.validator import REPEAT_MESSAGE, input_validator
 
 logger = get_logger(__name__)
 
@@ -16,6 +23,7 @@ class NewsHandler:
         self.ai_service = AIService()
         self.category_detector = CategoryDetector()
         self.file_manager = FileManager()
+        self.translation_service = TranslationService(self.ai_service)
         self.logger = logger
     
     async def handle_news_content(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -28,6 +36,14 @@ class NewsHandler:
             start_handler = StartHandler()
             return await start_handler.show_main_menu(update)
 
+        # Reject inputs that cannot produce a script before spending any model calls
+        rejection = input_validator.check_text(content_text)
+        if rejection is None and input_validator.is_repeat(update.message.chat_id, "news", content_text):
+            rejection = REPEAT_MESSAGE
+        if rejection is not None:
+            await update.message.reply_text(rejection)
+            return NEWS_CONTENT
+
         try:
             await update.message.reply_chat_action(action="typing")
             
@@ -39,34 +55,77 @@ class NewsHandler:
             pkg_prompt = self.ai_service.generate_pkg_prompt(category, content_text)
             
             # Generate content
-            av_content = self.ai_service.generate_content(av_prompt)
-            pkg_content = self.ai_service.generate_content(pkg_prompt)
+            async with generation_lanes.slot("interactive"):
+                av_content, av_reused = await self.ai_service.agenerate_reusable(
+                    av_prompt, "av", content_text, chat_id=update.message.chat_id
+                )
+                pkg_content, pkg_reused = await self.ai_service.agenerate_reusable(
+                    pkg_prompt, "pkg", content_text, cached_prefix="pkg", chat_id=update.message.chat_id
+                )
 
             # Create output file
-            filename = f"news_output_{update.message.chat.id}.txt"
-            file_path = self.file_manager.assemble_output_file(
+            filename = self.file_manager.export_filename(f"news_output_{update.message.chat.id}")
+            file_path = await asyncio.to_thread(
+                self.file_manager.assemble_output_file,
                 "News Script", category, av_content, pkg_content, filename
             )
 
             # Send response
             await update.message.reply_text(f"✅ Category: {category}\nಫೈಲ್ ಕಳುಹಿಸಲಾಗುತ್ತಿದೆ...")
-            
-            with open(file_path, 'rb') as file:
-                await context.bot.send_document(
-                    chat_id=update.message.chat_id,
-                    document=file,
-                    filename=filename,
-                    caption="📝 ನಿಮ್ಮ ನ್ಯೂಸ್ ಸ್ಕ್ರಿಪ್ಟ್"
+            reused = max(av_reused or 0, pkg_reused or 0)
+            if reused:
+                await update.message.reply_text(
+                    f"♻️ ಇದು ಹಿಂದೆ ಬಂದ ಸುದ್ದಿಗೆ {reused:.0%} ಹೋಲುತ್ತದೆ, ಆ ಸ್ಕ್ರಿಪ್ಟ್ ಅನ್ನು ಮರುಬಳಕೆ ಮಾಡಲಾಗಿದೆ. "
+                    "ದಯವಿಟ್ಟು ಹೆಸರುಗಳು ಮತ್ತು ಅಂಕಿಅಂಶಗಳನ್ನು ಪರಿಶೀಲಿಸಿ."
                 )
             
+            await outbox.send_document(
+                context.bot, update.message.chat_id, file_path,
+                filename=filename,
+                caption="📝 ನಿಮ್ಮ ನ್ಯೂಸ್ ಸ್ಕ್ರಿಪ್ಟ್"
+            )
+            
             # Clean up
             os.remove(file_path)
+            input_validator.remember(update.message.chat_id, "news", content_text)
+            
+            if settings.translation_languages:
+                # The script is already delivered; a failure here only costs the translations
+                try:
+                    await self._send_translations(update, context, category, av_content, pkg_content)
+                except Exception as e:
+                    self.logger.error("News translation failed: %s", e, exc_info=True,
+                                      extra={"chat_id": update.message.chat_id, "flow": "news"})
+                    await update.message.reply_text("⚠️ ಅನುವಾದ ವಿಫಲವಾಗಿದೆ; ಕನ್ನಡ ಸ್ಕ್ರಿಪ್ಟ್ ಮೇಲೆ ಕಳುಹಿಸಲಾಗಿದೆ.")
             
         except Exception as e:
-            self.logger.error(f"Error in handle_news_content: {e}")
+            self.logger.error("Error in handle_news_content: %s", e,
+                              extra={"chat_id": update.message.chat_id, "flow": "news"})
             await update.message.reply_text("ಕ್ಷಮಿಸಿ, ಸ್ಕ್ರಿಪ್ಟ್ ರಚನೆಯಲ್ಲಿ ದೋಷ ಸಂಭವಿಸಿದೆ.")
 
         # Return to main menu
         from src.handlers.start_handler import StartHandler
         start_handler = StartHandler()
-        return await start_handler.show_main_menu(update)
\ No newline at end of file
+        return await start_handler.show_main_menu(update)
+
+    async def _send_translations(self, update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                 category: str, av_content: str, pkg_content: str):
+        """Send the AV and PKG in every configured language as one file"""
+        await update.message.reply_chat_action(action="typing")
+        script = f"--- SPEED 50 ---\n{av_content}\n\n--- PKG SCRIPT ---\n{pkg_content}"
+        async with generation_lanes.slot("interactive"):
+            translations = await self.translation_service.translate(script, chat_id=update.message.chat_id)
+
+        filename = self.file_manager.export_filename(f"news_output_{update.message.chat.id}_multilang")
+        file_path = await asyncio.to_thread(
+            self.file_manager.assemble_multilang_file,
+            f"News Script - {category}", {"kannada": script, **translations}, filename
+        )
+        try:
+            await outbox.send_document(
+                context.bot, update.message.chat_id, file_path, BATCH,
+                filename=filename,
+                caption="🌐 ಅನುವಾದಿತ ಸ್ಕ್ರಿಪ್ಟ್"
+            )
+        finally:
+            os.remove(file_path)
\ No newline at end of file
@@ -1,38 +1,101 @@
 """
 Custom Segment Creation Handler
 """
+import asyncio
+import os
+from typing import Optional
+
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ContextTypes
 
 from src.services.ai_service import AIService
+from src.services.prewarm_service import topic_history
+from src.services.segment_service import SegmentService
+from src.services.translation_service import TranslationService
+from src.models.checkpoint import Checkpoint
+from src.models.segment import SegmentResearch, SegmentSession
 from src.utils.file_manager import FileManager
+from src.core.conversation_handler import session_manager
+from src.core.drain import DRAIN_MESSAGE, RESUME_MESSAGE, drain_controller
+from src.core.lanes import generation_lanes
+from src.core.outbox import BATCH, outbox
 from src.config.constants import *
+from src.config.settings import settings
 from src.utils.logger import get_logger
+from src.utils.text_processor import count_words, format_reading_time, reading_time_seconds
 
 logger = get_logger(__name__)
 
 class SegmentHandler:
     def __init__(self):
         self.ai_service = AIService()
+        self.segment_service = SegmentService()
         self.file_manager = FileManager()
+        self.translation_service = TranslationService(self.ai_service)
         self.logger = logger
+        drain_controller.register("segment", self.resume_segment)
+    
+    async def _cancel(self, update: Update) -> int:
+        """Abort the segment flow, drop its session and return to the main menu"""
+        await update.message.reply_text("ಸೆಗ್ಮೆಂಟ್ ರಚನೆ ರದ್ದುಪಡಿಸಲಾಗಿದೆ.")
+        session_manager.end(update.message.chat_id)
+        from src.handlers.start_handler import StartHandler
+        start_handler = StartHandler()
+        return await start_handler.show_main_menu(update)
+    
+    def _segment(self, update: Update):
+        """Return the chat's segment session, starting an empty one if it expired"""
+        session = session_manager.get(update.message.chat_id)
+        return session.segment or session.start_segment("")
+    
+    async def _await_prefetch(self, segment: SegmentSession) -> Optional[SegmentResearch]:
+        """Collect the speculative research result, or None if it is missing or failed"""
+        task = segment.prefetch
+        if task is None:
+            return None
+        try:
+            return await task
+        except asyncio.CancelledError:
+            return None
+        except Exception as e:
+            self.logger.error("Segment prefetch failed: %s", e, extra={"flow": "segment"})
+            return None
+    
+    async def _send_translations(self, bot, chat_id: int, topic: str, segment_text: str):
+        """Send the segment in every configured language as one file"""
+        await bot.send_chat_action(chat_id=chat_id, action="typing")
+        async with generation_lanes.slot("interactive"):
+            translations = await self.translation_service.translate(segment_text, chat_id=chat_id)
+        
+        filename = self.file_manager.export_filename(f"segment_{topic.replace(' ', '_')}_multilang")
+        file_path = await asyncio.to_thread(
+            self.file_manager.assemble_multilang_file,
+            f"Segment - {topic}", {"kannada": segment_text, **translations}, filename
+        )
+        try:
+            await outbox.send_document(
+                bot, chat_id, file_path, BATCH, caption="🌐 ಅನುವಾದಿತ ಸೆಗ್ಮೆಂಟ್"
+            )
+        finally:
+            os.remove(file_path)
     
     async def handle_segment_topic(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle segment topic input"""
         topic = update.message.text.strip()
         
         if topic.lower() in ["❌ stop", "stop", "cancel"]:
-            await update.message.reply_text("ಸೆಗ್ಮೆಂಟ್ ರಚನೆ ರದ್ದುಪಡಿಸಲಾಗಿದೆ.")
-            from src.handlers.start_handler import StartHandler
-            start_handler = StartHandler()
-            return await start_handler.show_main_menu(update)
+            return await self._cancel(update)
         
         if not topic:
             await update.message.reply_text("ದಯವಿಟ್ಟು ಮಾನ್ಯ ವಿಷಯವನ್ನು ನಮೂದಿಸಿ.")
             return SEGMENT_TOPIC
         
-        # Store topic
-        context.user_data["segment_topic"] = topic
+        # Store topic and start researching it while the questions are answered
+        segment = session_manager.get(update.message.chat_id).start_segment(topic)
+        segment.prefetch = asyncio.create_task(self.segment_service.prefetch_research(topic))
+        if settings.enable_analytics:
+            # Feeds the scheduled research pre-warm of recurring topics
+            await asyncio.to_thread(topic_history.record, topic)
         
         # Start interactive questions
         q1_keyboard = [
@@ -50,17 +113,14 @@ class SegmentHandler:
         )
         return SEGMENT_Q1
 
-        async def handle_segment_q1(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    async def handle_segment_q1(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle Question 1: Content Type"""
         choice = update.message.text.strip()
         
         if choice == "❌ ರದ್ದುಮಾಡಿ":
-            await update.message.reply_text("ಸೆಗ್ಮೆಂಟ್ ರಚನೆ ರದ್ದುಪಡಿಸಲಾಗಿದೆ.")
-            from src.handlers.start_handler import StartHandler
-            start_handler = StartHandler()
-            return await start_handler.show_main_menu(update)
+            return await self._cancel(update)
         
-        context.user_data["segment_content_type"] = choice
+        self._segment(update).content_type = choice
         
         q2_keyboard = [
             ["🔍 ವೆಬ್ ಸರ್ಚ್ + AI ಜ್ಞಾನ"],
@@ -81,12 +141,9 @@ class SegmentHandler:
         choice = update.message.text.strip()
         
         if choice == "❌ ರದ್ದುಮಾಡಿ":
-            await update.message.reply_text("ಸೆಗ್ಮೆಂಟ್ ರಚನೆ ರದ್ದುಪಡಿಸಲಾಗಿದೆ.")
-            from src.handlers.start_handler import StartHandler
-            start_handler = StartHandler()
-            return await start_handler.show_main_menu(update)
+            return await self._cancel(update)
         
-        context.user_data["segment_info_source"] = choice
+        self._segment(update).info_source = choice
         
         q3_keyboard = [
             ["📊 ಸಂಕ್ಷಿಪ್ತ ಮಾಹಿತಿ"],
@@ -108,12 +165,9 @@ class SegmentHandler:
         choice = update.message.text.strip()
         
         if choice == "❌ ರದ್ದುಮಾಡಿ":
-            await update.message.reply_text("ಸೆಗ್ಮೆಂಟ್ ರಚನೆ ರದ್ದುಪಡಿಸಲಾಗಿದೆ.")
-            from src.handlers.start_handler import StartHandler
-            start_handler = StartHandler()
-            return await start_handler.show_main_menu(update)
+            return await self._cancel(update)
         
-        context.user_data["segment_detail_level"] = choice
+        self._segment(update).detail_level = choice
         
         q4_keyboard = [
             ["📺 ಟಿವಿ ನ್ಯೂಸ್ ಶೈಲಿ"],
@@ -135,12 +189,9 @@ class SegmentHandler:
         choice = update.message.text.strip()
         
         if choice == "❌ ರದ್ದುಮಾಡಿ":
-            await update.message.reply_text("ಸೆಗ್ಮೆಂಟ್ ರಚನೆ ರದ್ದುಪಡಿಸಲಾಗಿದೆ.")
-            from src.handlers.start_handler import StartHandler
-            start_handler = StartHandler()
-            return await start_handler.show_main_menu(update)
+            return await self._cancel(update)
         
-        context.user_data["segment_presentation_style"] = choice
+        self._segment(update).presentation_style = choice
         
         q5_keyboard = [
             ["🎯 ಮುಖ್ಯ ವಿಷಯ ಮಾತ್ರ"],
@@ -162,22 +213,20 @@ class SegmentHandler:
         choice = update.message.text.strip()
         
         if choice == "❌ ರದ್ದುಮಾಡಿ":
-            await update.message.reply_text("ಸೆಗ್ಮೆಂಟ್ ರಚನೆ ರದ್ದುಪಡಿಸಲಾಗಿದೆ.")
-            from src.handlers.start_handler import StartHandler
-            start_handler = StartHandler()
-            return await start_handler.show_main_menu(update)
+            return await self._cancel(update)
         
-        context.user_data["segment_content_richness"] = choice
+        segment = self._segment(update)
+        segment.content_richness = choice
         
         # Show user their selections
         summary = f"""
 ✅ ನಿಮ್ಮ ಆಯ್ಕೆಗಳು:
 ━━━━━━━━━━━━━━━━━
-📌 ವಿಷಯ: {context.user_data.get('segment_topic', 'N/A')}
-🎯 ಪ್ರಕಾರ: {context.user_data.get('segment_content_type', 'N/A')}
-🔍 ಮೂಲ: {context.user_data.get('segment_info_source', 'N/A')}
-📋 ವಿವರ: {context.user_data.get('segment_detail_level', 'N/A')}
-🎙️ ಶೈಲಿ: {context.user_data.get('segment_presentation_style', 'N/A')}
+📌 ವಿಷಯ: {segment.topic or 'N/A'}
+🎯 ಪ್ರಕಾರ: {segment.content_type or 'N/A'}
+🔍 ಮೂಲ: {segment.info_source or 'N/A'}
+📋 ವಿವರ: {segment.detail_level or 'N/A'}
+🎙️ ಶೈಲಿ: {segment.presentation_style or 'N/A'}
 🌟 ಸಮೃದ್ಧಿ: {choice}
 """
         
@@ -202,10 +251,7 @@ class SegmentHandler:
         duration = update.message.text.strip()
         
         if duration == "❌ ರದ್ದುಮಾಡಿ":
-            await update.message.reply_text("ಸೆಗ್ಮೆಂಟ್ ರಚನೆ ರದ್ದುಪಡಿಸಲಾಗಿದೆ.")
-            from src.handlers.start_handler import StartHandler
-            start_handler = StartHandler()
-            return await start_handler.show_main_menu(update)
+            return await self._cancel(update)
         
         try:
             # Validate duration is a positive number
@@ -216,7 +262,7 @@ class SegmentHandler:
             await update.message.reply_text("⚠️ ದಯವಿಟ್ಟು ಮಾನ್ಯ ಸಂಖ್ಯೆಯನ್ನು ನಮೂದಿಸಿ (ಉದಾಹರಣೆ: 2, 5, 10)")
             return SEGMENT_DURATION
         
-        context.user_data['segment_duration'] = duration_int
+        self._segment(update).duration = duration_int
         await update.message.reply_text(
             f"✅ ಅವಧಿ: {duration_int} ನಿಮಿಷಗಳು\n\n"
             "🔄 ನಿಮ್ಮ ಕಸ್ಟಮ್ ಸೆಗ್ಮೆಂಟ್ ಅನ್ನು ರಚಿಸಲಾಗುತ್ತಿದೆ...\n"
@@ -229,67 +275,115 @@ class SegmentHandler:
         """Process segment with collected parameters and show results"""
         try:
             # Get user preferences
-            user_prefs = {
-                'topic': context.user_data.get('segment_topic', ''),
-                'content_type': context.user_data.get('segment_content_type', ''),
-                'info_source': context.user_data.get('segment_info_source', ''),
-                'detail_level': context.user_data.get('segment_detail_level', ''),
-                'presentation_style': context.user_data.get('segment_presentation_style', ''),
-                'content_richness': context.user_data.get('segment_content_richness', ''),
-            }
-            duration = context.user_data.get('segment_duration', 5)
-            
-            # Import segment service
-            from src.services.segment_service import SegmentService
-            segment_service = SegmentService()
-            
-            # Generate segment
-            segment_text, category, sources = await segment_service.generate_custom_segment(
-                user_prefs, duration
-            )
-            
-            # Generate the text file
-            file_path = self.file_manager.generate_segment_txt(
-                topic=user_prefs['topic'],
-                content_type=user_prefs['content_type'],
-                info_source=user_prefs['info_source'],
-                detail_level=user_prefs['detail_level'],
-                presentation_style=user_prefs['presentation_style'],
-                content_richness=user_prefs['content_richness'],
-                duration=duration
-            )
-
-            # Send success message
-                        # Send success message
-            await update.message.reply_text(
-                f"✅ ಸೆಗ್ಮೆಂಟ್ ಯಶಸ್ವಿಯಾಗಿ ರಚಿಸಲಾಗಿದೆ!\n\n"
-                f"📊 ವಿವರಗಳು:\n"
-                f"• ವಿಷಯ: {user_prefs['topic']}\n"
-                f"• ಅವಧಿ: {duration} ನಿಮಿಷಗಳು\n"
-                f"• ವರ್ಗ: {category}\n"
-                f"• ಮೂಲಗಳು: {sources}"
-            )
-
-            # Send the file
-            with open(file_path, 'rb') as file:
-                await update.message.reply_document(
-                    document=file, 
-                    caption="🎬 ನಿಮ್ಮ ಕಸ್ಟಮ್ ಸೆಗ್ಮೆಂಟ್ ಫೈಲ್ ಸಿದ್ಧವಾಗಿದೆ!"
-                )
-            
-            # Cleanup
-            import os
-            os.remove(file_path)
+            segment = self._segment(update)
+            checkpoint = Checkpoint("segment", update.message.chat_id, {
+                "prefs": segment.to_prefs(),
+                "duration": segment.duration,
+            })
+            research = await self._await_prefetch(segment)
+            await self.run_segment(context.bot, checkpoint, research)
             
         except KeyError as e:
-            self.logger.error(f"KeyError in process_segment: {e}")
+            self.logger.error("KeyError in process_segment: %s", e,
+                              extra={"chat_id": update.message.chat_id, "flow": "segment"})
             await update.message.reply_text(f"⚠️ ಸೆಗ್ಮೆಂಟ್ ಪ್ರಕ್ರಿಯೆ ವಿಫಲವಾಗಿದೆ: {e}")
         except Exception as e:
-            self.logger.error(f"Segment processing failed: {str(e)}", exc_info=True)
+            self.logger.error("Segment processing failed: %s", e, exc_info=True,
+                              extra={"chat_id": update.message.chat_id, "flow": "segment"})
             await update.message.reply_text("⚠️ ಸೆಗ್ಮೆಂಟ್ ಪ್ರಕ್ರಿಯೆ ವಿಫಲವಾಗಿದೆ")
         
         # Clear context and return to main menu
         context.user_data.clear()
+        session_manager.end(update.message.chat_id)
         from src.handlers.start_handler import StartHandler
         start_handler = StartHandler()
-        return await start_handler.show_main_menu(update)
\ No newline at end of file
+        return await start_handler.show_main_menu(update)
+
+    async def resume_segment(self, bot, checkpoint: Checkpoint):
+        """Regenerate and deliver a segment checkpointed by a previous process"""
+        self.logger.info("Resuming segment: %s", checkpoint,
+                         extra={"chat_id": checkpoint.chat_id, "flow": "segment"})
+        try:
+            await outbox.send_text(bot, checkpoint.chat_id, RESUME_MESSAGE)
+            await self.run_segment(bot, checkpoint)
+        except Exception as e:
+            self.logger.error("Resumed segment failed: %s", e, exc_info=True,
+                              extra={"chat_id": checkpoint.chat_id, "flow": "segment"})
+            await outbox.send_text(bot, checkpoint.chat_id, "⚠️ ಸೆಗ್ಮೆಂಟ್ ಪ್ರಕ್ರಿಯೆ ವಿಫಲವಾಗಿದೆ")
+
+    async def run_segment(self, bot, checkpoint: Checkpoint,
+                          research: Optional[SegmentResearch] = None) -> bool:
+        """
+        Generate and deliver one segment. The request is checkpointed until it
+        has been sent, so a restart mid-generation redoes it; while the bot is
+        draining it is parked instead of started and False is returned.
+        """
+        chat_id = checkpoint.chat_id
+        user_prefs = checkpoint.payload["prefs"]
+        duration = checkpoint.payload["duration"]
+        async with drain_controller.job():
+            if drain_controller.draining:
+                drain_controller.park(checkpoint)
+                await outbox.send_text(bot, chat_id, DRAIN_MESSAGE)
+                return False
+            drain_controller.store.save(checkpoint)
+            try:
+                return await self._generate_and_send(bot, chat_id, user_prefs, duration, research, checkpoint)
+            except Exception:
+                # A failed request is reported now, not retried after the next restart
+                drain_controller.store.delete(checkpoint)
+                raise
+
+    async def _generate_and_send(self, bot, chat_id: int, user_prefs: dict, duration: int,
+                                 research: Optional[SegmentResearch], checkpoint: Checkpoint) -> bool:
+        # Generate segment
+        async with generation_lanes.slot("interactive"):
+            segment_text, category, sources = await self.segment_service.generate_custom_segment(
+                user_prefs, duration, research, chat_id=chat_id
+            )
+        
+        # Generate the segment file
+        file_path = await asyncio.to_thread(
+            self.file_manager.generate_segment_txt,
+            topic=user_prefs['topic'],
+            content_type=user_prefs['content_type'],
+            info_source=user_prefs['info_source'],
+            detail_level=user_prefs['detail_level'],
+            presentation_style=user_prefs['presentation_style'],
+            content_richness=user_prefs['content_richness'],
+            duration=duration,
+            script=segment_text
+        )
+
+        # Send success message
+        await outbox.send_text(
+            bot, chat_id,
+            f"✅ ಸೆಗ್ಮೆಂಟ್ ಯಶಸ್ವಿಯಾಗಿ ರಚಿಸಲಾಗಿದೆ!\n\n"
+            f"📊 ವಿವರಗಳು:\n"
+            f"• ವಿಷಯ: {user_prefs['topic']}\n"
+            f"• ಅವಧಿ: {duration} ನಿಮಿಷಗಳು\n"
+            f"• ವರ್ಗ: {category}\n"
+            f"• ಮೂಲಗಳು: {sources}\n"
+            f"• ಪದಗಳು: {count_words(segment_text)} "
+            f"(ಓದುವ ಸಮಯ ~{format_reading_time(reading_time_seconds(segment_text))})"
+        )
+
+        # Send the file
+        await outbox.send_document(
+            bot, chat_id, file_path,
+            caption="🎬 ನಿಮ್ಮ ಕಸ್ಟಮ್ ಸೆಗ್ಮೆಂಟ್ ಫೈಲ್ ಸಿದ್ಧವಾಗಿದೆ!"
+        )
+        drain_controller.store.delete(checkpoint)
+        
+        # Cleanup
+        os.remove(file_path)
+        
+        if settings.translation_languages:
+            # The segment is already delivered; a failure here only costs the translations
+            try:
+                await self._send_translations(bot, chat_id, user_prefs['topic'], segment_text)
+            except Exception as e:
+                self.logger.error("Segment translation failed: %s", e, exc_info=True,
+                                  extra={"chat_id": chat_id, "flow": "segment"})
+                await outbox.send_text(bot, chat_id, "⚠️ ಅನುವಾದ ವಿಫಲವಾಗಿದೆ; ಕನ್ನಡ ಸೆಗ್ಮೆಂಟ್ ಮೇಲೆ ಕಳುಹಿಸಲಾಗಿದೆ.")
+        return True
\ No newline at end of file
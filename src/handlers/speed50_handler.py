@@ -1,17 +1,26 @@
 """
 Speed 50 (Quick News) Handler
 """
+import asyncio
 import os
+import time
 from pathlib import Path
+from typing import Dict, List, Optional
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ContextTypes
-from docx import Document
 
 from src.services.ai_service import AIService
 from src.services.category_detector import CategoryDetector
 from src.utils.file_manager import FileManager
+from src.core.conversation_handler import session_manager
+from src.core.drain import DRAIN_MESSAGE, RESUME_MESSAGE, drain_controller
+from src.core.lanes import generation_lanes
+from src.core.outbox import BATCH, outbox
+from src.config.settings import settings
 from src.config.constants import *
+from src.models.checkpoint import Checkpoint
 from src.utils.logger import get_logger
+from src.utils.validator import REPEAT_MESSAGE, input_validator
 
 logger = get_logger(__name__)
 
@@ -21,6 +30,7 @@ class Speed50Handler:
         self.category_detector = CategoryDetector()
         self.file_manager = FileManager()
         self.logger = logger
+        drain_controller.register("speed50", self.resume_batch)
     
     async def handle_speed50(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle Speed 50 option selection"""
@@ -28,6 +38,7 @@ class Speed50Handler:
 
         if user_choice.lower() in ["🔴 abort & reset", "❌ stop", "stop", "cancel"]:
             await update.message.reply_text("Speed 50 ರದ್ದುಪಡಿಸಲಾಗಿದೆ.")
+            session_manager.end(update.message.chat_id)
             from src.handlers.start_handler import StartHandler
             start_handler = StartHandler()
             return await start_handler.show_main_menu(update)
@@ -38,7 +49,7 @@ class Speed50Handler:
                 "ನಿಮ್ಮ ಶೀರ್ಷಿಕೆಗಳನ್ನು ಪೇಸ್ಟ್ ಮಾಡಿದ ನಂತರ, 'Done' ಅಥವಾ 'Cancel' ಟೈಪ್ ಮಾಡಿ.",
                 reply_markup=ReplyKeyboardRemove()
             )
-            context.user_data["headlines"] = []
+            session_manager.get(update.message.chat_id).clear_headlines()
             return SPEED_50_HEADLINES
 
         elif user_choice == "📄 Upload Word Document":
@@ -64,16 +75,20 @@ class Speed50Handler:
 
         if user_input.lower() in ["cancel", "stop", "❌ stop", "🔴 abort & reset"]:
             await update.message.reply_text("Speed 50 ಪ್ರಕ್ರಿಯೆ ರದ್ದುಪಡಿಸಲಾಗಿದೆ.")
-            context.user_data.pop("headlines", None)
+            session_manager.end(update.message.chat_id)
             from src.handlers.start_handler import StartHandler
             start_handler = StartHandler()
             return await start_handler.show_main_menu(update)
 
+        session = session_manager.get(update.message.chat_id)
+
         if user_input.lower() == "done":
-            total = len(context.user_data.get("headlines", []))
+            total = len(session.headlines)
             if total == 0:
                 await update.message.reply_text("ದಯವಿಟ್ಟು ಕನಿಷ್ಠ 1 ಶೀರ್ಷಿಕೆ ಸೇರಿಸಿ.")
                 return SPEED_50_HEADLINES
+            elif await self._reject_repeat(update, session):
+                return SPEED_50_HEADLINES
             else:
                 await update.message.reply_text(
                     f"✅ {total} ಶೀರ್ಷಿಕೆ(ಗಳು) ಸ್ವೀಕರಿಸಲಾಗಿದೆ.\n"
@@ -93,13 +108,28 @@ class Speed50Handler:
             headlines = [h.strip() for h in user_input.split("++...++") if h.strip()]
         else:
             headlines = [h.strip() for h in user_input.split("\n") if h.strip()]
+        headlines, dropped = input_validator.clean_headlines(headlines)
+        if dropped:
+            await update.message.reply_text(
+                f"ℹ️ {dropped} ಖಾಲಿ/ವಿಭಜಕ/ದಿನಾಂಕ ಅಥವಾ ಪುನರಾವರ್ತಿತ ಸಾಲು(ಗಳು) ಕೈಬಿಡಲಾಗಿದೆ."
+            )
 
-        if "headlines" not in context.user_data:
-            context.user_data["headlines"] = []
-
-        context.user_data["headlines"].extend(headlines)
+        first = len(session.headlines)
+        accepted = session.add_headlines(
+            headlines, settings.max_buffered_headlines, settings.max_buffered_headline_chars
+        )
+        if settings.speed50_eager_generation:
+            # A re-paste of the batch just served is turned away before any paid call starts
+            if await self._reject_repeat(update, session):
+                return SPEED_50_HEADLINES
+            self._start_eager(session, first)
+        if accepted < len(headlines):
+            await update.message.reply_text(
+                f"⚠️ ಶೀರ್ಷಿಕೆ ಮಿತಿ ತಲುಪಿದೆ. {len(headlines) - accepted} ಶೀರ್ಷಿಕೆ(ಗಳು) ಕೈಬಿಡಲಾಗಿದೆ.\n"
+                "ದಯವಿಟ್ಟು 'Done' ಟೈಪ್ ಮಾಡಿ."
+            )
         await update.message.reply_text(
-            f"✅ {len(headlines)} ಶೀರ್ಷಿಕೆ(ಗಳು) ಸೇರಿಸಲಾಗಿದೆ. (ಒಟ್ಟು: {len(context.user_data['headlines'])})\n"
+            f"✅ {accepted} ಶೀರ್ಷಿಕೆ(ಗಳು) ಸೇರಿಸಲಾಗಿದೆ. (ಒಟ್ಟು: {len(session.headlines)})\n"
             "ಶೀರ್ಷಿಕೆಗಳನ್ನು ಪೇಸ್ಟ್ ಮಾಡುವುದನ್ನು ಮುಂದುವರಿಸಿ ಅಥವಾ 'Done' ಟೈಪ್ ಮಾಡಿ."
         )
         return SPEED_50_HEADLINES
@@ -138,14 +168,28 @@ class Speed50Handler:
                 await update.message.reply_text("⚠️ ಡಾಕ್ಯುಮೆಂಟ್ ಖಾಲಿ ಇದೆ")
                 return SPEED_50
             
-            # Process content as headlines
-            headlines = [h.strip() for h in content.split('\n') if h.strip()]
-            context.user_data["headlines"] = headlines
+            # Process content as headlines, skipping dividers, dates and repeats
+            headlines, dropped = input_validator.clean_headlines(content.split('\n'))
+            if not headlines:
+                await update.message.reply_text("⚠️ ಡಾಕ್ಯುಮೆಂಟ್‌ನಲ್ಲಿ ಮಾನ್ಯ ಶೀರ್ಷಿಕೆಗಳಿಲ್ಲ")
+                return SPEED_50
+            session = session_manager.get(update.message.chat_id)
+            session.clear_headlines()
+            accepted = session.add_headlines(
+                headlines, settings.max_buffered_headlines, settings.max_buffered_headline_chars
+            )
+            if await self._reject_repeat(update, session):
+                return SPEED_50
             
             await update.message.reply_text(
-                f"✅ {len(headlines)} ಹೆಡ್ಲೈನ್ಗಳು ಸ್ವೀಕರಿಸಲ್ಪಟ್ಟಿವೆ\n"
+                f"✅ {accepted} ಹೆಡ್ಲೈನ್ಗಳು ಸ್ವೀಕರಿಸಲ್ಪಟ್ಟಿವೆ"
+                + (f" ({dropped} ಅನಗತ್ಯ ಸಾಲುಗಳನ್ನು ಕೈಬಿಡಲಾಗಿದೆ)" if dropped else "") + "\n"
                 "ಮುಂದುವರೆಯಲು ದಯವಿಟ್ಟು ಕಾಯಿರಿ..."
             )
+            if accepted < len(headlines):
+                await update.message.reply_text(
+                    f"⚠️ ಶೀರ್ಷಿಕೆ ಮಿತಿ ತಲುಪಿದೆ. ಮೊದಲ {accepted} ಶೀರ್ಷಿಕೆಗಳನ್ನು ಮಾತ್ರ ಪ್ರಕ್ರಿಯೆಗೊಳಿಸಲಾಗುತ್ತದೆ."
+                )
             
             # Process headlines
             await self._process_headlines(update, context)
@@ -155,43 +199,161 @@ class Speed50Handler:
             return await start_handler.show_main_menu(update)
             
         except Exception as e:
-            self.logger.error(f"Document upload failed: {str(e)}")
+            self.logger.error("Document upload failed: %s", e,
+                              extra={"chat_id": update.message.chat_id, "flow": "speed50"})
             await update.message.reply_text("⚠️ ದೋಷ ಸಂಭವಿಸಿದೆ. ದಯವಿಟ್ಟು ಮತ್ತೆ ಪ್ರಯತ್ನಿಸಿ")
             return SPEED_50
 
+    def _start_eager(self, session, first: int):
+        """
+        Start generating the session's headlines from index first on while
+        the editor is still pasting; "done" then only waits for stragglers.
+        The lane bounds how many run at once, and clearing the session's
+        headlines (cancel, abort, timeout) cancels them.
+        """
+        new = session.headlines[first:]
+        if not new:
+            return
+        categories = self.category_detector.detect_categories(new)
+        for i, (headline, category) in enumerate(zip(new, categories), first):
+            session.eager[i] = asyncio.create_task(
+                self._generate_item(session.chat_id, i + 1, headline, category)
+            )
+
     async def _process_headlines(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Process headlines and generate Speed 50 content"""
-        headlines = context.user_data.get("headlines", [])
-        results = ""
-        
-        for i, headline in enumerate(headlines, start=1):
+        chat_id = update.message.chat_id
+        session = session_manager.get(chat_id)
+        headlines = list(session.headlines)
+        checkpoint = Checkpoint("speed50", chat_id, {"headlines": headlines})
+        await self.run_batch(context.bot, checkpoint, session.take_eager())
+        input_validator.remember(chat_id, "speed50", "\n".join(headlines))
+        session_manager.end(chat_id)
+
+    async def resume_batch(self, bot, checkpoint: Checkpoint):
+        """Finish a batch checkpointed by a previous process"""
+        self.logger.info("Resuming Speed 50 batch: %s", checkpoint,
+                         extra={"chat_id": checkpoint.chat_id, "flow": "speed50"})
+        await outbox.send_text(bot, checkpoint.chat_id, RESUME_MESSAGE, BATCH)
+        await self.run_batch(bot, checkpoint)
+
+    async def run_batch(self, bot, checkpoint: Checkpoint,
+                        eager: Optional[Dict[int, asyncio.Task]] = None) -> bool:
+        """
+        Generate the AV script for every headline without an output yet, then
+        send the file. eager holds generations already started by headline
+        index; those are awaited instead of generated again. Progress is
+        checkpointed as it goes; while the bot is draining the batch is parked
+        (or stops at the next headline once the drain deadline passes) and
+        False is returned.
+        """
+        eager = eager or {}
+        try:
+            return await self._run_batch(bot, checkpoint, eager)
+        finally:
+            # Whatever was not collected (parked batch, error) is abandoned
+            for task in eager.values():
+                task.cancel()
+
+    async def _run_batch(self, bot, checkpoint: Checkpoint, eager: Dict[int, asyncio.Task]) -> bool:
+        chat_id = checkpoint.chat_id
+        headlines = checkpoint.payload["headlines"]
+        async with drain_controller.job():
+            # Eager generations that already finished are collected first, so a parked batch keeps them
+            for i in checkpoint.pending(len(headlines)):
+                task = eager.get(i)
+                if task is not None and task.done():
+                    eager.pop(i)
+                    if not task.cancelled():
+                        checkpoint.done[i] = task.result()
+            if drain_controller.draining:
+                drain_controller.park(checkpoint)
+                await outbox.send_text(bot, chat_id, DRAIN_MESSAGE, BATCH)
+                return False
+            drain_controller.store.save(checkpoint)
+            saved_at = time.monotonic()
+
+            pending = checkpoint.pending(len(headlines))
+            fresh = [i for i in pending if i not in eager]
+            categories = dict(zip(fresh, self.category_detector.detect_categories([headlines[i] for i in fresh])))
+            for i in pending:
+                if drain_controller.expired:
+                    drain_controller.park(checkpoint)
+                    await outbox.send_text(
+                        bot, chat_id,
+                        f"{DRAIN_MESSAGE}\n({len(checkpoint.done)}/{len(headlines)} ಪೂರ್ಣಗೊಂಡಿವೆ)", BATCH
+                    )
+                    return False
+                result = await self._collect_eager(eager, i)
+                if result is None:
+                    category = categories.get(i)
+                    if category is None:
+                        category = self.category_detector.detect_categories([headlines[i]])[0]
+                    result = await self._generate_item(chat_id, i + 1, headlines[i], category)
+                checkpoint.done[i] = result
+                if time.monotonic() - saved_at >= settings.checkpoint_save_interval_seconds:
+                    drain_controller.store.save(checkpoint)
+                    saved_at = time.monotonic()
+
+            outputs = [checkpoint.done[i] for i in range(len(headlines))]
             try:
-                category = self.category_detector.detect_category("", headline)
-                prompt = self.ai_service.generate_speed50_av_prompt(headline, category)
-                result = self.ai_service.generate_content(prompt)
-                results += f"{result}\n\n{'-'*50}\n\n"
-            except Exception as e:
-                self.logger.error(f"Error generating AV for headline {i}: {e}")
-                results += f"⚠️ AV ಸ್ಕ್ರಿಪ್ಟ್ ತಯಾರಿಸಲು ಸಾಧ್ಯವಾಗಿಲ್ಲ.\n\n{'-'*50}\n\n"
-
-        # Save and send file
-        filename = f"speed50_output_{update.message.chat.id}.txt"
-        file_path = self.file_manager.exports_dir / filename
-        
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(results)
-
-        with open(file_path, "rb") as f:
-            await context.bot.send_document(
-                chat_id=update.message.chat_id,
-                document=f,
-                filename=filename,
-                caption=f"⚡ Speed 50 ಫಲಿತಾಂಶಗಳು - {len(headlines)} ಶೀರ್ಷಿಕೆಗಳು"
-            )
+                await self._send_results(bot, chat_id, headlines, outputs)
+            finally:
+                drain_controller.store.delete(checkpoint)
+            return True
+
+    async def _collect_eager(self, eager: Dict[int, asyncio.Task], i: int) -> Optional[str]:
+        """
+        Result of the eager generation for headline i, or None if there was
+        none or it was cancelled (the session was cleared or expired). Waited
+        on with asyncio.wait so cancelling this batch leaves the task in eager
+        for run_batch to cancel, and the task's own cancellation is not
+        mistaken for the batch's.
+        """
+        task = eager.get(i)
+        if task is None:
+            return None
+        await asyncio.wait({task})
+        eager.pop(i)
+        return None if task.cancelled() else task.result()
+
+    async def _generate_item(self, chat_id: int, number: int, headline: str, category: str) -> str:
+        try:
+            prompt = self.ai_service.generate_speed50_av_prompt(headline, category)
+            async with generation_lanes.slot("batch"):
+                result, reused = await self.ai_service.agenerate_reusable(
+                    prompt, "speed50", headline, cached_prefix="speed50",
+                    chat_id=chat_id
+                )
+            if reused:
+                result = f"♻️ ಮರುಬಳಕೆ ({reused:.0%} ಹೋಲಿಕೆ) - ಪರಿಶೀಲಿಸಿ\n{result}"
+            return result
+        except Exception as e:
+            self.logger.error("Error generating AV for headline %d: %s", number, e,
+                              extra={"chat_id": chat_id, "flow": "speed50"})
+            return "⚠️ AV ಸ್ಕ್ರಿಪ್ಟ್ ತಯಾರಿಸಲು ಸಾಧ್ಯವಾಗಿಲ್ಲ."
+
+    async def _send_results(self, bot, chat_id: int, headlines: List[str], outputs: List[str]):
+        """Save and send the results file"""
+        filename = self.file_manager.export_filename(f"speed50_output_{chat_id}")
+        file_path = await asyncio.to_thread(self.file_manager.write_speed50_file, headlines, outputs, filename)
+
+        await outbox.send_document(
+            bot, chat_id, file_path, BATCH,
+            filename=filename,
+            caption=f"⚡ Speed 50 ಫಲಿತಾಂಶಗಳು - {len(headlines)} ಶೀರ್ಷಿಕೆಗಳು"
+        )
 
         # Cleanup
         os.remove(file_path)
-        context.user_data.pop("headlines", None)
+
+    async def _reject_repeat(self, update: Update, session) -> bool:
+        """Tell the user and drop the buffer if these headlines were just processed"""
+        if not input_validator.is_repeat(update.message.chat_id, "speed50", "\n".join(session.headlines)):
+            return False
+        await update.message.reply_text(REPEAT_MESSAGE)
+        session.clear_headlines()
+        return True
 
     async def _extract_content(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
         """Extract content from uploaded document"""
@@ -213,6 +375,7 @@ class Speed50Handler:
                 with open(file_path, 'r', encoding='utf-8') as f:
                     content = f.read()
             elif file_ext == '.docx':
+                from docx import Document
                 doc = Document(file_path)
                 content = "\n".join([para.text for para in doc.paragraphs if para.text])
             else:
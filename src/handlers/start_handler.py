@@ -4,6 +4,7 @@ Start command and menu handling
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ContextTypes
 from src.config.constants import *
+from src.core.conversation_handler import session_manager
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -15,6 +16,7 @@ class StartHandler:
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle /start command"""
         context.user_data.clear()
+        session_manager.end(update.message.chat_id)
         return await self.show_main_menu(update)
     
     async def show_main_menu(self, update: Update) -> int:
@@ -43,7 +45,7 @@ class StartHandler:
     async def menu_choice(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         """Handle menu choices with better input processing"""
         user_input = self.normalize_input(update.message.text)
-        self.logger.info(f"Menu choice received: {user_input}")
+        self.logger.info("Menu choice received: %s", user_input, extra={"chat_id": update.message.chat_id})
 
         try:
             # Match against normalized versions of menu options
@@ -75,6 +77,7 @@ class StartHandler:
                 return SEGMENT_TOPIC
 
             elif user_input in [self.normalize_input(MENU_STOP), self.normalize_input("🔴 Abort & Reset")]:
+                session_manager.end(update.message.chat_id)
                 await update.message.reply_text(
                     "❌ ಕಾರ್ಯಾಚರಣೆ ರದ್ದುಗೊಳಿಸಲಾಗಿದೆ\n"
                     "ಮುಖ್ಯ ಮೆನುಗೆ ಮರಳಲು /start ಒತ್ತಿರಿ",
@@ -91,7 +94,7 @@ class StartHandler:
                 return await self.show_main_menu(update)
 
         except Exception as e:
-            self.logger.error(f"Menu handling error: {str(e)}", exc_info=True)
+            self.logger.error("Menu handling error: %s", e, exc_info=True, extra={"chat_id": update.message.chat_id})
             await update.message.reply_text(
                 "⚠️ ತಾಂತ್ರಿಕ ಸಮಸ್ಯೆ ಸಂಭವಿಸಿದೆ. ದಯವಿಟ್ಟು ಕೆಲವು ನಿಮಿಷಗಳ ನಂತರ ಮತ್ತೆ ಪ್ರಯತ್ನಿಸಿ.",
                 reply_markup=ReplyKeyboardRemove()
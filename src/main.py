@@ -0,0 +1,14 @@
+"""
+Entry point: python -m src.main
+"""
+import asyncio
+
+from src.core.bot_manager import ClaudeNewsBot
+
+async def main():
+    bot = ClaudeNewsBot()
+    await bot.initialize()
+    await bot.start()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+"""
+Checkpoint model for generation work that must survive a restart
+"""
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+
+class Checkpoint:
+    """
+    One unit of unfinished work: its kind (which handler resumes it), the
+    chat to deliver to, the inputs needed to redo it and any outputs already
+    produced, keyed by item index.
+    """
+
+    __slots__ = ("job_id", "kind", "chat_id", "created_at", "payload", "done")
+
+    def __init__(self, kind: str, chat_id: int, payload: Dict[str, Any],
+                 done: Optional[Dict[int, str]] = None, job_id: Optional[str] = None,
+                 created_at: Optional[float] = None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.chat_id = chat_id
+        self.created_at = time.time() if created_at is None else created_at
+        self.payload = payload
+        self.done: Dict[int, str] = done or {}
+
+    def pending(self, total: int) -> List[int]:
+        """Item indexes below total that have no output yet"""
+        return [index for index in range(total) if index not in self.done]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "chat_id": self.chat_id,
+            "created_at": self.created_at,
+            "payload": self.payload,
+            # JSON object keys are strings
+            "done": {str(index): text for index, text in self.done.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Checkpoint":
+        return cls(
+            kind=data["kind"],
+            chat_id=data["chat_id"],
+            payload=data.get("payload", {}),
+            done={int(index): text for index, text in data.get("done", {}).items()},
+            job_id=data["job_id"],
+            created_at=data.get("created_at"),
+        )
+
+    def __repr__(self) -> str:
+        return f"Checkpoint(kind={self.kind!r}, chat_id={self.chat_id}, done={len(self.done)})"
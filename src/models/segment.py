@@ -0,0 +1,70 @@
+"""
+Custom segment session model
+"""
+import asyncio
+from typing import Dict, Optional
+
+
+class SegmentSession:
+    """Answers collected by the interactive segment flow (topic, Q1-Q5, duration)"""
+
+    __slots__ = (
+        "topic",
+        "content_type",
+        "info_source",
+        "detail_level",
+        "presentation_style",
+        "content_richness",
+        "duration",
+        "prefetch",
+    )
+
+    def __init__(self, topic: str = "", content_type: str = "", info_source: str = "",
+                 detail_level: str = "", presentation_style: str = "",
+                 content_richness: str = "", duration: int = 5):
+        self.topic = topic
+        self.content_type = content_type
+        self.info_source = info_source
+        self.detail_level = detail_level
+        self.presentation_style = presentation_style
+        self.content_richness = content_richness
+        self.duration = duration
+        self.prefetch: Optional[asyncio.Task] = None
+
+    def to_prefs(self) -> Dict[str, str]:
+        """Return the user_prefs dict expected by SegmentService"""
+        return {
+            'topic': self.topic,
+            'content_type': self.content_type,
+            'info_source': self.info_source,
+            'detail_level': self.detail_level,
+            'presentation_style': self.presentation_style,
+            'content_richness': self.content_richness,
+        }
+
+    def cancel_prefetch(self):
+        """Cancel the speculative research task if it is still running"""
+        if self.prefetch is not None and not self.prefetch.done():
+            self.prefetch.cancel()
+        self.prefetch = None
+
+    def __repr__(self) -> str:
+        return f"SegmentSession(topic={self.topic!r}, duration={self.duration})"
+
+
+class SegmentResearch:
+    """Topic research gathered speculatively while the segment questions are answered"""
+
+    __slots__ = ("topic", "topic_type", "category", "web_results")
+
+    def __init__(self, topic: str, topic_type: str, category: str,
+                 web_results: Optional[str] = None):
+        self.topic = topic
+        self.topic_type = topic_type
+        self.category = category
+        # None means no search was run, "" means the search found nothing
+        self.web_results = web_results
+
+    def __repr__(self) -> str:
+        searched = self.web_results is not None
+        return f"SegmentResearch(topic={self.topic!r}, type={self.topic_type}, searched={searched})"
@@ -0,0 +1,73 @@
+"""
+Per-chat conversation session model
+"""
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional
+
+from src.models.segment import SegmentSession
+
+
+class ChatSession:
+    """Compact conversation state for one chat, replacing loose user_data keys"""
+
+    __slots__ = ("chat_id", "headlines", "headline_chars", "eager", "segment", "last_active")
+
+    def __init__(self, chat_id: int, now: Optional[float] = None):
+        self.chat_id = chat_id
+        self.headlines: List[str] = []
+        self.headline_chars = 0
+        # Speed 50 generations started while headlines are still being pasted, by headline index
+        self.eager: Dict[int, asyncio.Task] = {}
+        self.segment: Optional[SegmentSession] = None
+        self.last_active = time.monotonic() if now is None else now
+
+    def touch(self, now: Optional[float] = None):
+        """Mark the session as active"""
+        self.last_active = time.monotonic() if now is None else now
+
+    def idle_for(self, now: Optional[float] = None) -> float:
+        """Seconds since the session was last active"""
+        return (time.monotonic() if now is None else now) - self.last_active
+
+    def add_headlines(self, headlines: Iterable[str], max_count: int, max_chars: int) -> int:
+        """
+        Buffer headlines up to the per-chat count and character caps.
+        Returns how many headlines were accepted.
+        """
+        accepted = 0
+        for headline in headlines:
+            if len(self.headlines) >= max_count:
+                break
+            if self.headline_chars + len(headline) > max_chars:
+                break
+            self.headlines.append(headline)
+            self.headline_chars += len(headline)
+            accepted += 1
+        return accepted
+
+    def clear_headlines(self):
+        """Drop buffered headlines and cancel their eager generations"""
+        self.headlines = []
+        self.headline_chars = 0
+        for task in self.take_eager().values():
+            task.cancel()
+
+    def take_eager(self) -> Dict[int, asyncio.Task]:
+        """Detach the eager generations, e.g. to hand them to the batch that awaits them"""
+        eager, self.eager = self.eager, {}
+        return eager
+
+    def start_segment(self, topic: str) -> SegmentSession:
+        """Begin a new segment flow for this chat"""
+        if self.segment is not None:
+            self.segment.cancel_prefetch()
+        self.segment = SegmentSession(topic=topic)
+        return self.segment
+
+    def clear(self):
+        """Reset all flow state"""
+        self.clear_headlines()
+        if self.segment is not None:
+            self.segment.cancel_prefetch()
+        self.segment = None
@@ -0,0 +1,191 @@
+"""
+Resilience primitives for Gemini calls: typed errors, rolling latency
+percentiles and a circuit breaker
+"""
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+from src.config.settings import settings
+
+
+class GeminiError(Exception):
+    """Base class for Gemini call failures"""
+
+
+class QuotaExceededError(GeminiError):
+    """API quota or rate limit reached"""
+
+
+class DailyQuotaError(GeminiError):
+    """The chat has used its daily token quota; no call was made"""
+
+
+class InvalidRequestError(GeminiError):
+    """The request was rejected as invalid"""
+
+
+class GeminiUnavailableError(GeminiError):
+    """Transient backend failure (timeouts, 5xx)"""
+
+
+class CircuitOpenError(GeminiError):
+    """The circuit breaker is open and no fallback model is configured"""
+
+
+def classify_error(error: Exception) -> GeminiError:
+    """Map an SDK/transport exception to a typed GeminiError"""
+    if isinstance(error, GeminiError):
+        return error
+    # Imported here: google.api_core pulls in grpc, which is slow to import
+    from google.api_core import exceptions as google_exceptions
+    if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        return QuotaExceededError(str(error))
+    if isinstance(error, (google_exceptions.InvalidArgument, google_exceptions.BadRequest,
+                          google_exceptions.PermissionDenied)):
+        return InvalidRequestError(str(error))
+    if isinstance(error, (google_exceptions.DeadlineExceeded, google_exceptions.ServiceUnavailable,
+                          google_exceptions.InternalServerError, google_exceptions.GatewayTimeout,
+                          TimeoutError, ConnectionError)):
+        return GeminiUnavailableError(str(error))
+    return GeminiError(str(error))
+
+
+def trips_breaker(error: GeminiError) -> bool:
+    """Whether an error says something about backend health (bad input does not)"""
+    return not isinstance(error, (InvalidRequestError, CircuitOpenError))
+
+
+class LatencyTracker:
+    """Rolling latency samples per prompt class"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, prompt_class: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(prompt_class)
+            if samples is None:
+                samples = self._samples[prompt_class] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def count(self, prompt_class: str) -> int:
+        with self._lock:
+            return len(self._samples.get(prompt_class, ()))
+
+    def percentile(self, prompt_class: str, pct: float) -> Optional[float]:
+        """Return the pct-th percentile latency, or None without samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(prompt_class, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95/p99 and sample count per prompt class"""
+        with self._lock:
+            classes = list(self._samples)
+        return {
+            name: {
+                "count": self.count(name),
+                "p50": self.percentile(name, 50),
+                "p95": self.percentile(name, 95),
+                "p99": self.percentile(name, 99),
+            }
+            for name in classes
+        }
+
+
+class CircuitBreaker:
+    """
+    Opens when the failure ratio over the last `window` calls reaches
+    `failure_ratio`, then allows a single probe after `reset_seconds`. A
+    probe that is never resolved (released, or lost to a crash) stops
+    blocking a new one after another `reset_seconds`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_ratio: float = 0.5, min_calls: int = 10,
+                 window: int = 20, reset_seconds: float = 30):
+        self.failure_ratio = failure_ratio
+        self.min_calls = min_calls
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.error_counts: Dict[str, int] = {}
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """Whether a call to the primary backend may proceed"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and self._probing and now - self._probe_started >= self.reset_seconds:
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                self._probe_started = now
+                return True
+            return False
+
+    def release(self):
+        """End a call that said nothing about backend health; a pending probe may be retried"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(True)
+
+    def count_error(self, error: GeminiError):
+        """Tally an error by type for reporting"""
+        with self._lock:
+            name = type(error).__name__
+            self.error_counts[name] = self.error_counts.get(name, 0) + 1
+
+    def record_failure(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._open(now)
+                return
+            self._outcomes.append(False)
+            failures = self._outcomes.count(False)
+            if (len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_ratio):
+                self._open(now)
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self._probing = False
+        self._outcomes.clear()
+
+
+# Shared across AIService instances so every handler sees the same backend health
+gemini_latency = LatencyTracker()
+gemini_breaker = CircuitBreaker(
+    failure_ratio=settings.ai_breaker_failure_ratio,
+    min_calls=settings.ai_breaker_min_calls,
+    window=settings.ai_breaker_window,
+    reset_seconds=settings.ai_breaker_reset_seconds,
+)
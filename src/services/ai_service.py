@@ -1,39 +1,34 @@
 """
 AI Content Generation Service (complete version)
 """
-import google.generativeai as genai
+import asyncio
 import logging
-from typing import Optional
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Tuple
 from src.config.settings import settings
+from src.services.ai_resilience import (
+    CircuitOpenError, DailyQuotaError, GeminiError, InvalidRequestError, QuotaExceededError,
+    classify_error, gemini_breaker, gemini_latency, trips_breaker,
+)
+from src.services.model_router import ModelRouter, route_stats
+from src.services.prompt_cache import prompt_cache
+from src.services.semantic_cache import semantic_cache
+from src.services.usage_service import usage_counts, usage_ledger
 
 logger = logging.getLogger(__name__)
 
-class AIService:
-    def __init__(self):
-        self.model = self._configure_gemini()
-    
-    def _configure_gemini(self):
-        """Configure Gemini AI model"""
-        genai.configure(api_key=settings.gemini_api_key)
-        return genai.GenerativeModel('models/gemini-1.5-flash')
-    
-    def generate_av_prompt(self, category: str, content_text: str) -> str:
-        """Generate AV prompt (from your original code)"""
-        return f"""
-        {category} ವಿಭಾಗಕ್ಕೆ ಸಂಬಂಧಿಸಿದಂತೆ, ಕೆಳಗಿನ ಮಾಹಿತಿಯನ್ನು ಆಧರಿಸಿ ಒಂದು ಶಕ್ತಿಯುತವಾದ, ಶುದ್ಧ ಕನ್ನಡದಲ್ಲಿ ಬರೆಯಲ್ಪಟ್ಟ ಎಐ ಆಧಾರಿತ ಶೀರ್ಷಿಕೆ ರೂಪಿಸಿ. 
-
-        ಇದರ ಆವೃತ್ತಿ ಟಿವಿ ನ್ಯೂಸ್ ಎಂಕರ್ ಉಚ್ಚಾರಣೆಗೆ ಅನುಗುಣವಾಗಿ, ಒಂದು ಹೂರಣದಂತೆ ಇರಲಿ. ಅಂದರೆ, ಬೇರೆ ಬೇರೆ ವಾಕ್ಯಗಳ ಬದಲು ನಿರಂತರವಾಗಿ ಓದಬಹುದಾದ, ತೀವ್ರ ಶೈಲಿಯ ಒಂದು ಪ್ಯಾರಾಗ್ರಾಫ್ ಆಗಿರಬೇಕು.
-
-        ವಿಷಯ:
-        {content_text}
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
 
-        ಇದನ್ನು ಒಂದು ಶಕ್ತಿಯುತ ಕನ್ನಡ ಪ್ಯಾರಾಗ್ರಾಫ್ ರೂಪದಲ್ಲಿ ಬರೆಯಿರಿ.
-        """
-    
-    def generate_pkg_prompt(self, category: str, content_text: str) -> str:
-        """Generate PKG prompt (from your original code)"""
-        return f"""
-ನೀವು ಕನ್ನಡದ ಹಿರಿಯ ಸುದ್ದಿ ವರದಿಗಾರರಾಗಿದ್ದು, ಈ ಸುದ್ದಿ '{category}' ವರ್ಗಕ್ಕೆ ಸೇರಿದ ವರದಿ. ಕೆಳಗಿನ ಮಾಹಿತಿಯ ಆಧಾರದ ಮೇಲೆ ಸಂಪೂರ್ಣ ಪ್ಯಾಕೇಜ್ ಸ್ಕ್ರಿಪ್ಟ್ (PKG Script) ಸಿದ್ಧಪಡಿಸಿ.
+# Static prompt prefixes, uploaded once as Gemini cached content (see prompt_cache)
+PKG_INSTRUCTIONS = """
+ನೀವು ಕನ್ನಡದ ಹಿರಿಯ ಸುದ್ದಿ ವರದಿಗಾರರು. ಕೆಳಗೆ ನೀಡಿರುವ ವರ್ಗ ಮತ್ತು ಮಾಹಿತಿಯ ಆಧಾರದ ಮೇಲೆ ಸಂಪೂರ್ಣ ಪ್ಯಾಕೇಜ್ ಸ್ಕ್ರಿಪ್ಟ್ (PKG Script) ಸಿದ್ಧಪಡಿಸಿ.
 
 ಸ್ಕ್ರಿಪ್ಟ್ ಫಾರ್ಮಾಟ್ ಈ ರೀತಿ ಇರಲಿ:
 
@@ -55,15 +50,10 @@ Script:
 
 🎙 ಮುಕ್ತಾಯ:
 <ಅಧಿಕಾರಿಗಳ ಸ್ಪಂದನೆ ಸಾಧ್ಯತೆ, ಮುಂದಿನ ನಡೆಯ ಬಗ್ಗೆ ಪ್ರಶ್ನಾತ್ಮಕ ಮುಕ್ತಾಯ>
+"""
 
-ವಿಷಯ:
-{content_text}
-        """
-
-    def generate_speed50_av_prompt(self, content_text: str, category: str = "ಸಾಮಾನ್ಯ") -> str:
-        """Generate Speed 50 AV prompt"""
-        return f"""
-ನೀವು ಕನ್ನಡ ವಾರ್ತಾ ಆಂಕರ್. ಈ ಕೆಳಗಿನ '{category}' ವಿಷಯಕ್ಕಾಗಿ 60-90 ಸೆಕೆಂಡುಗಳ AV ಸ್ಕ್ರಿಪ್ಟ್ ರಚಿಸಿ:
+SPEED50_INSTRUCTIONS = """
+ನೀವು ಕನ್ನಡ ವಾರ್ತಾ ಆಂಕರ್. ಕೆಳಗೆ ನೀಡಿರುವ ವರ್ಗದ ವಿಷಯಕ್ಕಾಗಿ 60-90 ಸೆಕೆಂಡುಗಳ AV ಸ್ಕ್ರಿಪ್ಟ್ ರಚಿಸಿ:
 
 ನಿಯಮಗಳು:
 1. 1 ಪ್ಯಾರಾಗ್ರಾಫ್ ಮಾತ್ರ (4-5 ವಾಕ್ಯಗಳು)
@@ -71,29 +61,344 @@ Script:
 3. ಸ್ಥಳ, ಘಟನೆ, ಪ್ರಮುಖ ವಿವರಗಳು, ಒಂದು ಉಲ್ಲೇಖಿತ ಹೇಳಿಕೆ ಸೇರಿಸಿ
 4. ಶುದ್ಧ ಕನ್ನಡ, ಯಾವುದೇ ಇಂಗ್ಲಿಷ್ ಪದಗಳಿಲ್ಲ
 5. TV ಶೈಲಿಯಲ್ಲಿ ಸರಳ ಮತ್ತು ಸ್ಪಷ್ಟವಾಗಿ
+"""
+
+prompt_cache.register("pkg", PKG_INSTRUCTIONS)
+prompt_cache.register("speed50", SPEED50_INSTRUCTIONS)
+
+_configure_lock = threading.Lock()
+_configured = False
+
+def _genai():
+    """google.generativeai, imported on first use (it pulls in grpc and protobuf)"""
+    import google.generativeai as genai
+    return genai
+
+def __getattr__(name):
+    # Keep `ai_service.genai` addressable, e.g. for patching, without importing it eagerly
+    if name == "genai":
+        return _genai()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def configure_gemini():
+    """Configure the Gemini SDK once per process"""
+    global _configured
+    with _configure_lock:
+        if not _configured:
+            _genai().configure(api_key=settings.gemini_api_key)
+            _configured = True
+
+# Called after every model call as
+# listener(chat_id, flow, seconds, prompt_chars, output_chars, error_name_or_None)
+CallListener = Callable[[Optional[int], str, float, int, int, Optional[str]], None]
+_call_listeners: List[CallListener] = []
+
+def add_call_listener(listener: CallListener):
+    _call_listeners.append(listener)
+
+def remove_call_listener(listener: CallListener):
+    if listener in _call_listeners:
+        _call_listeners.remove(listener)
+
+def _notify_call(chat_id: Optional[int], flow: str, seconds: float, prompt_chars: int,
+                 output_chars: int, error: Optional[str] = None):
+    for listener in _call_listeners:
+        try:
+            listener(chat_id, flow, seconds, prompt_chars, output_chars, error)
+        except Exception as e:
+            logger.error("Call listener failed: %s", e)
+
+# Shared pool for primary and hedged Gemini calls
+_executor = ThreadPoolExecutor(max_workers=settings.ai_max_workers, thread_name_prefix="gemini")
+
+class AIService:
+    """
+    Gemini access for the handlers. The SDK is imported, configured and the
+    models built on first use (or by warm_up) so constructing the service is cheap.
+    """
+
+    _UNSET = object()
+
+    def __init__(self):
+        self._model = None
+        self._fallback_model = self._UNSET
+        self._router = None
+        self.prompt_cache = prompt_cache
+        self.route_stats = route_stats
+        self.latency = gemini_latency
+        self.breaker = gemini_breaker
+        self.usage = usage_ledger
+        self.hedges_fired = 0
+    
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self._configure_gemini()
+        return self._model
+
+    @model.setter
+    def model(self, value):
+        self._model = value
+
+    @property
+    def fallback_model(self):
+        if self._fallback_model is self._UNSET:
+            self._fallback_model = (
+                _genai().GenerativeModel(settings.gemini_fallback_model)
+                if settings.gemini_fallback_model else None
+            )
+        return self._fallback_model
+
+    @fallback_model.setter
+    def fallback_model(self, value):
+        self._fallback_model = value
+
+    @property
+    def router(self) -> ModelRouter:
+        if self._router is None:
+            self._router = ModelRouter()
+        return self._router
+
+    @router.setter
+    def router(self, value: ModelRouter):
+        self._router = value
+
+    def _configure_gemini(self):
+        """Configure Gemini AI model"""
+        configure_gemini()
+        return _genai().GenerativeModel('models/gemini-1.5-flash')
+
+    def ping(self):
+        """Cheapest Gemini round trip (count_tokens); opens the shared gRPC channel"""
+        configure_gemini()
+        self.model.count_tokens("ping")
+
+    def warm_up(self):
+        """Import the SDK and build every model now rather than on the first request"""
+        self.model
+        self.fallback_model
+        for route in self.router.routes:
+            route.model
+    
+    def generate_av_prompt(self, category: str, content_text: str) -> str:
+        """Generate AV prompt (from your original code)"""
+        return f"""
+        {category} ವಿಭಾಗಕ್ಕೆ ಸಂಬಂಧಿಸಿದಂತೆ, ಕೆಳಗಿನ ಮಾಹಿತಿಯನ್ನು ಆಧರಿಸಿ ಒಂದು ಶಕ್ತಿಯುತವಾದ, ಶುದ್ಧ ಕನ್ನಡದಲ್ಲಿ ಬರೆಯಲ್ಪಟ್ಟ ಎಐ ಆಧಾರಿತ ಶೀರ್ಷಿಕೆ ರೂಪಿಸಿ. 
+
+        ಇದರ ಆವೃತ್ತಿ ಟಿವಿ ನ್ಯೂಸ್ ಎಂಕರ್ ಉಚ್ಚಾರಣೆಗೆ ಅನುಗುಣವಾಗಿ, ಒಂದು ಹೂರಣದಂತೆ ಇರಲಿ. ಅಂದರೆ, ಬೇರೆ ಬೇರೆ ವಾಕ್ಯಗಳ ಬದಲು ನಿರಂತರವಾಗಿ ಓದಬಹುದಾದ, ತೀವ್ರ ಶೈಲಿಯ ಒಂದು ಪ್ಯಾರಾಗ್ರಾಫ್ ಆಗಿರಬೇಕು.
+
+        ವಿಷಯ:
+        {content_text}
+
+        ಇದನ್ನು ಒಂದು ಶಕ್ತಿಯುತ ಕನ್ನಡ ಪ್ಯಾರಾಗ್ರಾಫ್ ರೂಪದಲ್ಲಿ ಬರೆಯಿರಿ.
+        """
+    
+    def generate_pkg_prompt(self, category: str, content_text: str) -> str:
+        """Generate PKG prompt: the static PKG_INSTRUCTIONS prefix followed by the story"""
+        return f"""{PKG_INSTRUCTIONS}
+ವರ್ಗ: '{category}'
+
+ವಿಷಯ:
+{content_text}
+        """
+
+    def generate_speed50_av_prompt(self, content_text: str, category: str = "ಸಾಮಾನ್ಯ") -> str:
+        """Generate Speed 50 AV prompt: the static SPEED50_INSTRUCTIONS prefix followed by the headline"""
+        return f"""{SPEED50_INSTRUCTIONS}
+ವರ್ಗ: '{category}'
 
 ವಿಷಯ:
 {content_text}
 """
     
-    def generate_content(self, prompt: str) -> str:
-        """Generate content using Gemini"""
+    def generate_content(self, prompt: str, prompt_class: str = "default",
+                         target_words: Optional[int] = None, cached_prefix: Optional[str] = None,
+                         chat_id: Optional[int] = None) -> str:
+        """
+        Generate content using the Gemini model routed for this flow and size.
+        cached_prefix names a registered static prefix the prompt starts with;
+        when context caching is available only the rest of the prompt is sent.
+        chat_id is the chat the tokens are booked to and whose quota applies.
+        """
         try:
-            response = self.model.generate_content(
-                prompt,
-                safety_settings=[
-                    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-                ]
-            )
-            return response.text.strip() if response.text else "ಸಂಪಾದನೆ ಸಾಧ್ಯವಾಗಿಲ್ಲ."
-        except Exception as e:
-            logger.error(f"Gemini API error: {str(e)}")
-            if "quota" in str(e).lower():
-                return "ಕ್ಷಮಿಸಿ, API ಮಿತಿ ತಲುಪಿದೆ. ದಯವಿಟ್ಟು ನಂತರ ಪ್ರಯತ್ನಿಸಿ."
-            elif "invalid" in str(e).lower():
-                return "ದೋಷ: ಅಮಾನ್ಯ ವಿನಂತಿ. ದಯವಿಟ್ಟು ನಿಮ್ಮ ಇನ್ಪುಟ್ ಪರಿಶೀಲಿಸಿ."
+            text = self._generate_resilient(prompt, prompt_class, target_words, cached_prefix, chat_id)
+            return text.strip() if text else "ಸಂಪಾದನೆ ಸಾಧ್ಯವಾಗಿಲ್ಲ."
+        except GeminiError as e:
+            return self.error_message(e, prompt_class)
+    
+    def error_message(self, error: GeminiError, prompt_class: str = "default") -> str:
+        """Log a generation failure and return the apology shown to the user"""
+        if isinstance(error, DailyQuotaError):
+            logger.warning("Daily token quota reached: %s", error, extra={"flow": prompt_class})
+            return "ಕ್ಷಮಿಸಿ, ಇಂದಿನ ನಿಮ್ಮ ಬಳಕೆಯ ಮಿತಿ ಮುಗಿದಿದೆ. ದಯವಿಟ್ಟು ನಾಳೆ ಪ್ರಯತ್ನಿಸಿ."
+        if isinstance(error, QuotaExceededError):
+            logger.error("Gemini quota error: %s", error, extra={"flow": prompt_class})
+            return "ಕ್ಷಮಿಸಿ, API ಮಿತಿ ತಲುಪಿದೆ. ದಯವಿಟ್ಟು ನಂತರ ಪ್ರಯತ್ನಿಸಿ."
+        if isinstance(error, InvalidRequestError):
+            logger.error("Gemini invalid request: %s", error, extra={"flow": prompt_class})
+            return "ದೋಷ: ಅಮಾನ್ಯ ವಿನಂತಿ. ದಯವಿಟ್ಟು ನಿಮ್ಮ ಇನ್ಪುಟ್ ಪರಿಶೀಲಿಸಿ."
+        logger.error("Gemini API error (%s): %s", type(error).__name__, error, extra={"flow": prompt_class})
+        return "ಕ್ಷಮಿಸಿ, ಸೇವೆಯಲ್ಲಿ ತಾತ್ಕಾಲಿಕ ತೊಂದರೆ. ದಯವಿಟ್ಟು ನಂತರ ಪ್ರಯತ್ನಿಸಿ."
+    
+    async def agenerate_content(self, prompt: str, prompt_class: str = "default",
+                                target_words: Optional[int] = None,
+                                cached_prefix: Optional[str] = None,
+                                chat_id: Optional[int] = None) -> str:
+        """generate_content in a worker thread so the event loop keeps serving other chats"""
+        return await asyncio.to_thread(
+            self.generate_content, prompt, prompt_class, target_words, cached_prefix, chat_id
+        )
+    
+    async def agenerate_reusable(self, prompt: str, prompt_class: str, variable_text: str,
+                                 target_words: Optional[int] = None,
+                                 cached_prefix: Optional[str] = None,
+                                 chat_id: Optional[int] = None) -> Tuple[str, Optional[float]]:
+        """
+        Like agenerate_content, but first look for an earlier output whose
+        input (variable_text, the user-supplied part of the prompt) is a near
+        match. Returns (text, similarity), where similarity is None for a
+        fresh generation so callers can tell the editor a script was reused.
+        Only successful generations are remembered.
+        """
+        threshold = settings.semantic_cache_thresholds.get(prompt_class)
+        if threshold is not None:
+            match = await asyncio.to_thread(semantic_cache.lookup, prompt_class, variable_text, threshold)
+            if match is not None:
+                logger.info("Reusing near-match output (similarity %.3f)", match[1], extra={"flow": prompt_class})
+                return match
+        try:
+            text = await self.agenerate_strict(prompt, prompt_class, target_words, cached_prefix, chat_id)
+        except GeminiError as e:
+            return self.error_message(e, prompt_class), None
+        if not text:
+            return "ಸಂಪಾದನೆ ಸಾಧ್ಯವಾಗಿಲ್ಲ.", None
+        text = text.strip()
+        if threshold is not None:
+            await asyncio.to_thread(semantic_cache.store, prompt_class, variable_text, text)
+        return text, None
+    
+    async def agenerate_strict(self, prompt: str, prompt_class: str = "default",
+                               target_words: Optional[int] = None,
+                               cached_prefix: Optional[str] = None,
+                               chat_id: Optional[int] = None) -> str:
+        """Like agenerate_content, but raises GeminiError instead of returning an apology"""
+        return await asyncio.to_thread(
+            self._generate_resilient, prompt, prompt_class, target_words, cached_prefix, chat_id
+        )
+    
+    def _generate_resilient(self, prompt: str, prompt_class: str,
+                            target_words: Optional[int] = None,
+                            cached_prefix: Optional[str] = None,
+                            chat_id: Optional[int] = None) -> str:
+        """
+        Call the routed Gemini model behind the circuit breaker, switching to the
+        fallback model while it is open. Raises a typed GeminiError on failure,
+        including DailyQuotaError (before any call) when chat_id is over quota.
+        """
+        self.usage.check_quota(chat_id)
+        configure_gemini()
+        route = self.router.select(prompt_class, len(prompt), target_words)
+        model = route.model if route is not None else self.model
+        primary = self.breaker.allow()
+        if not primary:
+            if self.fallback_model is None:
+                raise CircuitOpenError("Gemini circuit open")
+            model = self.fallback_model
+        
+        contents = prompt
+        if primary and cached_prefix and route is not None:
+            variable = self.prompt_cache.split(cached_prefix, prompt)
+            cached_model = None
+            if variable is not None:
+                cached_model = self.prompt_cache.model_for(
+                    cached_prefix, route.model_name, route.generation_config()
+                )
+            if cached_model is not None:
+                model, contents = cached_model, variable
+        
+        start = time.monotonic()
+        try:
+            # Never hedge against a backend that is already struggling
+            if primary and self.breaker.state == self.breaker.CLOSED:
+                response = self._hedged_call(model, contents, prompt_class)
             else:
-                return "ಕ್ಷಮಿಸಿ, ಸೇವೆಯಲ್ಲಿ ತಾತ್ಕಾಲಿಕ ತೊಂದರೆ. ದಯವಿಟ್ಟು ನಂತರ ಪ್ರಯತ್ನಿಸಿ."
\ No newline at end of file
+                response = self._call_model(model, contents)
+        except Exception as e:
+            error = classify_error(e)
+            _notify_call(chat_id, prompt_class, time.monotonic() - start, len(contents), 0, type(error).__name__)
+            self.breaker.count_error(error)
+            if primary and trips_breaker(error):
+                self.breaker.record_failure()
+            elif primary:
+                self.breaker.release()
+            if primary and route is not None:
+                self.route_stats.record_error(route)
+            raise error from e
+        
+        text = self._response_text(response)
+        elapsed = time.monotonic() - start
+        _notify_call(chat_id, prompt_class, elapsed, len(contents), len(text))
+        input_tokens, output_tokens = self._token_counts(response, prompt, text)
+        if settings.enable_analytics:
+            total_tokens = usage_counts(response)[2]
+            self.usage.record(
+                chat_id, prompt_class, input_tokens, output_tokens,
+                total_tokens if total_tokens is not None else input_tokens + output_tokens, elapsed,
+            )
+        if primary:
+            self.breaker.record_success()
+            self.latency.record(prompt_class, elapsed)
+            logger.debug("Gemini call finished", extra={"flow": prompt_class, "latency_ms": int(elapsed * 1000)})
+            if route is not None:
+                self.route_stats.record(route, elapsed, input_tokens, output_tokens)
+        return text
+    
+    def _hedged_call(self, model, prompt: str, prompt_class: str):
+        """
+        Run the call and, if it outlives the class's tail latency, fire one
+        duplicate request and take whichever answers first.
+        """
+        delay = self._hedge_delay(prompt_class)
+        if delay is None:
+            return self._call_model(model, prompt)
+        
+        first = _executor.submit(self._call_model, model, prompt)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        
+        self.hedges_fired += 1
+        logger.info("Hedging Gemini call after %.2fs", delay, extra={"flow": prompt_class})
+        second = _executor.submit(self._call_model, model, prompt)
+        done, pending = wait([first, second], return_when=FIRST_COMPLETED)
+        winner = done.pop()
+        if winner.exception() is not None and pending:
+            return pending.pop().result()
+        return winner.result()
+    
+    def _hedge_delay(self, prompt_class: str) -> Optional[float]:
+        """Latency after which a hedge fires, or None until enough samples exist"""
+        if not settings.ai_hedge_enabled:
+            return None
+        if self.latency.count(prompt_class) < settings.ai_hedge_min_samples:
+            return None
+        return self.latency.percentile(prompt_class, settings.ai_hedge_percentile)
+    
+    def _call_model(self, model, prompt: str):
+        return model.generate_content(prompt, safety_settings=SAFETY_SETTINGS)
+    
+    def _token_counts(self, response, prompt: str, text: str):
+        """Prompt/output token counts from usage metadata, estimated from length if absent"""
+        input_tokens, output_tokens, _ = usage_counts(response)
+        if input_tokens is None:
+            input_tokens = len(prompt) // 4
+        if output_tokens is None:
+            output_tokens = len(text) // 4
+        return input_tokens, output_tokens
+    
+    def _response_text(self, response) -> str:
+        """Return the response text, or "" when the response was blocked or empty"""
+        try:
+            return response.text or ""
+        except ValueError:
+            return ""
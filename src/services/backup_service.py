@@ -0,0 +1,250 @@
+"""
+Incremental backups of bot state (SQLite database, templates, exports)
+"""
+import asyncio
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tarfile
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.config.settings import settings
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+ARCHIVE_PREFIX = "backup-"
+ARCHIVE_SUFFIX = ".tar.gz"
+MANIFEST_SUFFIX = ".manifest.json"
+DB_MEMBER = "db/bot.db"
+
+class BackupError(Exception):
+    """Raised when a backup cannot be written or a restore fails verification"""
+
+def sqlite_path_from_url(url: str) -> Optional[Path]:
+    """Filesystem path for a sqlite:/// URL, or None for other databases"""
+    if not url.startswith("sqlite:///"):
+        return None
+    return Path(url[len("sqlite:///"):])
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def snapshot_sqlite(source: Path, dest: Path, pages: int, sleep: float):
+    """
+    Copy a live SQLite database with the online backup API. Copying `pages`
+    pages per step and sleeping in between keeps the source lock short, so
+    the bot's own writes are never held up for long.
+    """
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(dest)
+    try:
+        src.backup(dst, pages=pages, sleep=sleep)
+    finally:
+        dst.close()
+        src.close()
+
+class BackupService:
+    """
+    Writes backup-<timestamp>.tar.gz archives holding only the files whose
+    content changed since the previous backup, plus a manifest mapping every
+    backed-up file to its sha256 and the archive that holds it. Restoring
+    from a manifest pulls each file from whichever archive has it.
+    """
+
+    def __init__(self, backup_dir: Optional[str] = None, keep: Optional[int] = None):
+        self.backup_dir = Path(backup_dir or settings.backup_dir)
+        self.keep = keep or settings.backup_keep
+        self.db_path = sqlite_path_from_url(settings.database_url)
+        self.sources = {
+            "templates": Path(settings.templates_dir),
+            "exports": Path(settings.exports_dir),
+        }
+
+    # Manifests
+
+    def manifests(self) -> List[Path]:
+        """Manifests oldest first"""
+        if not self.backup_dir.exists():
+            return []
+        return sorted(self.backup_dir.glob(f"{ARCHIVE_PREFIX}*{MANIFEST_SUFFIX}"))
+
+    def load_manifest(self, path: Optional[Path] = None) -> Optional[dict]:
+        """Load the given manifest, or the latest one"""
+        if path is None:
+            manifests = self.manifests()
+            if not manifests:
+                return None
+            path = manifests[-1]
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    # Backup
+
+    def run_backup(self, now: Optional[datetime] = None) -> dict:
+        """Write one incremental backup and apply retention. Returns the manifest."""
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        now = now or datetime.now(timezone.utc)
+        name = f"{ARCHIVE_PREFIX}{now.strftime('%Y%m%dT%H%M%S')}"
+        archive_name = name + ARCHIVE_SUFFIX
+        previous = (self.load_manifest() or {}).get("files", {})
+        started = time.monotonic()
+
+        files: Dict[str, dict] = {}
+        changed: Dict[str, Path] = {}
+        with tempfile.TemporaryDirectory(dir=self.backup_dir) as tmp:
+            for member, path in self._candidates(Path(tmp)):
+                entry = self._entry(member, path, previous.get(member))
+                if entry.get("archive") is None:
+                    entry["archive"] = archive_name
+                    changed[member] = path
+                files[member] = entry
+
+            manifest = {
+                "created": now.isoformat(),
+                "archive": archive_name if changed else None,
+                "files": files,
+            }
+            if changed:
+                self._write_archive(self.backup_dir / archive_name, changed, manifest)
+
+        manifest_path = self.backup_dir / (name + MANIFEST_SUFFIX)
+        tmp_manifest = manifest_path.with_suffix(".tmp")
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_manifest, manifest_path)
+
+        pruned = self.prune()
+        logger.info(
+            "Backup %s: %d files, %d changed, %d archives pruned in %.1fs",
+            name, len(files), len(changed), len(pruned), time.monotonic() - started
+        )
+        return manifest
+
+    async def backup_job(self, context):
+        """Job queue callback that runs a backup off the event loop"""
+        try:
+            await asyncio.to_thread(self.run_backup)
+        except Exception as e:
+            logger.error("Scheduled backup failed: %s", e)
+
+    def _candidates(self, tmp: Path):
+        """(member name, path) for everything to back up"""
+        if self.db_path is not None and self.db_path.exists():
+            snapshot = tmp / "bot.db"
+            snapshot_sqlite(self.db_path, snapshot,
+                            settings.backup_pages_per_step, settings.backup_step_sleep_seconds)
+            yield DB_MEMBER, snapshot
+        for prefix, root in self.sources.items():
+            if not root.exists():
+                continue
+            for path in sorted(root.rglob("*")):
+                if path.is_file():
+                    yield f"{prefix}/{path.relative_to(root).as_posix()}", path
+
+    def _entry(self, member: str, path: Path, previous: Optional[dict]) -> dict:
+        """Manifest entry; keeps the previous archive pointer when content is unchanged"""
+        st = path.stat()
+        # Unchanged size and mtime: skip rehashing (not for the fresh DB snapshot)
+        if (previous and member != DB_MEMBER and previous["size"] == st.st_size
+                and previous["mtime"] == st.st_mtime):
+            return dict(previous)
+        digest = file_sha256(path)
+        if previous and previous["sha256"] == digest:
+            return dict(previous, mtime=previous["mtime"] if member == DB_MEMBER else st.st_mtime)
+        return {"sha256": digest, "size": st.st_size, "mtime": st.st_mtime, "archive": None}
+
+    def _write_archive(self, target: Path, changed: Dict[str, Path], manifest: dict):
+        tmp_target = target.with_suffix(".tmp")
+        with tarfile.open(tmp_target, "w:gz", compresslevel=6) as tar:
+            for member, path in changed.items():
+                tar.add(str(path), arcname=member, recursive=False)
+            data = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+            info = tarfile.TarInfo("manifest.json")
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+        os.replace(tmp_target, target)
+
+    # Retention
+
+    def prune(self) -> List[str]:
+        """
+        Keep the newest `keep` manifests. Older archives are deleted unless a
+        kept manifest still points into them.
+        """
+        manifests = self.manifests()
+        expired, kept = manifests[:-self.keep], manifests[-self.keep:]
+        referenced = set()
+        for path in kept:
+            for entry in self.load_manifest(path)["files"].values():
+                referenced.add(entry["archive"])
+
+        pruned = []
+        for path in expired:
+            archive = path.name[:-len(MANIFEST_SUFFIX)] + ARCHIVE_SUFFIX
+            archive_path = self.backup_dir / archive
+            if archive not in referenced and archive_path.exists():
+                archive_path.unlink()
+                pruned.append(archive)
+            path.unlink()
+        return pruned
+
+    # Restore
+
+    def restore(self, target_dir: str, manifest_path: Optional[Path] = None) -> List[str]:
+        """
+        Restore every file in a manifest (default: latest) under target_dir,
+        verifying each sha256 and the SQLite integrity of the database.
+        Returns the restored member names.
+        """
+        manifest = self.load_manifest(manifest_path)
+        if manifest is None:
+            raise BackupError("No backups found")
+        target = Path(target_dir)
+
+        by_archive: Dict[str, Dict[str, dict]] = {}
+        for member, entry in manifest["files"].items():
+            by_archive.setdefault(entry["archive"], {})[member] = entry
+
+        restored = []
+        for archive, members in by_archive.items():
+            archive_path = self.backup_dir / archive
+            if not archive_path.exists():
+                raise BackupError(f"Archive {archive} is missing")
+            with tarfile.open(archive_path, "r:gz") as tar:
+                for member, entry in members.items():
+                    dest = target / member
+                    if not dest.resolve().is_relative_to(target.resolve()):
+                        raise BackupError(f"Refusing to restore outside target: {member}")
+                    dest.parent.mkdir(parents=True, exist_ok=True)
+                    source = tar.extractfile(member)
+                    if source is None:
+                        raise BackupError(f"{member} missing from {archive}")
+                    with source, open(dest, "wb") as out:
+                        for chunk in iter(lambda: source.read(1024 * 1024), b""):
+                            out.write(chunk)
+                    if file_sha256(dest) != entry["sha256"]:
+                        raise BackupError(f"Checksum mismatch for {member}")
+                    restored.append(member)
+
+        db_file = target / DB_MEMBER
+        if db_file.exists():
+            conn = sqlite3.connect(db_file)
+            try:
+                result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            finally:
+                conn.close()
+            if result != "ok":
+                raise BackupError(f"Restored database failed integrity check: {result}")
+        return restored
@@ -0,0 +1,50 @@
+"""
+Registry of in-process caches for reporting and flushing
+"""
+from typing import Dict
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class CacheRegistry:
+    """
+    Caches register themselves by name. A registered cache provides
+    cache_stats() -> dict (with "hits" and "misses" or "fallbacks") and flush().
+    """
+
+    def __init__(self):
+        self._caches: Dict[str, object] = {}
+
+    def register(self, name: str, cache):
+        self._caches[name] = cache
+
+    def names(self):
+        return list(self._caches)
+
+    def stats(self) -> Dict[str, dict]:
+        """Per-cache stats with a derived hit_rate"""
+        report = {}
+        for name, cache in self._caches.items():
+            stats = dict(cache.cache_stats())
+            hits = stats.get("hits", 0)
+            misses = stats.get("misses", stats.get("fallbacks", 0))
+            total = hits + misses
+            stats["hit_rate"] = hits / total if total else None
+            report[name] = stats
+        return report
+
+    def flush(self, name: str = None) -> list:
+        """Flush one cache, or all when name is None. Returns the names flushed."""
+        targets = [name] if name else list(self._caches)
+        flushed = []
+        for target in targets:
+            cache = self._caches.get(target)
+            if cache is not None:
+                cache.flush()
+                flushed.append(target)
+        logger.info(f"Flushed caches: {flushed}")
+        return flushed
+
+# Global cache registry
+cache_registry = CacheRegistry()
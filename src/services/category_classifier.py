@@ -0,0 +1,135 @@
+"""
+Local news category classifier: multinomial naive Bayes over hashed
+character n-grams, stored as flat float32 arrays
+"""
+import math
+import operator
+import re
+import struct
+import zlib
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+MAGIC = b"KCLS"
+VERSION = 1
+NGRAM_SIZES = (3, 4, 5)
+DEFAULT_DIMENSIONS = 1 << 13
+
+_NOISE_RE = re.compile(r"[^\w\u0C80-\u0CFF]+")
+_HEADER = struct.Struct("<4sHHI")
+
+def features(text: str, dimensions: int = DEFAULT_DIMENSIONS) -> Dict[int, int]:
+    """Hashed counts of the character n-grams of each space-padded word"""
+    counts: Counter = Counter()
+    for word in _NOISE_RE.sub(" ", text.casefold()).split():
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            for i in range(len(padded) - n + 1):
+                counts[zlib.crc32(padded[i:i + n].encode("utf-8")) % dimensions] += 1
+    return counts
+
+def load_samples(path: str) -> List[Tuple[str, str]]:
+    """(label, text) pairs from a label<TAB>text file; blank and # lines are skipped"""
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            label, _, text = line.partition("\t")
+            if text:
+                samples.append((label.strip(), text.strip()))
+    return samples
+
+class CategoryModel:
+    """
+    weights holds log P(feature | label) laid out feature-major
+    (weights[feature * n_labels + label]), so scoring a text adds one
+    contiguous row per feature to every label's score at once.
+    """
+
+    def __init__(self, labels: Sequence[str], dimensions: int, log_priors: array, weights: array):
+        self.labels = list(labels)
+        self.dimensions = dimensions
+        self.log_priors = log_priors
+        self.weights = weights
+
+    @classmethod
+    def train(cls, samples: Iterable[Tuple[str, str]], dimensions: int = DEFAULT_DIMENSIONS,
+              alpha: float = 0.05) -> "CategoryModel":
+        samples = list(samples)
+        labels = sorted({label for label, _ in samples})
+        index = {label: i for i, label in enumerate(labels)}
+        n_labels = len(labels)
+
+        doc_counts = [0] * n_labels
+        feature_counts = [[0.0] * dimensions for _ in labels]
+        for label, text in samples:
+            row = feature_counts[index[label]]
+            doc_counts[index[label]] += 1
+            for feature, count in features(text, dimensions).items():
+                row[feature] += count
+
+        log_priors = array("f", (math.log(count / len(samples)) for count in doc_counts))
+        weights = array("f", bytes(4 * dimensions * n_labels))
+        for i, row in enumerate(feature_counts):
+            denominator = math.log(sum(row) + alpha * dimensions)
+            for feature, count in enumerate(row):
+                weights[feature * n_labels + i] = math.log(count + alpha) - denominator
+        return cls(labels, dimensions, log_priors, weights)
+
+    def scores(self, texts: Sequence[str]) -> List[List[float]]:
+        """Unnormalized log posteriors, one list per text in label order"""
+        n_labels = len(self.labels)
+        weights = self.weights
+        results = []
+        for text in texts:
+            total = list(self.log_priors)
+            for feature, count in features(text, self.dimensions).items():
+                start = feature * n_labels
+                row = weights[start:start + n_labels]
+                if count == 1:
+                    total = list(map(operator.add, total, row))
+                else:
+                    total = [t + count * w for t, w in zip(total, row)]
+            results.append(total)
+        return results
+
+    def predict(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """(label, posterior probability) for each text"""
+        predictions = []
+        for total in self.scores(texts):
+            best = max(range(len(total)), key=total.__getitem__)
+            peak = total[best]
+            norm = sum(math.exp(score - peak) for score in total)
+            predictions.append((self.labels[best], 1.0 / norm))
+        return predictions
+
+    def save(self, path: str):
+        """Write header, labels and the two float32 arrays to one file"""
+        encoded = "\n".join(self.labels).encode("utf-8")
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(self.labels), self.dimensions))
+            f.write(struct.pack("<I", len(encoded)))
+            f.write(encoded)
+            f.write(self.log_priors.tobytes())
+            f.write(self.weights.tobytes())
+
+    @classmethod
+    def load(cls, path: str) -> "CategoryModel":
+        with open(path, "rb") as f:
+            magic, version, n_labels, dimensions = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} category model")
+            (label_bytes,) = struct.unpack("<I", f.read(4))
+            labels = f.read(label_bytes).decode("utf-8").split("\n")
+            log_priors = array("f")
+            log_priors.frombytes(f.read(4 * n_labels))
+            weights = array("f")
+            weights.frombytes(f.read(4 * n_labels * dimensions))
+        if len(labels) != n_labels or len(weights) != n_labels * dimensions:
+            raise ValueError(f"{path} is truncated")
+        return cls(labels, dimensions, log_priors, weights)
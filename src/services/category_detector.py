@@ -2,18 +2,66 @@
 Category Detection Service (migrated from your category_detector.py)
 """
 import logging
+import threading
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from src.config.settings import settings
+from src.services.category_classifier import CategoryModel
 
 logger = logging.getLogger(__name__)
 
+_model: Optional[CategoryModel] = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+def shared_model() -> Optional[CategoryModel]:
+    """The trained classifier from settings.category_model_path, loaded once; None if absent"""
+    global _model, _model_loaded
+    if not _model_loaded:
+        with _model_lock:
+            if not _model_loaded:
+                path = Path(settings.category_model_path)
+                if path.exists():
+                    try:
+                        _model = CategoryModel.load(str(path))
+                        logger.info("Loaded category model %s (%d labels)", path, len(_model.labels))
+                    except (OSError, ValueError) as e:
+                        logger.error("Could not load category model %s: %s", path, e)
+                else:
+                    logger.info("No category model at %s; using keyword rules", path)
+                _model_loaded = True
+    return _model
+
 class CategoryDetector:
+    def __init__(self, model: Optional[CategoryModel] = None):
+        self._model = model
+
+    @property
+    def model(self) -> Optional[CategoryModel]:
+        return self._model if self._model is not None else shared_model()
+
     def detect_category(self, user_category: str, content_text: str) -> str:
         """
-        Uses the user-provided category as-is if given, else falls back to keyword detection.
+        Uses the user-provided category as-is if given, else the trained
+        classifier, falling back to keyword detection when it is unsure.
         """
         if user_category and user_category.strip() != "":
             return user_category.strip()
+        return self.detect_categories([content_text])[0]
+
+    def detect_categories(self, texts: Sequence[str]) -> List[str]:
+        """Categories for many texts at once (e.g. a Speed 50 upload)"""
+        model = self.model
+        if model is None:
+            return [self.keyword_category(text) for text in texts]
+        return [
+            label if confidence >= settings.category_min_confidence else self.keyword_category(text)
+            for text, (label, confidence) in zip(texts, model.predict(texts))
+        ]
 
-        # Fallback: keyword-based detection
+    def keyword_category(self, content_text: str) -> str:
+        """Keyword rules: first matching rule wins"""
         text_lower = content_text.lower()
 
         if "ರಾಜಕೀಯ" in text_lower or "ಸಿಎಂ" in text_lower or "ಪಕ್ಷ" in text_lower:
@@ -35,4 +83,4 @@ class CategoryDetector:
         if "ಬ್ಯಾಂಕ್" in text_lower or "ಹೂಡಿಕೆ" in text_lower:
             return "business"
 
-        return "general"
\ No newline at end of file
+        return "general"
@@ -0,0 +1,143 @@
+"""
+Model routing: pick a Gemini model and generation config per request
+"""
+import json
+import threading
+from typing import Dict, List, Optional
+
+from src.config.constants import MODEL_ROUTES
+from src.config.settings import settings
+from src.services.ai_resilience import LatencyTracker
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+def __getattr__(name):
+    # google.generativeai is imported on first use; keep `model_router.genai` addressable
+    if name == "genai":
+        import google.generativeai as genai
+        return genai
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class ModelRoute:
+    """One row of the routing table; the model is built on first use"""
+
+    __slots__ = (
+        "name", "flows", "model_name", "max_output_tokens", "temperature",
+        "max_input_chars", "max_target_words", "cost_per_1k_input",
+        "cost_per_1k_output", "_model",
+    )
+
+    def __init__(self, name: str, flows: List[str], model: str, max_output_tokens: int,
+                 temperature: float, max_input_chars: Optional[int] = None,
+                 max_target_words: Optional[int] = None, cost_per_1k_input: float = 0.0,
+                 cost_per_1k_output: float = 0.0):
+        self.name = name
+        self.flows = tuple(flows)
+        self.model_name = model
+        self.max_output_tokens = max_output_tokens
+        self.temperature = temperature
+        self.max_input_chars = max_input_chars
+        self.max_target_words = max_target_words
+        self.cost_per_1k_input = cost_per_1k_input
+        self.cost_per_1k_output = cost_per_1k_output
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self.build()
+        return self._model
+
+    def matches(self, flow: str, input_chars: int, target_words: Optional[int]) -> bool:
+        if "*" not in self.flows and flow not in self.flows:
+            return False
+        if self.max_input_chars is not None and input_chars > self.max_input_chars:
+            return False
+        if (self.max_target_words is not None and target_words is not None
+                and target_words > self.max_target_words):
+            return False
+        return True
+
+    def generation_config(self):
+        import google.generativeai as genai
+        return genai.GenerationConfig(
+            max_output_tokens=self.max_output_tokens,
+            temperature=self.temperature,
+        )
+
+    def build(self):
+        """Create the model instance with this route's generation config"""
+        import google.generativeai as genai
+        self._model = genai.GenerativeModel(self.model_name, generation_config=self.generation_config())
+        return self._model
+
+    def cost(self, input_tokens: int, output_tokens: int) -> float:
+        return (input_tokens * self.cost_per_1k_input + output_tokens * self.cost_per_1k_output) / 1000
+
+
+class RouteStats:
+    """Per-route call counts, latency, token and cost totals"""
+
+    def __init__(self):
+        self.latency = LatencyTracker()
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, route: str) -> Dict[str, float]:
+        entry = self._totals.get(route)
+        if entry is None:
+            entry = self._totals[route] = {
+                "calls": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0,
+            }
+        return entry
+
+    def record(self, route: ModelRoute, seconds: float, input_tokens: int, output_tokens: int):
+        self.latency.record(route.name, seconds)
+        with self._lock:
+            entry = self._entry(route.name)
+            entry["calls"] += 1
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            entry["cost"] += route.cost(input_tokens, output_tokens)
+
+    def record_error(self, route: ModelRoute):
+        with self._lock:
+            self._entry(route.name)["errors"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Totals plus p50/p95 latency per route"""
+        with self._lock:
+            totals = {name: dict(entry) for name, entry in self._totals.items()}
+        for name, entry in totals.items():
+            entry["p50"] = self.latency.percentile(name, 50)
+            entry["p95"] = self.latency.percentile(name, 95)
+        return totals
+
+
+def load_routes() -> List[dict]:
+    """Routing table from settings.model_routes_file, else the built-in default"""
+    if settings.model_routes_file:
+        try:
+            with open(settings.model_routes_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load model routes from {settings.model_routes_file}: {e}")
+    return MODEL_ROUTES
+
+
+class ModelRouter:
+    """Selects the first route matching a request's flow and size"""
+
+    def __init__(self, routes: Optional[List[dict]] = None):
+        self.routes = [ModelRoute(**row) for row in (routes or load_routes())]
+
+    def select(self, flow: str, input_chars: int, target_words: Optional[int] = None) -> Optional[ModelRoute]:
+        for route in self.routes:
+            if route.matches(flow, input_chars, target_words):
+                return route
+        return None
+
+
+# Shared so stats aggregate across every AIService instance
+route_stats = RouteStats()
@@ -0,0 +1,185 @@
+"""
+Scheduled research pre-warm: segment topics requested recently (and any
+configured ones) get their search hits and articles refreshed into the
+caches ahead of peak hours
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from src.config.settings import settings
+from src.core.drain import drain_controller
+from src.core.lanes import generation_lanes
+from src.services.backup_service import sqlite_path_from_url
+from src.services.search_service import normalize_topic
+from src.services.usage_service import usage_day
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class TopicHistory:
+    """Daily request counts per normalized segment topic in the topic_requests table"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS topic_requests (
+        day TEXT NOT NULL, topic TEXT NOT NULL, requests INTEGER NOT NULL,
+        PRIMARY KEY (day, topic)
+    );
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        path = db_path or sqlite_path_from_url(settings.database_url)
+        self.db_path = Path(path) if path is not None else None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """One transaction on a short-lived connection"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=10)
+        try:
+            with conn:
+                conn.executescript(self.SCHEMA)
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, topic: str, now: Optional[float] = None):
+        topic = normalize_topic(topic)
+        if not topic or self.db_path is None:
+            return
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO topic_requests (day, topic, requests) VALUES (?, ?, 1) "
+                    "ON CONFLICT(day, topic) DO UPDATE SET requests = requests + 1",
+                    (usage_day(now), topic),
+                )
+        except sqlite3.Error as e:
+            logger.error("Recording topic request failed: %s", e)
+
+    def top(self, n: int, days: int, now: Optional[float] = None) -> List[str]:
+        """The n most requested topics over the last days days, most requested first"""
+        if n <= 0 or self.db_path is None or not self.db_path.exists():
+            return []
+        since = usage_day((time.time() if now is None else now) - days * 86400)
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT topic FROM topic_requests WHERE day > ? GROUP BY topic "
+                    "ORDER BY SUM(requests) DESC, MAX(day) DESC LIMIT ?",
+                    (since, n),
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.error("Reading topic history failed: %s", e)
+            return []
+        return [topic for (topic,) in rows]
+
+    def prune(self, days: int, now: Optional[float] = None) -> int:
+        """Drop counts older than days days; returns rows removed"""
+        if self.db_path is None or not self.db_path.exists():
+            return 0
+        before = usage_day((time.time() if now is None else now) - days * 86400)
+        try:
+            with self._lock, self._connect() as conn:
+                return conn.execute("DELETE FROM topic_requests WHERE day <= ?", (before,)).rowcount
+        except sqlite3.Error as e:
+            logger.error("Pruning topic history failed: %s", e)
+            return 0
+
+def prewarm_times() -> List:
+    """settings.prewarm_times as timezone-aware datetime.time values in server local time"""
+    tz = datetime.now().astimezone().tzinfo
+    times = []
+    for value in settings.prewarm_times:
+        try:
+            times.append(datetime.strptime(value.strip(), "%H:%M").time().replace(tzinfo=tz))
+        except ValueError:
+            logger.error("Ignoring prewarm time %r (expected HH:MM)", value)
+    return times
+
+def seconds_until_next_prewarm(now: Optional[datetime] = None) -> Optional[float]:
+    """Seconds from now to the next scheduled pre-warm run, or None when none are scheduled"""
+    now = now or datetime.now().astimezone()
+    waits = []
+    for at in prewarm_times():
+        run = now.replace(hour=at.hour, minute=at.minute, second=0, microsecond=0)
+        if run <= now:
+            run += timedelta(days=1)
+        waits.append((run - now).total_seconds())
+    return min(waits) if waits else None
+
+class ResearchPrewarmer:
+    """
+    Refreshes web research for the configured topics, then the history's
+    top topics, one at a time. It gives way to live traffic: it pauses
+    between topics and while any generation is running, stops at
+    prewarm_budget_seconds and never starts while the bot is draining.
+
+    History topics are kept only if the segment flow would search them
+    unprompted (classify_topic_type == "factual", as in prefetch_research);
+    configured topics are always refreshed. Refreshed hits are cached until
+    the next scheduled run (plus its budget) rather than for the usual
+    search_cache_ttl_seconds, so the warm entries last through the peak.
+    """
+
+    def __init__(self, segment_service, history: Optional[TopicHistory] = None):
+        self.segment_service = segment_service
+        self.history = history or topic_history
+        self.last_run: Dict[str, object] = {}
+
+    def topics(self) -> List[str]:
+        topics = [normalize_topic(topic) for topic in settings.prewarm_topics]
+        topics += [
+            topic for topic in self.history.top(settings.prewarm_top_n, settings.prewarm_history_days)
+            if self.segment_service.classify_topic_type(topic) == "factual"
+        ]
+        return [topic for topic in dict.fromkeys(topics) if topic]
+
+    def warm_ttl(self, budget: float) -> float:
+        """How long refreshed hits stay cached: until the next run has had its budget"""
+        until_next = seconds_until_next_prewarm()
+        if until_next is None:
+            return settings.search_cache_ttl_seconds
+        return max(settings.search_cache_ttl_seconds, until_next + budget)
+
+    async def run(self, budget: Optional[float] = None, pause: Optional[float] = None) -> Dict[str, object]:
+        budget = settings.prewarm_budget_seconds if budget is None else budget
+        pause = settings.prewarm_pause_seconds if pause is None else pause
+        started = time.monotonic()
+        topics = await asyncio.to_thread(self.topics)
+        ttl = self.warm_ttl(budget)
+        warmed = 0
+        for topic in topics:
+            while generation_lanes.in_flight and time.monotonic() - started < budget:
+                await asyncio.sleep(pause)
+            if drain_controller.draining or time.monotonic() - started >= budget:
+                break
+            try:
+                await self.segment_service.web_research(topic, refresh=True, ttl=ttl)
+                warmed += 1
+            except Exception as e:
+                logger.error("Pre-warming research for %r failed: %s", topic, e, extra={"flow": "segment"})
+            await asyncio.sleep(pause)
+        self.last_run = {
+            "at": time.time(), "topics": len(topics), "warmed": warmed,
+            "seconds": round(time.monotonic() - started, 1),
+        }
+        logger.info("Research pre-warm: %d/%d topics in %.1fs", warmed, len(topics),
+                    self.last_run["seconds"], extra={"flow": "segment"})
+        return self.last_run
+
+    async def prewarm_job(self, context):
+        """Job queue callback"""
+        if not settings.enable_web_search:
+            return
+        await self.run()
+        await asyncio.to_thread(self.history.prune, max(settings.prewarm_history_days, 1) * 4)
+
+# Global topic history (recorded by the segment flow when analytics are enabled)
+topic_history = TopicHistory()
@@ -0,0 +1,174 @@
+"""
+Gemini context caching for static prompt prefixes
+"""
+import datetime
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from src.config.settings import settings
+from src.services.cache_service import cache_registry
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class GeminiCacheClient:
+    """Thin wrapper over genai.caching so tests can substitute a stub"""
+
+    def create(self, model_name: str, name: str, text: str, ttl_seconds: int):
+        from google.generativeai import caching
+        return caching.CachedContent.create(
+            model=model_name,
+            display_name=name,
+            contents=[text],
+            ttl=datetime.timedelta(seconds=ttl_seconds),
+        )
+
+    def refresh(self, handle, ttl_seconds: int):
+        handle.update(ttl=datetime.timedelta(seconds=ttl_seconds))
+
+    def model_from(self, handle, generation_config=None):
+        import google.generativeai as genai
+        return genai.GenerativeModel.from_cached_content(
+            cached_content=handle, generation_config=generation_config
+        )
+
+
+class CachedPrefix:
+    """Server-side cache entry for one (prefix, model) pair"""
+
+    __slots__ = ("handle", "model", "expires_at", "failed_until", "lock")
+
+    def __init__(self):
+        self.handle = None
+        self.model = None
+        self.expires_at = 0.0
+        self.failed_until = 0.0
+        # Held by the one caller uploading or refreshing this entry
+        self.lock = threading.Lock()
+
+
+class PromptCache:
+    """
+    Uploads registered static prefixes once per model, hands out models bound to
+    the cached content and refreshes them before their TTL runs out. When caching
+    is unavailable (disabled, unsupported model, prefix below the API minimum)
+    model_for returns None and callers send the full prompt instead.
+
+    Uploads and refreshes are network calls, so they run under a per-entry
+    lock taken without blocking: the one caller that gets it does the work,
+    everyone else keeps using the current model (or the full prompt) meanwhile.
+    """
+
+    def __init__(self, client=None, ttl_seconds: Optional[int] = None,
+                 refresh_margin: Optional[int] = None, retry_seconds: int = 600,
+                 min_tokens: Optional[int] = None):
+        self.client = client or GeminiCacheClient()
+        self.ttl_seconds = ttl_seconds or settings.context_cache_ttl_seconds
+        self.refresh_margin = refresh_margin or settings.context_cache_refresh_margin_seconds
+        self.retry_seconds = retry_seconds
+        self.min_tokens = settings.context_cache_min_tokens if min_tokens is None else min_tokens
+        self.enabled = settings.enable_context_cache
+        self._prefixes: Dict[str, str] = {}
+        self._entries: Dict[Tuple[str, str], CachedPrefix] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0, "fallbacks": 0, "creates": 0, "refreshes": 0, "failures": 0, "too_small": 0,
+        }
+
+    def register(self, name: str, text: str):
+        """Register a static prefix by name"""
+        self._prefixes[name] = text
+
+    def eligible(self, name: str) -> bool:
+        """Whether the named prefix reaches the API's minimum cacheable size"""
+        # Same 4-characters-per-token estimate as the usage accounting
+        return len(self._prefixes.get(name, "")) // 4 >= self.min_tokens
+
+    def prefix(self, name: str) -> str:
+        return self._prefixes.get(name, "")
+
+    def split(self, name: str, prompt: str) -> Optional[str]:
+        """Return the variable part of prompt if it starts with the named prefix"""
+        prefix = self._prefixes.get(name)
+        if prefix and prompt.startswith(prefix):
+            return prompt[len(prefix):]
+        return None
+
+    def model_for(self, name: str, model_name: str, generation_config=None,
+                  now: Optional[float] = None):
+        """Model bound to the cached prefix, or None to fall back to the full prompt"""
+        if not self.enabled or name not in self._prefixes:
+            return None
+        if not self.eligible(name):
+            # The API would reject it; sending the full prompt costs nothing extra
+            self._count("too_small")
+            return None
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.setdefault((name, model_name), CachedPrefix())
+        if now < entry.failed_until:
+            self._count("fallbacks")
+            return None
+        if entry.handle is None or now >= entry.expires_at - self.refresh_margin:
+            if not entry.lock.acquire(blocking=False):
+                # Another caller is uploading or refreshing; don't wait on the network
+                return self._current(entry, now)
+            try:
+                # Re-check: the caller that held the lock may have just done the work
+                if entry.handle is None or now >= entry.expires_at:
+                    self._create(entry, name, model_name, generation_config, now)
+                elif now >= entry.expires_at - self.refresh_margin:
+                    self._refresh(entry, name, model_name, generation_config, now)
+            except Exception as e:
+                logger.warning("Context cache unavailable for '%s' on %s: %s", name, model_name, e)
+                entry.handle = None
+                entry.model = None
+                entry.failed_until = now + self.retry_seconds
+                self._count("failures")
+                self._count("fallbacks")
+                return None
+            finally:
+                entry.lock.release()
+        return self._current(entry, now)
+
+    def _current(self, entry: CachedPrefix, now: float):
+        model = entry.model
+        if model is None or now >= entry.expires_at:
+            self._count("fallbacks")
+            return None
+        self._count("hits")
+        return model
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def cache_stats(self) -> dict:
+        with self._lock:
+            return dict(self.stats)
+
+    def flush(self):
+        """Forget all cache handles; prefixes are re-uploaded on next use"""
+        with self._lock:
+            self._entries.clear()
+
+    def _create(self, entry: CachedPrefix, name: str, model_name: str, generation_config, now: float):
+        entry.handle = self.client.create(model_name, name, self._prefixes[name], self.ttl_seconds)
+        entry.model = self.client.model_from(entry.handle, generation_config)
+        entry.expires_at = now + self.ttl_seconds
+        self._count("creates")
+
+    def _refresh(self, entry: CachedPrefix, name: str, model_name: str, generation_config, now: float):
+        try:
+            self.client.refresh(entry.handle, self.ttl_seconds)
+            entry.expires_at = now + self.ttl_seconds
+            self._count("refreshes")
+        except Exception as e:
+            logger.info("Context cache refresh failed for '%s', recreating: %s", name, e)
+            self._create(entry, name, model_name, generation_config, now)
+
+
+# Shared registry of static prompt prefixes
+prompt_cache = PromptCache()
+cache_registry.register("prompt_prefix", prompt_cache)
@@ -0,0 +1,262 @@
+"""
+Article retrieval for web research: concurrent fetches of trusted URLs,
+main-text extraction, an on-disk conditional-request HTTP cache and an
+in-memory cache of search results per topic
+"""
+import asyncio
+import hashlib
+import json
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.config.settings import settings
+from src.services.cache_service import cache_registry
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Elements that never hold article body text
+_BOILERPLATE_TAGS = ("script", "style", "noscript", "nav", "header", "footer", "aside", "form", "figure", "iframe")
+# Paragraphs shorter than this are captions, bylines or share buttons
+_MIN_PARAGRAPH_CHARS = 40
+
+def extract_main_text(html: bytes, max_chars: Optional[int] = None, encoding: Optional[str] = None) -> str:
+    """
+    Return the article body from an HTML page: the <article> element if the
+    page has one, otherwise the element whose direct <p> children hold the
+    most text. Boilerplate elements and short paragraphs are dropped.
+    encoding is the response charset; pages that declare none are read as UTF-8.
+    """
+    import lxml.html
+    from lxml import etree
+
+    max_chars = max_chars or settings.article_max_chars
+    try:
+        parser = lxml.html.HTMLParser(encoding=encoding or "utf-8")
+        root = lxml.html.fromstring(html, parser=parser)
+    except (etree.ParserError, LookupError, ValueError):
+        return ""
+    etree.strip_elements(root, *_BOILERPLATE_TAGS, with_tail=False)
+
+    container = None
+    articles = root.xpath("//article")
+    if articles:
+        container = max(articles, key=lambda el: len(el.text_content()))
+    else:
+        best_score = 0
+        for parent in {p.getparent() for p in root.iter("p") if p.getparent() is not None}:
+            score = sum(len(p.text_content()) for p in parent.findall("p"))
+            if score > best_score:
+                container, best_score = parent, score
+    if container is None:
+        return ""
+
+    paragraphs, total = [], 0
+    for p in container.iter("p", "h2", "h3", "li"):
+        text = " ".join(p.text_content().split())
+        if len(text) < _MIN_PARAGRAPH_CHARS:
+            continue
+        paragraphs.append(text)
+        total += len(text)
+        if total >= max_chars:
+            break
+    return "\n".join(paragraphs)[:max_chars]
+
+class HTTPCache:
+    """
+    Extracted article text on disk, one JSON file per URL, with the ETag and
+    Last-Modified validators the server sent. Entries younger than
+    fresh_seconds are served without a request; older ones are revalidated
+    with If-None-Match / If-Modified-Since and refreshed on 304.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, fresh_seconds: Optional[int] = None):
+        self.cache_dir = Path(cache_dir or settings.article_cache_dir)
+        self.fresh_seconds = settings.article_cache_fresh_seconds if fresh_seconds is None else fresh_seconds
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def _path(self, url: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json"
+
+    def get(self, url: str) -> Optional[dict]:
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry: dict, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return now - entry.get("fetched_at", 0) < self.fresh_seconds
+
+    def put(self, url: str, text: str, etag: Optional[str], last_modified: Optional[str],
+            now: Optional[float] = None) -> dict:
+        entry = {
+            "url": url,
+            "text": text,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time() if now is None else now,
+        }
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(url)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        tmp.replace(path)
+        return entry
+
+    def touch(self, url: str, entry: dict, now: Optional[float] = None) -> dict:
+        """Record a successful revalidation (304)"""
+        return self.put(url, entry["text"], entry.get("etag"), entry.get("last_modified"), now)
+
+    def cache_stats(self) -> dict:
+        return {"hits": self.hits + self.revalidated, "misses": self.misses, "revalidated": self.revalidated}
+
+    def flush(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+class ArticleFetcher:
+    """
+    Fetches pages through one requests session whose per-host connection
+    pool blocks at article_per_host_connections, so concurrent fetches never
+    open more than that many sockets to one site. Bodies are read up to
+    article_max_bytes and the rest is discarded unread.
+    """
+
+    def __init__(self, cache: Optional[HTTPCache] = None, per_host: Optional[int] = None,
+                 max_bytes: Optional[int] = None, timeout: Optional[float] = None):
+        self.cache = cache or article_cache
+        self.per_host = per_host or settings.article_per_host_connections
+        self.max_bytes = max_bytes or settings.article_max_bytes
+        self.timeout = timeout or settings.article_timeout_seconds
+        self._session = None
+
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            self._session = requests.Session()
+            self._session.headers["User-Agent"] = USER_AGENT
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=self.per_host, pool_block=True)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        return self._session
+
+    def fetch(self, url: str) -> str:
+        """Article text for url (cached, revalidated or fetched); "" on failure"""
+        entry = self.cache.get(url)
+        if entry is not None and self.cache.is_fresh(entry):
+            self.cache.hits += 1
+            return entry["text"]
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            with self.session().get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                if response.status_code == 304 and entry is not None:
+                    self.cache.revalidated += 1
+                    return self.cache.touch(url, entry)["text"]
+                if response.status_code != 200:
+                    logger.warning("Article fetch %s returned %d", url, response.status_code)
+                    return entry["text"] if entry is not None else ""
+                body = self._read_capped(response)
+                # requests reports ISO-8859-1 for text/* without a charset; ignore that guess
+                encoding = response.encoding if "charset" in response.headers.get("Content-Type", "") else None
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+        except Exception as e:
+            logger.warning("Article fetch %s failed: %s", url, e)
+            return entry["text"] if entry is not None else ""
+
+        self.cache.misses += 1
+        text = extract_main_text(body, encoding=encoding)
+        self.cache.put(url, text, etag, last_modified)
+        return text
+
+    def _read_capped(self, response) -> bytes:
+        chunks, size = [], 0
+        for chunk in response.iter_content(chunk_size=16384):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_bytes:
+                break
+        return b"".join(chunks)[:self.max_bytes]
+
+    async def fetch_many(self, urls: List[str]) -> Dict[str, str]:
+        """Fetch urls concurrently; returns url -> text for the pages that produced any"""
+        urls = list(dict.fromkeys(urls))
+        texts = await asyncio.gather(*(asyncio.to_thread(self.fetch, url) for url in urls))
+        return {url: text for url, text in zip(urls, texts) if text}
+
+def normalize_topic(topic: str) -> str:
+    """Case- and whitespace-insensitive form of a topic, for cache and history keys"""
+    return " ".join(topic.lower().split())
+
+class SearchCache:
+    """
+    Search hits per normalized topic for search_cache_ttl_seconds, bounded
+    LRU. Filled by live searches and refreshed ahead of peak hours by the
+    research pre-warm job, whose entries are given a longer ttl so they last
+    until its next run.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = max_entries or settings.search_cache_size
+        self.ttl = settings.search_cache_ttl_seconds if ttl is None else ttl
+        # topic -> (expires at, hits)
+        self._entries: "OrderedDict[str, Tuple[float, List[Dict[str, str]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, topic: str, now: Optional[float] = None) -> Optional[List[Dict[str, str]]]:
+        now = time.time() if now is None else now
+        key = normalize_topic(topic)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now > entry[0]:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, topic: str, results: List[Dict[str, str]], now: Optional[float] = None,
+            ttl: Optional[float] = None):
+        """Cache hits for ttl seconds (default self.ttl)"""
+        now = time.time() if now is None else now
+        key = normalize_topic(topic)
+        with self._lock:
+            self._entries[key] = (now + (self.ttl if ttl is None else ttl), results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def cache_stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def flush(self):
+        with self._lock:
+            self._entries.clear()
+
+# Global caches and fetcher
+article_cache = HTTPCache()
+cache_registry.register("articles", article_cache)
+article_fetcher = ArticleFetcher()
+search_cache = SearchCache()
+cache_registry.register("search", search_cache)
@@ -1,18 +1,57 @@
 """
 Advanced Segment Generation Service (migrated from segment.py)
 """
-import requests
+import asyncio
 import urllib.parse
-from bs4 import BeautifulSoup
 from datetime import datetime
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
 from src.services.ai_service import AIService
+from src.services.ai_resilience import GeminiError
+from src.services.prompt_cache import prompt_cache
+from src.services.search_service import USER_AGENT, article_fetcher, search_cache
 from src.services.category_detector import CategoryDetector
+from src.models.segment import SegmentResearch
 from src.config.constants import TRUSTED_SOURCES
+from src.config.settings import settings
 from src.utils.logger import get_logger
+from src.utils.text_processor import WORDS_PER_MINUTE, verify_length
 
 logger = get_logger(__name__)
 
+SEARCH_URL = "https://html.duckduckgo.com/html/"
+
+_http_session = None
+
+def http_session():
+    """Shared requests session so searches reuse pooled DNS/TLS connections"""
+    global _http_session
+    if _http_session is None:
+        import requests
+        _http_session = requests.Session()
+        _http_session.headers['User-Agent'] = USER_AGENT
+    return _http_session
+
+# Static instructions shared by both segment prompts; uploaded once as Gemini cached content
+SEGMENT_INSTRUCTIONS = """
+ನೀವು ಅನುಭವಿ ಕನ್ನಡ ಟಿವಿ ಹೋಸ್ಟ್, ಮಾಧ್ಯಮ ವ್ಯಕ್ತಿತ್ವ ಮತ್ತು ಶಿಕ್ಷಣ ತಜ್ಞ. ಕೆಳಗೆ ನೀಡಿರುವ ವಿಷಯ, ಅವಧಿ ಮತ್ತು ಆಯ್ಕೆಗಳಿಗೆ ಅನುಗುಣವಾಗಿ ಟಿವಿ ಸೆಗ್ಮೆಂಟ್ ರಚಿಸಿ.
+
+🎯 ಸೆಗ್ಮೆಂಟ್ ರಚನೆ:
+1. ಆಕರ್ಷಕ ಪರಿಚಯ (ಪ್ರೇಕ್ಷಕರ ಗಮನ ಸೆಳೆಯಿರಿ)
+2. ಮುಖ್ಯ ವಿಷಯ ವಿವರಣೆ
+3. ಉದಾಹರಣೆಗಳು ಮತ್ತು ವಿವರಗಳು
+4. ಪ್ರಭಾವಶಾಲಿ ಮುಕ್ತಾಯ
+
+📝 ಭಾಷಾ ಮಾರ್ಗದರ್ಶನ:
+• ಶುದ್ಧ ಕನ್ನಡ, ಸರಳ ಮತ್ತು ಸ್ಪಷ್ಟ
+• ಟಿವಿ ಪ್ರೇಕ್ಷಕರಿಗೆ ಸೂಕ್ತ ಶೈಲಿ
+• ಪ್ರತಿ ಪ್ಯಾರಾಗ್ರಾಫ್ 30-40 ಸೆಕೆಂಡುಗಳ ಓದುವ ಸಮಯ
+
+⚠️ ಮುಖ್ಯ: ಟೆಂಪ್ಲೇಟ್ ಅಥವಾ ಸೂಚನೆಗಳನ್ನು ಬರೆಯಬೇಡಿ. ಪೂರ್ಣ ಸ್ಕ್ರಿಪ್ಟ್ ಮಾತ್ರ ಬರೆಯಿರಿ.
+⚠️ ಸೆಗ್ಮೆಂಟ್ ಓದಲು ಕೇಳಿದ ಅವಧಿಯಷ್ಟೇ ಸಮಯ ಬೇಕಾಗಬೇಕು. ತುಂಬಾ ಚಿಕ್ಕದಾಗಿರಬಾರದು!
+"""
+
+prompt_cache.register("segment", SEGMENT_INSTRUCTIONS)
+
 class SegmentService:
     def __init__(self):
         self.ai_service = AIService()
@@ -37,8 +76,7 @@ class SegmentService:
 
     def calculate_content_needs(self, duration_minutes: int) -> dict:
         """Calculate how much content is needed for the duration"""
-        # Kannada speaking speed: 150 words per minute
-        total_words = duration_minutes * 150
+        total_words = duration_minutes * WORDS_PER_MINUTE
         
         if duration_minutes <= 2:
             return {"total_words": total_words, "sections": 2, "detail": "brief"}
@@ -51,16 +89,27 @@ class SegmentService:
 
     def search_duckduckgo(self, topic: str) -> str:
         """Search for current information if needed"""
+        results = self.search_results(topic)
+        return "\n".join(self._format_result(result) for result in results) if results else ""
+
+    def search_results(self, topic: str, refresh: bool = False,
+                       ttl: Optional[float] = None) -> List[Dict[str, str]]:
+        """
+        Top trusted search hits as dicts with title, snippet, url (the site's
+        own URL), from the search cache unless refresh is set. Fresh hits are
+        cached for ttl seconds (default search_cache_ttl_seconds).
+        """
+        if not refresh:
+            cached = search_cache.get(topic)
+            if cached is not None:
+                return cached
+        from bs4 import BeautifulSoup
         try:
             site_filters = " OR ".join([f"site:{source}" for source in TRUSTED_SOURCES[:5]])
             search_query = f"{topic} India news ({site_filters})"
             
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            search_url = f"https://html.duckduckgo.com/html/?q={urllib.parse.quote(search_query)}"
-            response = requests.get(search_url, headers=headers, timeout=10)
+            search_url = f"{SEARCH_URL}?q={urllib.parse.quote(search_query)}"
+            response = http_session().get(search_url, timeout=10)
             
             if response.status_code == 200:
                 soup = BeautifulSoup(response.content, 'html.parser')
@@ -76,18 +125,77 @@ class SegmentService:
                         url = title_elem.get('href', '')
                         
                         if any(source in url for source in TRUSTED_SOURCES):
-                            results.append(f"Title: {title}\nSnippet: {snippet}\nSource: {url}\n")
+                            results.append({"title": title, "snippet": snippet, "url": self._result_url(url)})
                 
-                return "\n".join(results) if results else ""
-            return ""
+                # Empty pages may be throttling; only real hits are cached
+                if results:
+                    search_cache.put(topic, results, ttl=ttl)
+                return results
+            return []
             
         except Exception as e:
-            self.logger.error(f"Search error: {e}")
+            self.logger.error("Search error: %s", e, extra={"flow": "segment"})
+            return []
+
+    def _result_url(self, href: str) -> str:
+        """Unwrap DuckDuckGo's /l/?uddg= redirect links to the article URL"""
+        if href.startswith("//"):
+            href = "https:" + href
+        parsed = urllib.parse.urlparse(href)
+        if parsed.netloc.endswith("duckduckgo.com") and parsed.path.startswith("/l/"):
+            target = urllib.parse.parse_qs(parsed.query).get("uddg")
+            if target:
+                return target[0]
+        return href
+
+    def _format_result(self, result: Dict[str, str], article: str = "") -> str:
+        text = f"Title: {result['title']}\nSnippet: {result['snippet']}\nSource: {result['url']}\n"
+        if article:
+            text += f"Article:\n{article}\n"
+        return text
+
+    async def web_research(self, topic: str, refresh: bool = False, ttl: Optional[float] = None) -> str:
+        """
+        Search, then fetch and extract the top trusted articles concurrently
+        so the prompt is grounded in article text rather than snippets alone.
+        Search hits come from the search cache unless refresh is set (ttl as
+        for search_results); article text comes from the on-disk HTTP cache
+        when it is still valid.
+        """
+        results = await asyncio.to_thread(self.search_results, topic, refresh, ttl)
+        if not results:
             return ""
+        articles = {}
+        if settings.enable_article_fetch:
+            urls = [result["url"] for result in results[:settings.article_fetch_count]]
+            articles = await article_fetcher.fetch_many(urls)
+            self.logger.info("Fetched %d/%d articles for topic: %s", len(articles), len(urls), topic,
+                             extra={"flow": "segment"})
+        return "\n".join(self._format_result(result, articles.get(result["url"], "")) for result in results)
+
+    def warm_up_http(self):
+        """Open the pooled search connection (DNS, TCP, TLS) ahead of the first search"""
+        http_session().head(SEARCH_URL, timeout=10)
+
+    async def prefetch_research(self, topic: str) -> SegmentResearch:
+        """
+        Classify the topic, detect its category and, for factual topics, run the
+        web search in a worker thread. Meant to run in the background while the
+        user answers the segment questions.
+        """
+        topic_type = self.classify_topic_type(topic)
+        category = self.category_detector.detect_category("", topic)
+        
+        web_results = None
+        if topic_type == "factual" and settings.enable_web_search:
+            self.logger.info("Prefetching web search for topic: %s", topic, extra={"flow": "segment"})
+            web_results = await self.web_research(topic)
+        
+        return SegmentResearch(topic, topic_type, category, web_results)
 
     def create_enhanced_prompt(self, topic: str, duration: int, topic_type: str, 
                              content_needs: dict, web_results: str = "") -> str:
-        """Create the enhanced prompt based on topic type and duration"""
+        """Create the enhanced prompt (SEGMENT_INSTRUCTIONS prefix + request details) based on topic type and duration"""
         
         total_words = content_needs["total_words"]
         sections = content_needs["sections"]
@@ -130,32 +238,22 @@ class SegmentService:
         else:
             duration_guide = "• ಸಮಗ್ರ ವಿವರಣೆ, ಇತಿಹಾಸ, ಸಂದರ್ಭ, ಅನುಷಂಗಿಕ ವಿಷಯಗಳು"
 
-        return f"""
-ನೀವು ಅನುಭವಿ ಕನ್ನಡ ಟಿವಿ ಹೋಸ್ಟ್ ಮತ್ತು ಶಿಕ್ಷಣ ತಜ್ಞ. "{topic}" ವಿಷಯದ ಬಗ್ಗೆ ನಿಖರವಾಗಿ {duration} ನಿಮಿಷಗಳ ಟಿವಿ ಸೆಗ್ಮೆಂಟ್ ರಚಿಸಿ.
+        return f"""{SEGMENT_INSTRUCTIONS}
+📌 ವಿಷಯ: "{topic}" — ನಿಖರವಾಗಿ {duration} ನಿಮಿಷಗಳ ಟಿವಿ ಸೆಗ್ಮೆಂಟ್
 
 {content_guidance}
 
 📏 ಅವಧಿ ಅವಶ್ಯಕತೆಗಳು:
 • ನಿಖರವಾಗಿ {duration} ನಿಮಿಷಗಳ ಓದುವ ಸಮಯ (ಸುಮಾರು {total_words} ಪದಗಳು)
 • {sections} ಮುಖ್ಯ ವಿಭಾಗಗಳಲ್ಲಿ ವಿಂಗಡಿಸಿ
+• ಉದಾಹರಣೆಗಳು ಮತ್ತು ವಿವರಗಳು {detail_level} ಮಟ್ಟದಲ್ಲಿ
 {duration_guide}
-
-🎯 ಸೆಗ್ಮೆಂಟ್ ರಚನೆ:
-1. ಆಕರ್ಷಕ ಪರಿಚಯ (ಪ್ರೇಕ್ಷಕರ ಗಮನ ಸೆಳೆಯಿರಿ)
-2. ಮುಖ್ಯ ವಿಷಯ ವಿವರಣೆ
-3. ಉದಾಹರಣೆಗಳು ಮತ್ತು ವಿವರಗಳು ({detail_level} ಮಟ್ಟದಲ್ಲಿ)
-4. ಪ್ರಭಾವಶಾಲಿ ಮುಕ್ತಾಯ
-
-📝 ಭಾಷಾ ಮಾರ್ಗದರ್ಶನ:
-• ಶುದ್ಧ ಕನ್ನಡ, ಸರಳ ಮತ್ತು ಸ್ಪಷ್ಟ
-• ಟಿವಿ ಪ್ರೇಕ್ಷಕರಿಗೆ ಸೂಕ್ತ ಶೈಲಿ
-• ಪ್ರತಿ ಪ್ಯಾರಾಗ್ರಾಫ್ 30-40 ಸೆಕೆಂಡುಗಳ ಓದುವ ಸಮಯ
-
-⚠️ ಮುಖ್ಯ: ಸೆಗ್ಮೆಂಟ್ ಓದಲು ನಿಖರವಾಗಿ {duration} ನಿಮಿಷಗಳು ಬೇಕಾಗಬೇಕು. ತುಂಬಾ ಚಿಕ್ಕದಾಗಿರಬಾರದು!
 """
 
-    async def generate_custom_segment(self, user_prefs: dict, duration: int) -> Tuple[str, str, str]:
-        """Generate segment based on user's 5 interactive answers"""
+    async def generate_custom_segment(self, user_prefs: dict, duration: int,
+                                      research: Optional[SegmentResearch] = None,
+                                      chat_id: Optional[int] = None) -> Tuple[str, str, str]:
+        """Generate segment based on user's 5 interactive answers, reusing prefetched research if given"""
         try:
             topic = user_prefs.get('topic', '')
             content_type = user_prefs.get('content_type', '')
@@ -169,17 +267,34 @@ class SegmentService:
             )
             
             if should_search:
-                self.logger.info(f"Performing web search for user-requested topic: {topic}")
-                web_results = self.search_duckduckgo(topic)
+                if research is not None and research.web_results is not None:
+                    self.logger.info("Reusing prefetched web search for topic: %s", topic, extra={"flow": "segment"})
+                    web_results = research.web_results
+                else:
+                    self.logger.info("Performing web search for user-requested topic: %s", topic, extra={"flow": "segment"})
+                    web_results = await self.web_research(topic)
             
             # Create custom prompt based on user preferences
             custom_prompt = self.create_interactive_prompt(user_prefs, duration, web_results)
             
-            # Generate content
-            segment_text = self.ai_service.generate_content(custom_prompt)
+            # Generate content, then top it up if it came back short or cut off
+            target_words = self.calculate_content_needs(duration)["total_words"]
+            try:
+                segment_text = await self.ai_service.agenerate_strict(
+                    custom_prompt, "segment", target_words=target_words, cached_prefix="segment",
+                    chat_id=chat_id
+                )
+            except GeminiError as e:
+                return self.ai_service.error_message(e, "segment"), "error", "N/A"
+            segment_text = await self.complete_to_length(
+                topic, duration, segment_text.strip(), target_words, chat_id
+            )
             
             # Determine category and sources
-            category = self.category_detector.detect_category("", topic)
+            if research is not None:
+                category = research.category
+            else:
+                category = self.category_detector.detect_category("", topic)
             
             if web_results:
                 sources = "ವೆಬ್ ಸರ್ಚ್ + AI ಕಸ್ಟಮೈಜೇಶನ್"
@@ -189,11 +304,65 @@ class SegmentService:
             return segment_text, category, sources
             
         except Exception as e:
-            self.logger.error(f"Error in custom segment generation: {e}")
+            self.logger.error("Error in custom segment generation: %s", e, extra={"flow": "segment"})
             return f"ಕ್ಷಮಿಸಿ, ಕಸ್ಟಮ್ ಸೆಗ್ಮೆಂಟ್ ರಚನೆಯಲ್ಲಿ ದೋಷ: {str(e)}", "error", "N/A"
 
+    async def complete_to_length(self, topic: str, duration: int, text: str, target_words: int,
+                                 chat_id: Optional[int] = None) -> str:
+        """
+        Verify text against the word target and, while it is short or ends
+        mid-sentence, ask the model to continue it rather than regenerating
+        the whole segment. Returns the best text available when the
+        continuation budget runs out or a continuation call fails.
+        """
+        for attempt in range(settings.segment_continuation_attempts):
+            check = verify_length(text, target_words, settings.segment_length_tolerance)
+            if check["ok"] or not text:
+                break
+            self.logger.info(
+                "Segment short (%d/%d words, truncated=%s); continuation %d",
+                check["words"], target_words, check["truncated"], attempt + 1, extra={"flow": "segment"}
+            )
+            prompt = self.create_continuation_prompt(topic, duration, text, check)
+            try:
+                # Routed on the whole segment's target so the continuation comes from the same model
+                continuation = await self.ai_service.agenerate_strict(
+                    prompt, "segment", target_words=target_words, cached_prefix="segment",
+                    chat_id=chat_id
+                )
+            except GeminiError as e:
+                self.logger.warning("Segment continuation failed: %s", e, extra={"flow": "segment"})
+                break
+            continuation = continuation.strip()
+            if not continuation:
+                break
+            text = f"{text} {continuation}" if check["truncated"] else f"{text}\n\n{continuation}"
+        return text
+
+    def create_continuation_prompt(self, topic: str, duration: int, text: str, check: dict) -> str:
+        """Prompt (SEGMENT_INSTRUCTIONS prefix + script so far) asking only for the missing part"""
+        if check["truncated"]:
+            start = "ಕೊನೆಯ ಅಪೂರ್ಣ ವಾಕ್ಯವನ್ನು ಅದು ನಿಂತ ಪದದಿಂದಲೇ ಪೂರ್ಣಗೊಳಿಸಿ, ನಂತರ ಮುಂದುವರಿಸಿ."
+        else:
+            start = "ಸ್ಕ್ರಿಪ್ಟ್ ನಿಂತ ಸ್ಥಳದಿಂದ ಮುಂದುವರಿಸಿ."
+        missing = max(check["missing"], 50)
+
+        return f"""{SEGMENT_INSTRUCTIONS}
+📌 ವಿಷಯ: "{topic}" — {duration} ನಿಮಿಷಗಳ ಸೆಗ್ಮೆಂಟ್ (ಮುಂದುವರಿಕೆ)
+
+📄 ಈಗಾಗಲೇ ಬರೆದಿರುವ ಸ್ಕ್ರಿಪ್ಟ್ ({check["words"]}/{check["target"]} ಪದಗಳು):
+---
+{text}
+---
+
+✍️ {start}
+• ಉಳಿದ ವಿಭಾಗಗಳು ಮತ್ತು ಮುಕ್ತಾಯವನ್ನು ಮಾತ್ರ ಸುಮಾರು {missing} ಪದಗಳಲ್ಲಿ ಬರೆಯಿರಿ
+• ಮೇಲಿನ ಭಾಗವನ್ನು ಪುನರಾವರ್ತಿಸಬೇಡಿ ಅಥವಾ ಸಾರಾಂಶ ನೀಡಬೇಡಿ
+• ಹೊಸ ಭಾಗವನ್ನು ಮಾತ್ರ ಬರೆಯಿರಿ:
+"""
+
     def create_interactive_prompt(self, user_prefs: dict, duration: int, web_results: str = "") -> str:
-        """Create a highly customized prompt based on user's interactive choices"""
+        """Create a highly customized prompt (SEGMENT_INSTRUCTIONS prefix + user's interactive choices)"""
         topic = user_prefs.get('topic', '')
         content_type = user_prefs.get('content_type', '')
         info_source = user_prefs.get('info_source', '')
@@ -202,7 +371,7 @@ class SegmentService:
         content_richness = user_prefs.get('content_richness', '')
         
         # Calculate words needed
-        total_words = duration * 150
+        total_words = duration * WORDS_PER_MINUTE
         
         # Build content strategy based on user choices
         content_strategy = f"""
@@ -259,8 +428,8 @@ class SegmentService:
         else:  # ಸಂವಾದಾತ್ಮಕ
             richness_instructions = "• ಪ್ರೇಕ್ಷಕರೊಂದಿಗೆ ಸಂವಾದ, ಪ್ರಶ್ನೆಗಳು, ಕ್ರಿಯಾಶೀಲ ಭಾಗವಹಿಸುವಿಕೆ"
 
-        return f"""
-ನೀವು ಅನುಭವಿ ಕನ್ನಡ ಮಾಧ್ಯಮ ವ್ಯಕ್ತಿತ್ವ. "{topic}" ವಿಷಯದ ಬಗ್ಗೆ ನಿಖರವಾಗಿ {duration} ನಿಮಿಷಗಳ ಸೆಗ್ಮೆಂಟ್ ರಚಿಸಿ.
+        return f"""{SEGMENT_INSTRUCTIONS}
+📌 ವಿಷಯ: "{topic}" — ನಿಖರವಾಗಿ {duration} ನಿಮಿಷಗಳ ಸೆಗ್ಮೆಂಟ್
 
 {content_strategy}
 
@@ -271,10 +440,6 @@ class SegmentService:
 
 📏 ನಿಖರ ಅವಶ್ಯಕತೆಗಳು:
 • ಅವಧಿ: ನಿಖರವಾಗಿ {duration} ನಿಮಿಷಗಳು (ಸುಮಾರು {total_words} ಪದಗಳು)
-• ಭಾಷೆ: ಶುದ್ಧ ಕನ್ನಡ, ಸರಳ ಮತ್ತು ಸ್ಪಷ್ಟ
-• ರಚನೆ: ಆಕರ್ಷಕ ಪರಿಚಯ → ಮುಖ್ಯ ವಿಷಯ → ಪ್ರಭಾವಶಾಲಿ ಮುಕ್ತಾಯ
-
-⚠️ ಮುಖ್ಯ: ಟೆಂಪ್ಲೇಟ್ ಅಥವಾ ಸೂಚನೆಗಳನ್ನು ಬರೆಯಬೇಡಿ. ಪೂರ್ಣ ಸ್ಕ್ರಿಪ್ಟ್ ಮಾತ್ರ ಬರೆಯಿರಿ.
 
 ಈಗ ಯೂಸರ್ ಆಯ್ಕೆಗಳ ಪ್ರಕಾರ ಸಂಪೂರ್ಣ {duration}-ನಿಮಿಷದ ಸೆಗ್ಮೆಂಟ್ ಬರೆಯಿರಿ:
 """
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Near-match response cache: reuse a generated script when a new input is
+almost the same story as one already served
+"""
+import hashlib
+import math
+import operator
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from src.config.settings import settings
+from src.services.cache_service import cache_registry
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+NGRAM = 3
+DIMENSIONS = 1024  # 4 KB per stored vector
+SIGNATURE_BITS = 64
+
+_NOISE_RE = re.compile(r"[^\w\u0C80-\u0CFF]+")
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+# One fixed random hyperplane per dimension, as 64 sign bits
+_PLANES = [_hash64(b"plane:%d" % dim) for dim in range(DIMENSIONS)]
+
+def ngram_vector(text: str, n: int = NGRAM) -> array:
+    """
+    L2-normalized character n-gram counts hashed into DIMENSIONS buckets.
+    Case, punctuation and spacing are collapsed first so they do not count
+    as differences.
+    """
+    normalized = " ".join(_NOISE_RE.sub(" ", text.casefold()).split())
+    vector = array("f", bytes(4 * DIMENSIONS))
+    for i in range(max(1, len(normalized) - n + 1)):
+        vector[_hash64(normalized[i:i + n].encode("utf-8")) % DIMENSIONS] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    for dim in range(DIMENSIONS):
+        vector[dim] /= norm
+    return vector
+
+def cosine(a: array, b: array) -> float:
+    """Cosine similarity of two normalized vectors"""
+    return sum(map(operator.mul, a, b))
+
+def simhash(vector: array) -> int:
+    """64-bit random-hyperplane signature; close vectors differ in few bits"""
+    totals = [0.0] * SIGNATURE_BITS
+    for dim, weight in enumerate(vector):
+        if not weight:
+            continue
+        plane = _PLANES[dim]
+        for bit in range(SIGNATURE_BITS):
+            totals[bit] += weight if plane >> bit & 1 else -weight
+    signature = 0
+    for bit, total in enumerate(totals):
+        if total > 0:
+            signature |= 1 << bit
+    return signature
+
+class _Entry:
+    __slots__ = ("vector", "signature", "value")
+
+    def __init__(self, vector: array, signature: int, value: str):
+        self.vector = vector
+        self.signature = signature
+        self.value = value
+
+class SemanticCache:
+    """
+    Per-flow LSH index over simhash signatures. Each signature is cut into
+    bands; entries sharing any band with the query are candidates, and the
+    best candidate is confirmed with an exact cosine on the n-gram vectors.
+    Holds at most max_entries entries, evicting the least recently used.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, bands: int = 8):
+        self.max_entries = max_entries or settings.semantic_cache_size
+        self.bands = bands
+        self.band_bits = SIGNATURE_BITS // bands
+        self._entries: "OrderedDict[Tuple[str, int], _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, int], Set[Tuple[str, int]]] = {}
+        self._ids = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _band_keys(self, flow: str, signature: int):
+        mask = (1 << self.band_bits) - 1
+        for band in range(self.bands):
+            yield flow, band, signature >> (band * self.band_bits) & mask
+
+    def lookup(self, flow: str, text: str, threshold: float) -> Optional[Tuple[str, float]]:
+        """(cached value, similarity) for the closest entry at or above threshold, else None"""
+        vector = ngram_vector(text)
+        signature = simhash(vector)
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(flow, signature):
+                candidates |= self._buckets.get(key, set())
+            best, best_score = None, threshold
+            for entry_id in candidates:
+                score = cosine(vector, self._entries[entry_id].vector)
+                if score >= best_score:
+                    best, best_score = entry_id, score
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            return self._entries[best].value, best_score
+
+    def store(self, flow: str, text: str, value: str):
+        vector = ngram_vector(text)
+        signature = simhash(vector)
+        with self._lock:
+            self._ids += 1
+            entry_id = (flow, self._ids)
+            self._entries[entry_id] = _Entry(vector, signature, value)
+            for key in self._band_keys(flow, signature):
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict(*self._entries.popitem(last=False))
+
+    def _evict(self, entry_id: Tuple[str, int], entry: _Entry):
+        for key in self._band_keys(entry_id[0], entry.signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def cache_stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def flush(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+# Shared across handlers so a story pasted by one editor is reused for the next
+semantic_cache = SemanticCache()
+cache_registry.register("semantic", semantic_cache)
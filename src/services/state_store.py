@@ -0,0 +1,268 @@
+"""
+Shared state for scale-out replicas: leases, the update queue, rate-limit
+buckets and counters
+"""
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.config.settings import settings
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class StateStore(ABC):
+    """
+    Interface every state backend implements. Each operation must be atomic
+    across processes; `now` is wall-clock seconds shared by all replicas.
+    """
+
+    @abstractmethod
+    def heartbeat(self, replica_id: str, now: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def live_replicas(self, now: float, ttl: float) -> List[str]:
+        """Replica ids with a heartbeat newer than ttl, sorted"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def try_acquire(self, resource: str, owner: str, ttl: float, now: float) -> bool:
+        """Take or renew a lease. Fails while another owner's lease is unexpired."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def release(self, resource: str, owner: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def leases(self, prefix: str, now: float) -> Dict[str, str]:
+        """Unexpired leases whose resource starts with prefix -> owner"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def enqueue(self, shard: int, chat_id: int, payload: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim(self, shards: Iterable[int], limit: int, owner: str, ttl: float,
+              now: float) -> List[Tuple[int, int, str]]:
+        """
+        Lease up to limit queued (id, chat_id, payload) for the shards to owner,
+        oldest first. Updates stay queued until acked, so an expired claim is
+        handed out again.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def renew_claims(self, ids: Iterable[int], owner: str, ttl: float, now: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def release_claims(self, ids: Iterable[int], owner: str):
+        """Give claimed updates back to the queue unprocessed"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def ack(self, ids: Iterable[int], owner: str):
+        """Remove processed updates from the queue"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def take_token(self, key: str, rate: float, capacity: float, now: float, cost: float = 1.0) -> bool:
+        """Token bucket shared by all replicas; rate is tokens per second"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def incr_counter(self, key: str, amount: int, window_seconds: float, now: float) -> int:
+        """Add to a fixed-window counter and return the window's new total"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteStateStore(StateStore):
+    """StateStore on one SQLite file in WAL mode; fine for replicas on one host"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS replicas (id TEXT PRIMARY KEY, seen REAL NOT NULL);
+    CREATE TABLE IF NOT EXISTS leases (resource TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+    CREATE TABLE IF NOT EXISTS updates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, shard INTEGER NOT NULL,
+        chat_id INTEGER NOT NULL, payload TEXT NOT NULL,
+        claimed_by TEXT, claimed_until REAL NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS updates_shard ON updates (shard, id);
+    CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);
+    CREATE TABLE IF NOT EXISTS counters (
+        key TEXT NOT NULL, window INTEGER NOT NULL, value INTEGER NOT NULL,
+        PRIMARY KEY (key, window)
+    );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # One connection per thread: calls arrive via asyncio.to_thread
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(updates)")}
+        if "claimed_by" not in columns:
+            # Queues created before claims were leased
+            conn.execute("ALTER TABLE updates ADD COLUMN claimed_by TEXT")
+            conn.execute("ALTER TABLE updates ADD COLUMN claimed_until REAL NOT NULL DEFAULT 0")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _tx(self):
+        return _Transaction(self._conn())
+
+    def heartbeat(self, replica_id: str, now: float):
+        with self._tx() as conn:
+            conn.execute(
+                "INSERT INTO replicas (id, seen) VALUES (?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET seen = excluded.seen",
+                (replica_id, now),
+            )
+
+    def live_replicas(self, now: float, ttl: float) -> List[str]:
+        rows = self._conn().execute(
+            "SELECT id FROM replicas WHERE seen > ? ORDER BY id", (now - ttl,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def try_acquire(self, resource: str, owner: str, ttl: float, now: float) -> bool:
+        with self._tx() as conn:
+            row = conn.execute("SELECT owner, expires FROM leases WHERE resource = ?", (resource,)).fetchone()
+            if row is not None and row[0] != owner and row[1] > now:
+                return False
+            conn.execute(
+                "INSERT INTO leases (resource, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(resource) DO UPDATE SET owner = excluded.owner, expires = excluded.expires",
+                (resource, owner, now + ttl),
+            )
+            return True
+
+    def release(self, resource: str, owner: str):
+        with self._tx() as conn:
+            conn.execute("DELETE FROM leases WHERE resource = ? AND owner = ?", (resource, owner))
+
+    def leases(self, prefix: str, now: float) -> Dict[str, str]:
+        rows = self._conn().execute(
+            "SELECT resource, owner FROM leases WHERE resource LIKE ? AND expires > ?",
+            (prefix + "%", now),
+        ).fetchall()
+        return dict(rows)
+
+    def enqueue(self, shard: int, chat_id: int, payload: str):
+        with self._tx() as conn:
+            conn.execute(
+                "INSERT INTO updates (shard, chat_id, payload) VALUES (?, ?, ?)",
+                (shard, chat_id, payload),
+            )
+
+    def claim(self, shards: Iterable[int], limit: int, owner: str, ttl: float,
+              now: float) -> List[Tuple[int, int, str]]:
+        shards = list(shards)
+        if not shards:
+            return []
+        marks = ",".join("?" * len(shards))
+        with self._tx() as conn:
+            rows = conn.execute(
+                f"SELECT id, chat_id, payload FROM updates WHERE shard IN ({marks}) "
+                "AND (claimed_by IS NULL OR claimed_until <= ?) ORDER BY id LIMIT ?",
+                (*shards, now, limit),
+            ).fetchall()
+            if rows:
+                ids = [row[0] for row in rows]
+                conn.execute(
+                    f"UPDATE updates SET claimed_by = ?, claimed_until = ? WHERE id IN ({','.join('?' * len(ids))})",
+                    (owner, now + ttl, *ids),
+                )
+        return [tuple(row) for row in rows]
+
+    def _update_claims(self, sql: str, ids: Iterable[int], owner: str, *params):
+        ids = list(ids)
+        if not ids:
+            return
+        with self._tx() as conn:
+            conn.execute(
+                f"{sql} WHERE claimed_by = ? AND id IN ({','.join('?' * len(ids))})",
+                (*params, owner, *ids),
+            )
+
+    def renew_claims(self, ids: Iterable[int], owner: str, ttl: float, now: float):
+        self._update_claims("UPDATE updates SET claimed_until = ?", ids, owner, now + ttl)
+
+    def release_claims(self, ids: Iterable[int], owner: str):
+        self._update_claims("UPDATE updates SET claimed_by = NULL, claimed_until = 0", ids, owner)
+
+    def ack(self, ids: Iterable[int], owner: str):
+        self._update_claims("DELETE FROM updates", ids, owner)
+
+    def take_token(self, key: str, rate: float, capacity: float, now: float, cost: float = 1.0) -> bool:
+        with self._tx() as conn:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            return allowed
+
+    def incr_counter(self, key: str, amount: int, window_seconds: float, now: float) -> int:
+        window = int(now // window_seconds)
+        with self._tx() as conn:
+            conn.execute(
+                "INSERT INTO counters (key, window, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(key, window) DO UPDATE SET value = value + excluded.value",
+                (key, window, amount),
+            )
+            conn.execute("DELETE FROM counters WHERE key = ? AND window < ?", (key, window))
+            return conn.execute(
+                "SELECT value FROM counters WHERE key = ? AND window = ?", (key, window)
+            ).fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on error"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def create_state_store(url: Optional[str] = None) -> StateStore:
+    """Build the backend named by settings.state_store_url"""
+    url = url or settings.state_store_url
+    if url.startswith("sqlite:///"):
+        return SQLiteStateStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported state store URL: {url}")
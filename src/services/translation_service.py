@@ -0,0 +1,154 @@
+"""
+Fan-out translation of finished Kannada scripts for the sister desks
+"""
+import asyncio
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from src.config.constants import TRANSLATION_LANGUAGES
+from src.config.settings import settings
+from src.services.ai_resilience import GeminiError
+from src.services.ai_service import AIService
+from src.services.cache_service import cache_registry
+from src.utils.formatter import split_at_boundaries
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Section boundaries: PKG 🎙 headings and the "--- SPEED 50 ---" style headers
+SECTION_RE = re.compile(r"^(?=🎙|--- )", re.MULTILINE)
+
+class TranslationCache:
+    """LRU of translated chunks keyed by (sha256 of the Kannada chunk, language)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str, language: str) -> tuple:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest(), language
+
+    def get(self, text: str, language: str) -> Optional[str]:
+        key = self.key(text, language)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, text: str, language: str, value: str):
+        key = self.key(text, language)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def cache_stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def flush(self):
+        with self._lock:
+            self._entries.clear()
+
+# Shared across handlers so every desk reuses earlier translations
+translation_cache = TranslationCache(settings.translation_cache_size)
+cache_registry.register("translation", translation_cache)
+
+def split_sections(text: str, max_chars: int) -> List[str]:
+    """
+    Split a script at section boundaries, merging neighbouring sections while
+    they fit in max_chars. An oversized section (segment scripts have no
+    markers at all) is split further at paragraph, then sentence boundaries.
+    """
+    chunks: List[str] = []
+    for section in SECTION_RE.split(text):
+        if not section.strip():
+            continue
+        pieces = [section] if len(section) <= max_chars else split_at_boundaries(section, max_chars)
+        for piece in pieces:
+            if chunks and len(chunks[-1]) + len(piece) <= max_chars:
+                chunks[-1] += piece
+            else:
+                chunks.append(piece)
+    return chunks
+
+class TranslationService:
+    """
+    Translates a finished AV, PKG or segment into several languages at once.
+    Every (chunk, language) pair is an independent Gemini call, so wall time is
+    about one chunk's translation latency rather than one per language.
+    """
+
+    def __init__(self, ai_service: Optional[AIService] = None, cache: Optional[TranslationCache] = None):
+        self.ai_service = ai_service or AIService()
+        self.cache = cache or translation_cache
+        self.logger = logger
+        self._semaphore = None
+        self._loop = None
+
+    def _limit(self) -> asyncio.Semaphore:
+        # Bound in-flight calls per event loop
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(settings.translation_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    def create_translation_prompt(self, text: str, language: str) -> str:
+        language_name = TRANSLATION_LANGUAGES.get(language, language)
+        return f"""ಕೆಳಗಿನ ಕನ್ನಡ ಸುದ್ದಿ ಸ್ಕ್ರಿಪ್ಟ್ ಅನ್ನು {language_name} ಭಾಷೆಗೆ ಅನುವಾದಿಸಿ.
+Translate the Kannada news script below into {language_name}.
+- Keep every heading, 🎙 marker, line break and the section order exactly as they are.
+- Keep names, places, numbers and dates accurate; transliterate proper nouns.
+- Keep the broadcast tone. Output only the translation, without notes.
+
+{text}"""
+
+    async def translate(self, text: str, languages: Optional[List[str]] = None,
+                        chat_id: Optional[int] = None) -> Dict[str, Optional[str]]:
+        """
+        Translate text into each language. A language whose translation failed
+        maps to None; the others are still returned.
+        """
+        languages = languages or settings.translation_languages
+        chunks = split_sections(text, settings.translation_max_chunk_chars)
+        results = await asyncio.gather(
+            *(self._translate_language(chunks, language, chat_id) for language in languages),
+            return_exceptions=True
+        )
+        translations = {}
+        for language, result in zip(languages, results):
+            if isinstance(result, Exception):
+                self.logger.error("Translation to %s failed: %s", language, result,
+                                  extra={"flow": "translation"})
+                translations[language] = None
+            else:
+                translations[language] = result
+        return translations
+
+    async def _translate_language(self, chunks: List[str], language: str, chat_id: Optional[int] = None) -> str:
+        parts = await asyncio.gather(*(self._translate_chunk(chunk, language, chat_id) for chunk in chunks))
+        return "\n".join(part.strip() for part in parts)
+
+    async def _translate_chunk(self, chunk: str, language: str, chat_id: Optional[int] = None) -> str:
+        cached = self.cache.get(chunk, language)
+        if cached is not None:
+            return cached
+        prompt = self.create_translation_prompt(chunk, language)
+        async with self._limit():
+            translated = await self.ai_service.agenerate_strict(prompt, "translation", chat_id=chat_id)
+        if not translated.strip():
+            raise GeminiError("Empty translation")
+        self.cache.put(chunk, language, translated)
+        return translated
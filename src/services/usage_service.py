@@ -0,0 +1,242 @@
+"""
+Gemini token accounting: per chat, flow and day totals aggregated in
+memory, flushed to SQLite in batches, and per-chat daily token quotas
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.config.settings import settings
+from src.services.ai_resilience import DailyQuotaError
+from src.services.backup_service import sqlite_path_from_url
+from src.services.state_store import StateStore
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Calls made outside any chat (warm-up, scripts) are booked here
+SYSTEM_CHAT_ID = 0
+
+_FIELDS = ("calls", "prompt_tokens", "candidate_tokens", "total_tokens", "latency_ms")
+
+DAY_SECONDS = 86400
+
+def usage_day(now: Optional[float] = None) -> str:
+    """Accounting day (server local time) for a timestamp"""
+    return time.strftime("%Y-%m-%d", time.localtime(time.time() if now is None else now))
+
+def local_seconds(now: Optional[float] = None) -> float:
+    """Timestamp shifted so that whole multiples of a day fall on local midnight"""
+    now = time.time() if now is None else now
+    return now + time.localtime(now).tm_gmtoff
+
+def usage_counts(response) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """(prompt, candidates, total) token counts from a response's usage metadata; None where absent"""
+    usage = getattr(response, "usage_metadata", None)
+    counts = []
+    for name in ("prompt_token_count", "candidates_token_count", "total_token_count"):
+        value = getattr(usage, name, None)
+        counts.append(value if isinstance(value, int) else None)
+    return tuple(counts)
+
+class UsageLedger:
+    """
+    Pending totals live in a dict keyed by (day, chat_id, flow) and are
+    upserted into the token_usage table in one transaction per flush, either
+    when usage_flush_batch keys are pending or from the periodic job. Daily
+    totals per chat are kept alongside for quota checks, seeded from the
+    table the first time a chat is checked on a given day.
+
+    In scale-out mode attach_store() moves quota totals into the shared
+    state store's day counters, so every replica sees a chat's whole day
+    wherever its earlier calls ran.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS token_usage (
+        day TEXT NOT NULL, chat_id INTEGER NOT NULL, flow TEXT NOT NULL,
+        calls INTEGER NOT NULL, prompt_tokens INTEGER NOT NULL,
+        candidate_tokens INTEGER NOT NULL, total_tokens INTEGER NOT NULL,
+        latency_ms INTEGER NOT NULL,
+        PRIMARY KEY (day, chat_id, flow)
+    );
+    """
+
+    def __init__(self, db_path: Optional[str] = None, flush_batch: Optional[int] = None):
+        path = db_path or sqlite_path_from_url(settings.database_url)
+        self.db_path = Path(path) if path is not None else None
+        self.flush_batch = flush_batch or settings.usage_flush_batch
+        self._pending: Dict[Tuple[str, int, str], List[int]] = {}
+        self._daily: Dict[Tuple[str, int], int] = {}
+        self.store: Optional[StateStore] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.flushed_rows = 0
+        self.quota_rejections = 0
+
+    def attach_store(self, store: Optional[StateStore]):
+        """Keep quota totals in a state store shared by all replicas (None: back to local)"""
+        self.store = store
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """One transaction on a short-lived connection"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=10)
+        try:
+            with conn:
+                conn.executescript(self.SCHEMA)
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, chat_id: Optional[int], flow: str, prompt_tokens: int, candidate_tokens: int,
+               total_tokens: int, latency: float, now: Optional[float] = None):
+        """Book one successful call"""
+        chat_id = SYSTEM_CHAT_ID if chat_id is None else chat_id
+        day = usage_day(now)
+        with self._lock:
+            row = self._pending.get((day, chat_id, flow))
+            if row is None:
+                row = self._pending[(day, chat_id, flow)] = [0] * len(_FIELDS)
+            row[0] += 1
+            row[1] += prompt_tokens
+            row[2] += candidate_tokens
+            row[3] += total_tokens
+            row[4] += int(latency * 1000)
+            if (day, chat_id) in self._daily:
+                self._daily[(day, chat_id)] += total_tokens
+            should_flush = len(self._pending) >= self.flush_batch
+        if self.store is not None and self.quota_for(chat_id) > 0:
+            self._shared_total(chat_id, total_tokens, now)
+        if should_flush:
+            self.flush()
+
+    def _shared_total(self, chat_id: int, amount: int, now: Optional[float] = None) -> Optional[int]:
+        """Add to the chat's day counter in the state store; None if the store failed"""
+        try:
+            return self.store.incr_counter(f"tokens:{chat_id}", amount, DAY_SECONDS, local_seconds(now))
+        except Exception as e:
+            logger.error("Shared token counter failed for chat %s: %s", chat_id, e)
+            return None
+
+    def quota_for(self, chat_id: Optional[int]) -> int:
+        """Daily token limit for a chat; 0 means unlimited"""
+        if chat_id is None:
+            return 0
+        return settings.usage_quota_overrides.get(chat_id, settings.usage_daily_token_quota)
+
+    def used_today(self, chat_id: int, now: Optional[float] = None) -> int:
+        if self.store is not None:
+            shared = self._shared_total(chat_id, 0, now)
+            if shared is not None:
+                return shared
+        day = usage_day(now)
+        with self._lock:
+            used = self._daily.get((day, chat_id))
+        if used is not None:
+            return used
+
+        # Hold off flushes so no row is counted in both the table and pending, or in neither
+        with self._flush_lock:
+            stored = 0
+            if self.db_path is not None and self.db_path.exists():
+                try:
+                    with self._connect() as conn:
+                        stored = conn.execute(
+                            "SELECT COALESCE(SUM(total_tokens), 0) FROM token_usage WHERE day = ? AND chat_id = ?",
+                            (day, chat_id),
+                        ).fetchone()[0]
+                except sqlite3.Error as e:
+                    logger.error("Reading token usage failed: %s", e)
+            with self._lock:
+                # Drop totals from earlier days
+                for key in [key for key in self._daily if key[0] != day]:
+                    del self._daily[key]
+                pending = sum(row[3] for (d, c, _), row in self._pending.items() if d == day and c == chat_id)
+                return self._daily.setdefault((day, chat_id), stored + pending)
+
+    def check_quota(self, chat_id: Optional[int], now: Optional[float] = None):
+        """Raise DailyQuotaError if the chat has used up today's tokens"""
+        quota = self.quota_for(chat_id)
+        if quota <= 0:
+            return
+        used = self.used_today(chat_id, now)
+        if used >= quota:
+            self.quota_rejections += 1
+            raise DailyQuotaError(f"chat {chat_id} used {used} of {quota} tokens today")
+
+    def flush(self) -> int:
+        """Write pending totals to SQLite; returns the number of rows upserted"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending or self.db_path is None:
+                return 0
+            rows = [(day, chat_id, flow, *values) for (day, chat_id, flow), values in pending.items()]
+            try:
+                with self._connect() as conn:
+                    conn.executemany(
+                        "INSERT INTO token_usage (day, chat_id, flow, calls, prompt_tokens, candidate_tokens, "
+                        "total_tokens, latency_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT(day, chat_id, flow) DO UPDATE SET "
+                        "calls = calls + excluded.calls, "
+                        "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                        "candidate_tokens = candidate_tokens + excluded.candidate_tokens, "
+                        "total_tokens = total_tokens + excluded.total_tokens, "
+                        "latency_ms = latency_ms + excluded.latency_ms",
+                        rows,
+                    )
+            except sqlite3.Error as e:
+                logger.error("Flushing token usage failed, keeping %d rows: %s", len(rows), e)
+                self._requeue(pending)
+                return 0
+            self.flushed_rows += len(rows)
+            return len(rows)
+
+    def _requeue(self, pending: Dict[Tuple[str, int, str], List[int]]):
+        with self._lock:
+            for key, values in pending.items():
+                row = self._pending.setdefault(key, [0] * len(_FIELDS))
+                for i, value in enumerate(values):
+                    row[i] += value
+
+    async def flush_job(self, context):
+        """Job queue callback that flushes off the event loop"""
+        rows = await asyncio.to_thread(self.flush)
+        if rows:
+            logger.debug("Flushed %d token usage rows", rows)
+
+    def summary(self, day: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Per-flow totals for a day (default today), stored plus pending"""
+        day = day or usage_day()
+        totals: Dict[str, Dict[str, int]] = {}
+
+        def add(flow: str, values):
+            entry = totals.setdefault(flow, dict.fromkeys(_FIELDS, 0))
+            for name, value in zip(_FIELDS, values):
+                entry[name] += value
+
+        if self.db_path is not None and self.db_path.exists():
+            try:
+                with self._connect() as conn:
+                    for flow, *values in conn.execute(
+                        "SELECT flow, SUM(calls), SUM(prompt_tokens), SUM(candidate_tokens), "
+                        "SUM(total_tokens), SUM(latency_ms) FROM token_usage WHERE day = ? GROUP BY flow",
+                        (day,),
+                    ):
+                        add(flow, values)
+            except sqlite3.Error as e:
+                logger.error("Reading token usage failed: %s", e)
+        with self._lock:
+            pending = [(flow, list(values)) for (d, _, flow), values in self._pending.items() if d == day]
+        for flow, values in pending:
+            add(flow, values)
+        return totals
+
+# Shared by every AIService so quotas see all of a chat's calls
+usage_ledger = UsageLedger()
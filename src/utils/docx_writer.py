@@ -0,0 +1,179 @@
+"""
+Streaming .docx writer over a cached template package.
+
+The template is read and split once: every part except word/document.xml
+is kept as bytes and copied verbatim into each export, and document.xml is
+split around the end of its body. An export is then a zip written straight
+to disk with paragraphs streamed between the two halves, so styles,
+numbering and headers are never re-parsed or rebuilt and a bulletin of
+hundreds of items never exists as a DOM in memory.
+"""
+import io
+import os
+import re
+import threading
+import zipfile
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from src.config.settings import settings
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DOCUMENT_PART = "word/document.xml"
+STYLES_PART = "word/styles.xml"
+
+# Characters XML 1.0 does not allow; model output occasionally contains them
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+_STYLE_RE = re.compile(
+    r'<w:style\b[^>]*w:styleId="([^"]+)"[^>]*>.*?<w:name w:val="([^"]+)"', re.DOTALL
+)
+# Paragraph fragments are handed to the zip stream in chunks of this many bytes
+_FLUSH_BYTES = 64 * 1024
+
+class DocxTemplate:
+    """A template package split for streaming; immutable once loaded"""
+
+    def __init__(self, data: bytes, source: str = "<default>"):
+        self.source = source
+        self.parts: list = []
+        document = None
+        with zipfile.ZipFile(io.BytesIO(data)) as package:
+            for info in package.infolist():
+                if info.filename == DOCUMENT_PART:
+                    document = package.read(info).decode("utf-8")
+                else:
+                    self.parts.append((info.filename, package.read(info)))
+        if document is None:
+            raise ValueError(f"{source} has no {DOCUMENT_PART}")
+        self.head, self.tail = self._split_body(document)
+        styles = dict(self.parts).get(STYLES_PART, b"").decode("utf-8")
+        self.style_ids: Dict[str, str] = {
+            name.lower(): style_id for style_id, name in _STYLE_RE.findall(styles)
+        }
+
+    @staticmethod
+    def _split_body(document: str) -> Tuple[str, str]:
+        """Split before the body-level sectPr (the body's last child) or before </w:body>"""
+        end = document.rfind("</w:body>")
+        if end < 0:
+            raise ValueError("document.xml has no body")
+        section = document.rfind("<w:sectPr", 0, end)
+        split = section if section >= 0 and "</w:p>" not in document[section:end] else end
+        return document[:split], document[split:]
+
+    @classmethod
+    def load(cls, path: Path) -> "DocxTemplate":
+        if path.exists():
+            return cls(path.read_bytes(), str(path))
+        # No template supplied: python-docx's default, which has the built-in heading styles
+        from docx import Document
+        buffer = io.BytesIO()
+        Document().save(buffer)
+        return cls(buffer.getvalue())
+
+    def style(self, name: str) -> Optional[str]:
+        """Style id for a style name such as "Heading 1", or None if the template lacks it"""
+        return self.style_ids.get(name.lower())
+
+    def open(self, path: str) -> "DocxStream":
+        return DocxStream(self, path)
+
+_templates: Dict[str, Tuple[float, DocxTemplate]] = {}
+_templates_lock = threading.Lock()
+
+def shared_template(path: Optional[str] = None) -> DocxTemplate:
+    """
+    The template at path (default settings.docx_template under templates_dir),
+    parsed once and cached; a template replaced on disk is picked up by mtime.
+    """
+    path = Path(path or Path(settings.templates_dir) / settings.docx_template)
+    try:
+        mtime = path.stat().st_mtime
+    except OSError:
+        mtime = -1.0
+    key = str(path)
+    cached = _templates.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _templates_lock:
+        cached = _templates.get(key)
+        if cached is None or cached[0] != mtime:
+            template = DocxTemplate.load(path)
+            logger.info("Loaded docx template %s (%d styles)", template.source, len(template.style_ids))
+            cached = _templates[key] = (mtime, template)
+    return cached[1]
+
+class DocxStream:
+    """
+    One export being written. Use as a context manager; the file appears at
+    path only once it is complete.
+    """
+
+    def __init__(self, template: DocxTemplate, path: str):
+        self.template = template
+        self.path = path
+        self._tmp = f"{path}.part"
+        self._zip = zipfile.ZipFile(self._tmp, "w", zipfile.ZIP_DEFLATED, compresslevel=1)
+        for name, data in template.parts:
+            self._zip.writestr(name, data)
+        self._stream = self._zip.open(DOCUMENT_PART, "w")
+        self._pending: list = [template.head]
+        self._pending_bytes = 0
+        self.paragraphs = 0
+
+    def __enter__(self) -> "DocxStream":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _emit(self, fragment: str):
+        self._pending.append(fragment)
+        self._pending_bytes += len(fragment)
+        if self._pending_bytes >= _FLUSH_BYTES:
+            self._flush()
+
+    def _flush(self):
+        self._stream.write("".join(self._pending).encode("utf-8"))
+        self._pending = []
+        self._pending_bytes = 0
+
+    def _paragraph(self, line: str, style_id: Optional[str]):
+        properties = f'<w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>' if style_id else ""
+        run = ""
+        if line:
+            run = f'<w:r><w:t xml:space="preserve">{escape(_INVALID_XML.sub("", line))}</w:t></w:r>'
+        self._emit(f"<w:p>{properties}{run}</w:p>")
+        self.paragraphs += 1
+
+    def paragraph(self, text: str, style: Optional[str] = None):
+        """One paragraph per line of text, in the named style if the template has it"""
+        style_id = self.template.style(style) if style else None
+        for line in text.split("\n"):
+            self._paragraph(line.rstrip("\r"), style_id)
+
+    def heading(self, text: str, level: int = 1):
+        self.paragraph(text, "Title" if level == 0 else f"Heading {level}")
+
+    def page_break(self):
+        self._emit('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+
+    def close(self):
+        self._pending.append(self.template.tail)
+        self._flush()
+        self._stream.close()
+        self._zip.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        try:
+            self._stream.close()
+            self._zip.close()
+        finally:
+            Path(self._tmp).unlink(missing_ok=True)
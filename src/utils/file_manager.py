@@ -1,24 +1,49 @@
 """
 File Management Utilities (migrated from your file_generator.py)
 """
+import asyncio
+import gzip
 import os
+import shutil
+import time
 from pathlib import Path
+from typing import Dict, List, Optional
 from src.config.settings import settings
+from src.utils.docx_writer import shared_template
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 class FileManager:
     def __init__(self):
         self.exports_dir = Path(settings.exports_dir)
         self.uploads_dir = Path(settings.uploads_dir)
+        self.export_format = "docx" if settings.export_format == "docx" else "txt"
         
         # Create directories if they don't exist
         self.exports_dir.mkdir(parents=True, exist_ok=True)
         self.uploads_dir.mkdir(parents=True, exist_ok=True)
     
+    def export_filename(self, stem: str) -> str:
+        """stem with the extension of the configured export format"""
+        return f"{stem}.{self.export_format}"
+
     def assemble_output_file(self, input_type: str, category: str, av_content: str, pkg_content: str, filename: str) -> str:
         """
-        Assembles the final AV & PKG content into a single .txt file.
-        Returns the file path.
+        Assembles the final AV & PKG content into a single .txt or .docx
+        file, by filename extension. Returns the file path.
         """
+        file_path = self.exports_dir / filename
+        if file_path.suffix == ".docx":
+            with shared_template().open(str(file_path)) as doc:
+                doc.heading(input_type, 0)
+                doc.paragraph(f"Category: {category}")
+                doc.heading("SPEED 50")
+                doc.paragraph(av_content)
+                doc.heading("PKG SCRIPT")
+                doc.paragraph(pkg_content)
+            return str(file_path)
+
         content = f"""Input Type: {input_type}
 Category: {category}
 
@@ -29,15 +54,17 @@ Category: {category}
 {pkg_content}
 """
         
-        file_path = self.exports_dir / filename
         with open(file_path, "w", encoding="utf-8") as file:
             file.write(content)
 
         return str(file_path)
 
-    def generate_segment_txt(self, topic, content_type, info_source, detail_level, presentation_style, content_richness, duration):
+    def generate_segment_txt(self, topic, content_type, info_source, detail_level, presentation_style, content_richness, duration,
+                             script: Optional[str] = None):
         """
-        Generates a text file for a custom segment with the provided details.
+        Generates a file for a custom segment with the provided details,
+        followed by the script when given. Despite the name the file is .docx
+        when export_format is "docx".
         """
         content = (
             f"ವಿಷಯ: {topic}\n"
@@ -50,10 +77,150 @@ Category: {category}
         )
         
         # Create filename
-        filename = f"segment_{topic.replace(' ', '_')}.txt"
+        filename = self.export_filename(f"segment_{topic.replace(' ', '_')}")
         file_path = self.exports_dir / filename
         
+        if self.export_format == "docx":
+            with shared_template().open(str(file_path)) as doc:
+                doc.heading(topic, 0)
+                doc.paragraph(content)
+                if script:
+                    doc.heading("SCRIPT")
+                    doc.paragraph(script)
+            return str(file_path)
+        
+        if script:
+            content = f"{content}\n\n{script}\n"
         with open(file_path, 'w', encoding='utf-8') as file:
             file.write(content)
             
-        return str(file_path)
\ No newline at end of file
+        return str(file_path)
+
+    def assemble_multilang_file(self, title: str, versions: Dict[str, Optional[str]], filename: str) -> str:
+        """
+        Writes every language version of a script into one .txt or .docx
+        file, by filename extension. versions maps language -> text; None
+        marks a failed translation. Returns the file path.
+        """
+        file_path = self.exports_dir / filename
+        if file_path.suffix == ".docx":
+            with shared_template().open(str(file_path)) as doc:
+                doc.heading(title, 0)
+                for language, text in versions.items():
+                    doc.heading(language.upper())
+                    doc.paragraph(text if text is not None else "(translation unavailable)")
+            return str(file_path)
+
+        sections = [f"{title}\n"]
+        for language, text in versions.items():
+            body = text if text is not None else "(translation unavailable)"
+            sections.append(f"--- {language.upper()} ---\n{body}\n")
+
+        with open(file_path, "w", encoding="utf-8") as file:
+            file.write("\n".join(sections))
+
+        return str(file_path)
+
+    def write_speed50_file(self, headlines: List[str], outputs: List[str], filename: str) -> str:
+        """
+        Writes a Speed 50 batch, one AV script per headline, as .txt or
+        .docx by filename extension. The .docx is streamed item by item, so
+        bulletins of hundreds of headlines are never held as one document
+        in memory. Returns the file path.
+        """
+        file_path = self.exports_dir / filename
+        if file_path.suffix == ".docx":
+            with shared_template().open(str(file_path)) as doc:
+                doc.heading(f"Speed 50 - {len(headlines)}", 0)
+                for number, (headline, output) in enumerate(zip(headlines, outputs), 1):
+                    doc.heading(f"{number}. {headline}", 2)
+                    doc.paragraph(output)
+            return str(file_path)
+
+        with open(file_path, "w", encoding="utf-8") as file:
+            for output in outputs:
+                file.write(f"{output}\n\n{'-'*50}\n\n")
+
+        return str(file_path)
+
+    def sweep_exports(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        Enforce age, total size and file count caps on the exports directory,
+        deleting least recently used files first. Files younger than
+        export_min_age_seconds are left alone since a handler may still be
+        sending them. Returns counts and the bytes reclaimed.
+        """
+        now = time.time() if now is None else now
+        report = {"removed": 0, "compressed": 0, "reclaimed_bytes": 0}
+
+        entries = []
+        for path in self.exports_dir.iterdir():
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if path.is_file():
+                entries.append([path, st.st_size, max(st.st_atime, st.st_mtime)])
+        # Least recently used first
+        entries.sort(key=lambda entry: entry[2])
+
+        total_bytes = sum(entry[1] for entry in entries)
+        count = len(entries)
+        retained = []
+        for entry in entries:
+            path, size, last_used = entry
+            age = now - last_used
+            over_cap = count > settings.export_max_files or total_bytes > settings.export_max_total_bytes
+            if age >= settings.export_min_age_seconds and (age >= settings.export_max_age_seconds or over_cap):
+                if self._remove(path):
+                    report["removed"] += 1
+                    report["reclaimed_bytes"] += size
+                count -= 1
+                total_bytes -= size
+            else:
+                retained.append(entry)
+
+        if settings.export_gzip_retained:
+            for path, size, last_used in retained:
+                if path.suffix == ".gz" or now - last_used < settings.export_min_age_seconds:
+                    continue
+                compressed_size = self._gzip(path)
+                if compressed_size is not None:
+                    report["compressed"] += 1
+                    report["reclaimed_bytes"] += max(0, size - compressed_size)
+
+        return report
+
+    async def sweep_job(self, context):
+        """Job queue callback that runs sweep_exports off the event loop"""
+        report = await asyncio.to_thread(self.sweep_exports)
+        logger.info(
+            "Exports sweep: removed=%d compressed=%d reclaimed_bytes=%d",
+            report["removed"], report["compressed"], report["reclaimed_bytes"]
+        )
+
+    def _remove(self, path: Path) -> bool:
+        try:
+            path.unlink()
+            return True
+        except FileNotFoundError:
+            # Already removed by the handler that sent it
+            return False
+        except OSError as e:
+            logger.warning("Could not remove export %s: %s", path, e)
+            return False
+
+    def _gzip(self, path: Path) -> Optional[int]:
+        target = path.with_name(path.name + ".gz")
+        try:
+            with open(path, "rb") as src, gzip.open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+            return target.stat().st_size
+        except FileNotFoundError:
+            target.unlink(missing_ok=True)
+            return None
+        except OSError as e:
+            logger.warning("Could not compress export %s: %s", path, e)
+            target.unlink(missing_ok=True)
+            return None
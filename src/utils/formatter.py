@@ -0,0 +1,69 @@
+"""
+Message formatting helpers: splitting long text for Telegram
+"""
+import re
+from typing import List
+
+# Telegram's limit, counted in UTF-16 code units
+MAX_MESSAGE_LENGTH = 4096
+
+# Preferred split points, coarsest first: sections/paragraphs, sentences
+# (including the danda), lines, words
+_BOUNDARIES = [
+    re.compile(r"(?=\n🎙)|(?=\n--- )|(?<=\n\n)"),
+    re.compile(r"(?<=[.!?।|])(?=\s)"),
+    re.compile(r"(?<=\n)"),
+    re.compile(r"(?<= )"),
+]
+
+def utf16_len(text: str) -> int:
+    """Length as Telegram counts it (emoji outside the BMP count twice)"""
+    return len(text.encode("utf-16-le")) // 2
+
+def _hard_split(text: str, limit: int) -> List[str]:
+    chunks, current = [], ""
+    for char in text:
+        if utf16_len(current + char) > limit:
+            chunks.append(current)
+            current = ""
+        current += char
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _split(text: str, limit: int, level: int) -> List[str]:
+    if utf16_len(text) <= limit:
+        return [text]
+    if level >= len(_BOUNDARIES):
+        return _hard_split(text, limit)
+
+    pieces = []
+    for piece in _BOUNDARIES[level].split(text):
+        if utf16_len(piece) > limit:
+            pieces.extend(_split(piece, limit, level + 1))
+        elif piece:
+            pieces.append(piece)
+
+    # Greedily pack neighbouring pieces back together
+    chunks, current = [], ""
+    for piece in pieces:
+        if current and utf16_len(current + piece) > limit:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def split_at_boundaries(text: str, limit: int) -> List[str]:
+    """
+    Split text into ordered chunks of at most limit, breaking at section,
+    then sentence, then line, then word boundaries, and only mid-word as a
+    last resort. The chunks concatenate back to text.
+    """
+    return _split(text, limit, 0)
+
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """split_at_boundaries, with chunks stripped and empty ones dropped"""
+    chunks = [chunk.strip() for chunk in split_at_boundaries(text, limit)]
+    return [chunk for chunk in chunks if chunk]
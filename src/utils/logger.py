@@ -1,23 +1,125 @@
 """
 Enhanced logging configuration
+
+Records are handed to a bounded queue on the calling thread and written by a
+QueueListener on a background thread, so file I/O and rotation never run on
+the event loop. Repetitive warnings/errors are sampled per message template.
 """
+import json
 import logging
 import logging.handlers
-import os
+import queue
+import threading
+import time
 from pathlib import Path
+from typing import Dict, Optional, Tuple
 from src.config.settings import settings
 
+# Structured fields handlers may pass via extra={...}
+CONTEXT_FIELDS = ("chat_id", "flow", "latency_ms")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class ErrorSampler(logging.Filter):
+    """
+    Lets through at most `burst` WARNING+ records per message template and
+    logger every `window` seconds. The next record let through after a
+    suppressed run carries the suppressed count.
+    """
+
+    def __init__(self, burst: int, window: float):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._buckets: Dict[Tuple[str, int, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or now - bucket[0] >= self.window:
+                suppressed = bucket[2] if bucket else 0
+                bucket = self._buckets[key] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+            if bucket[1] >= self.burst:
+                bucket[2] += 1
+                return False
+            bucket[1] += 1
+            if len(self._buckets) > 1000:
+                self._purge(now)
+        return True
+
+    def _purge(self, now: float):
+        stale = [key for key, bucket in self._buckets.items()
+                 if now - bucket[0] >= self.window and not bucket[2]]
+        for key in stale:
+            del self._buckets[key]
+
+class TextFormatter(logging.Formatter):
+    """Plain text lines with structured fields appended as key=value"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = [f"{name}={getattr(record, name)}" for name in CONTEXT_FIELDS if hasattr(record, name)]
+        if hasattr(record, "suppressed"):
+            fields.append(f"suppressed={record.suppressed}")
+        return f"{line} [{' '.join(fields)}]" if fields else line
+
+class JsonFormatter(logging.Formatter):
+    """Compact JSON lines"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS + ("suppressed",):
+            if hasattr(record, name):
+                entry[name] = getattr(record, name)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str)
+
 def setup_logging():
     """Set up logging configuration"""
+    global _listener, _queue_handler
+    stop_logging()
+
     # Create logs directory
     log_dir = Path(settings.log_file).parent
     log_dir.mkdir(parents=True, exist_ok=True)
-    
+
     # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
+    if settings.log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+
     # File handler with rotation
     file_handler = logging.handlers.RotatingFileHandler(
         settings.log_file,
@@ -26,20 +128,40 @@ def setup_logging():
     )
     file_handler.setFormatter(formatter)
     file_handler.setLevel(getattr(logging, settings.log_level))
-    
+
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
     console_handler.setLevel(logging.INFO)
-    
+
+    # Both handlers run on the listener's background thread
+    log_queue = queue.Queue(maxsize=settings.log_queue_size)
+    _listener = logging.handlers.QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(ErrorSampler(settings.log_sample_burst, settings.log_sample_window_seconds))
+
     # Root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(getattr(logging, settings.log_level))
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
-    
+    root_logger.addHandler(_queue_handler)
+    _listener.start()
+
     return root_logger
 
+def stop_logging():
+    """Flush queued records and stop the background listener"""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
 def get_logger(name: str) -> logging.Logger:
     """Get a logger instance"""
-    return logging.getLogger(name)
\ No newline at end of file
+    return logging.getLogger(name)
@@ -0,0 +1,51 @@
+"""
+Text measurement helpers: Kannada-aware word counts and reading time
+"""
+import re
+from typing import Dict
+
+# Kannada speaking speed used for every duration estimate
+WORDS_PER_MINUTE = 150
+
+# A word is a run of letters/digits plus Kannada vowel signs, viramas and
+# joiners, which \w alone would split on (ಕನ್ನಡ is one word, not three)
+_WORD_RE = re.compile(r"[\w\u0C80-\u0CFF\u200C\u200D]+")
+
+# Characters a finished script can end on
+_TERMINAL = tuple(".!?।|\"'”’)]»…")
+
+def count_words(text: str) -> int:
+    """Number of spoken words; emoji, bullets and punctuation are not words"""
+    if not text:
+        return 0
+    return sum(1 for _ in _WORD_RE.finditer(text))
+
+def reading_time_seconds(text: str, words_per_minute: int = WORDS_PER_MINUTE) -> int:
+    """Estimated time to read text aloud"""
+    return round(count_words(text) * 60 / words_per_minute)
+
+def format_reading_time(seconds: int) -> str:
+    minutes, seconds = divmod(seconds, 60)
+    if not minutes:
+        return f"{seconds} ಸೆಕೆಂಡುಗಳು"
+    return f"{minutes} ನಿಮಿಷ {seconds} ಸೆಕೆಂಡುಗಳು" if seconds else f"{minutes} ನಿಮಿಷಗಳು"
+
+def looks_truncated(text: str) -> bool:
+    """True when text stops mid-sentence (e.g. the model hit its output limit)"""
+    stripped = text.rstrip()
+    return bool(stripped) and not stripped.endswith(_TERMINAL)
+
+def verify_length(text: str, target_words: int, tolerance: float) -> Dict:
+    """
+    Compare text against a word target. The text passes when it has at least
+    tolerance * target_words words and does not end mid-sentence.
+    """
+    words = count_words(text)
+    truncated = looks_truncated(text)
+    return {
+        "words": words,
+        "target": target_words,
+        "missing": max(0, target_words - words),
+        "truncated": truncated,
+        "ok": words >= target_words * tolerance and not truncated,
+    }
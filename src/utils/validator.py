@@ -0,0 +1,142 @@
+"""
+Pre-flight input validation: reject requests that cannot produce a useful
+script before any model call is made
+"""
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.config.settings import settings
+
+# Lines that only separate content: ----, ====, ***, ++...++, • • •
+_DIVIDER_RE = re.compile(r"^[\W_]+$")
+# Dates, times and page numbers on their own line: 12/05/2024, 10:30, ಪುಟ 3
+_DATE_RE = re.compile(
+    r"^(?:\d{1,4}[./-]\d{1,2}[./-]\d{1,4}|\d{1,2}:\d{2}(?:\s*[ap]\.?m\.?)?|(?:page|ಪುಟ)\s*\d+|\d+)$",
+    re.IGNORECASE,
+)
+
+def script_ratios(text: str) -> Dict[str, float]:
+    """Share of non-space characters that are Kannada letters, Latin letters or anything else"""
+    kannada = latin = other = 0
+    for char in text:
+        if char.isspace():
+            continue
+        if "\u0C80" <= char <= "\u0CFF":
+            kannada += 1
+        elif char.isascii() and char.isalpha():
+            latin += 1
+        else:
+            other += 1
+    total = kannada + latin + other
+    if not total:
+        return {"kannada": 0.0, "latin": 0.0, "other": 0.0}
+    return {"kannada": kannada / total, "latin": latin / total, "other": other / total}
+
+def _normalize(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).casefold().split())
+
+def is_junk_line(line: str) -> bool:
+    """True for divider, date/time, page-number and letterless lines in a headline list"""
+    stripped = line.strip()
+    if not stripped or _DIVIDER_RE.match(stripped) or _DATE_RE.match(stripped):
+        return True
+    return not any(char.isalpha() for char in stripped)
+
+class InputValidator:
+    """
+    Checks run before generation. Each check returns a localized message
+    explaining the rejection, or None when the input may go to the model.
+    Latin text is accepted alongside Kannada because sources are often
+    English wire copy; inputs dominated by emoji, digits or symbols are not.
+    """
+
+    def __init__(self, min_chars: Optional[int] = None, max_chars: Optional[int] = None,
+                 min_script_ratio: Optional[float] = None, repeat_window: Optional[float] = None,
+                 max_tracked_chats: int = 10000):
+        self.min_chars = min_chars or settings.input_min_chars
+        self.max_chars = max_chars or settings.input_max_chars
+        self.min_script_ratio = settings.input_min_script_ratio if min_script_ratio is None else min_script_ratio
+        self.repeat_window = settings.input_repeat_window_seconds if repeat_window is None else repeat_window
+        self.max_tracked_chats = max_tracked_chats
+        # (chat_id, flow) -> (digest, remembered_at), oldest first
+        self._recent: "OrderedDict[Tuple[int, str], Tuple[str, float]]" = OrderedDict()
+        self.rejected: Dict[str, int] = {}
+
+    def check_text(self, text: str) -> Optional[str]:
+        """Length and script checks for free text (news content)"""
+        text = text.strip()
+        if len(text) < self.min_chars:
+            return self._reject(
+                "too_short",
+                f"⚠️ ವಿಷಯ ತುಂಬಾ ಚಿಕ್ಕದಾಗಿದೆ. ಕನಿಷ್ಠ {self.min_chars} ಅಕ್ಷರಗಳ ಸುದ್ದಿ ವಿಷಯವನ್ನು ಕಳುಹಿಸಿ."
+            )
+        if len(text) > self.max_chars:
+            return self._reject(
+                "too_long",
+                f"⚠️ ವಿಷಯ ತುಂಬಾ ಉದ್ದವಾಗಿದೆ ({len(text)} ಅಕ್ಷರಗಳು). "
+                f"ಗರಿಷ್ಠ {self.max_chars} ಅಕ್ಷರಗಳವರೆಗೆ ಕಳುಹಿಸಿ."
+            )
+        ratios = script_ratios(text)
+        if ratios["kannada"] + ratios["latin"] < self.min_script_ratio:
+            return self._reject(
+                "script",
+                "⚠️ ಈ ಸಂದೇಶದಲ್ಲಿ ಓದಬಹುದಾದ ಸುದ್ದಿ ಪಠ್ಯ ಕಡಿಮೆ ಇದೆ. ದಯವಿಟ್ಟು ಕನ್ನಡ ಅಥವಾ ಇಂಗ್ಲಿಷ್ ಸುದ್ದಿ ವಿಷಯವನ್ನು ಕಳುಹಿಸಿ."
+            )
+        return None
+
+    def clean_headlines(self, lines: Iterable[str]) -> Tuple[List[str], int]:
+        """
+        Drop divider, date and letterless lines, headlines shorter than a few
+        characters, and exact duplicates. Returns (kept, dropped count).
+        """
+        kept, seen, dropped = [], set(), 0
+        for line in lines:
+            line = line.strip()
+            key = _normalize(line)
+            if is_junk_line(line) or len(line) < settings.headline_min_chars or key in seen:
+                dropped += 1
+                continue
+            seen.add(key)
+            kept.append(line)
+        if dropped:
+            self.rejected["junk_lines"] = self.rejected.get("junk_lines", 0) + dropped
+        return kept, dropped
+
+    def is_repeat(self, chat_id: int, flow: str, text: str, now: Optional[float] = None) -> bool:
+        """True if text is what this chat last sent to this flow, within the repeat window"""
+        entry = self._recent.get((chat_id, flow))
+        if entry is None:
+            return False
+        now = time.monotonic() if now is None else now
+        digest, remembered_at = entry
+        if now - remembered_at > self.repeat_window or digest != self._digest(text):
+            return False
+        self.rejected["repeat"] = self.rejected.get("repeat", 0) + 1
+        return True
+
+    def remember(self, chat_id: int, flow: str, text: str, now: Optional[float] = None):
+        """Record a request that was served, for is_repeat"""
+        key = (chat_id, flow)
+        self._recent.pop(key, None)
+        self._recent[key] = (self._digest(text), time.monotonic() if now is None else now)
+        while len(self._recent) > self.max_tracked_chats:
+            self._recent.popitem(last=False)
+
+    def _digest(self, text: str) -> str:
+        return hashlib.blake2b(_normalize(text).encode("utf-8"), digest_size=16).hexdigest()
+
+    def _reject(self, reason: str, message: str) -> str:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return message
+
+REPEAT_MESSAGE = (
+    "ℹ️ ಇದೇ ವಿಷಯವನ್ನು ನೀವು ಈಗಷ್ಟೇ ಕಳುಹಿಸಿದ್ದೀರಿ ಮತ್ತು ಅದರ ಸ್ಕ್ರಿಪ್ಟ್ ಈಗಾಗಲೇ ಕಳುಹಿಸಲಾಗಿದೆ. "
+    "ಹೊಸ ವಿಷಯವನ್ನು ಕಳುಹಿಸಿ."
+)
+
+# Global validator instance
+input_validator = InputValidator()
@@ -0,0 +1,241 @@
+"""
+Unit tests for graceful drain and checkpoint resume
+"""
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+from src.core.drain import CheckpointStore, DrainController
+from src.core.conversation_handler import session_manager
+from src.handlers.segment_handler import SegmentHandler
+from src.handlers.speed50_handler import Speed50Handler
+from src.models.checkpoint import Checkpoint
+
+class TestCheckpointStore:
+    def test_claim_roundtrip(self, tmp_path):
+        store = CheckpointStore(str(tmp_path), max_age=3600)
+        checkpoint = Checkpoint("speed50", 42, {"headlines": ["a", "b"]}, done={1: "B"})
+        store.save(checkpoint)
+
+        claimed = store.claim_all()
+        assert len(claimed) == 1
+        assert claimed[0].job_id == checkpoint.job_id
+        assert claimed[0].done == {1: "B"}
+        assert claimed[0].pending(2) == [0]
+        assert store.pending() == []
+        assert store.claim_all() == []
+
+    def test_stale_and_corrupt_are_dropped(self, tmp_path):
+        store = CheckpointStore(str(tmp_path), max_age=60)
+        store.save(Checkpoint("speed50", 1, {}, created_at=0))
+        (tmp_path / "broken.json").write_text("{not json", encoding="utf-8")
+        assert store.claim_all(now=1000) == []
+        assert list(tmp_path.iterdir()) == []
+
+class TestDrainController:
+    @pytest.mark.asyncio
+    async def test_waits_for_in_flight_jobs(self, tmp_path):
+        drain = DrainController(CheckpointStore(str(tmp_path)))
+
+        async def job():
+            async with drain.job():
+                await asyncio.sleep(0.05)
+
+        task = asyncio.create_task(job())
+        await asyncio.sleep(0)
+        assert await drain.drain(deadline=1, poll=0.01) == 0
+        assert drain.draining and drain.expired
+        await task
+
+    @pytest.mark.asyncio
+    async def test_deadline_expires(self, tmp_path):
+        drain = DrainController(CheckpointStore(str(tmp_path)))
+        release = asyncio.Event()
+
+        async def job():
+            async with drain.job():
+                await release.wait()
+
+        task = asyncio.create_task(job())
+        await asyncio.sleep(0)
+        assert await drain.drain(deadline=0.05, poll=0.01) == 1
+        assert drain.expired
+        release.set()
+        await task
+
+class TestSpeed50Checkpointing:
+    @pytest.fixture
+    def handler(self):
+        handler = Speed50Handler()
+        handler.ai_service.agenerate_reusable = AsyncMock(
+            side_effect=lambda prompt, flow, headline, **kwargs: (f"AV {headline}", None)
+        )
+        return handler
+
+    @pytest.mark.asyncio
+    async def test_batch_checkpoints_at_deadline_and_resumes(self, handler, tmp_path):
+        store = CheckpointStore(str(tmp_path))
+        first = DrainController(store)
+        headlines = ["ಶೀರ್ಷಿಕೆ ಒಂದು", "ಶೀರ್ಷಿಕೆ ಎರಡು", "ಶೀರ್ಷಿಕೆ ಮೂರು"]
+        generate = handler.ai_service.agenerate_reusable.side_effect
+
+        def expire_after_first(prompt, flow, headline, **kwargs):
+            first.expired = True
+            return generate(prompt, flow, headline, **kwargs)
+
+        handler.ai_service.agenerate_reusable.side_effect = expire_after_first
+        outbox = AsyncMock()
+        with patch("src.handlers.speed50_handler.drain_controller", first), \
+                patch("src.handlers.speed50_handler.outbox", outbox):
+            finished = await handler.run_batch(None, Checkpoint("speed50", 7, {"headlines": headlines}))
+        assert finished is False
+        outbox.send_document.assert_not_called()
+        saved = json.loads(next(tmp_path.glob("*.json")).read_text(encoding="utf-8"))
+        assert saved["done"] == {"0": "AV ಶೀರ್ಷಿಕೆ ಒಂದು"}
+
+        # Next process: the remaining headlines are generated and the full file is sent
+        handler.ai_service.agenerate_reusable.side_effect = generate
+        handler.ai_service.agenerate_reusable.reset_mock()
+        second = DrainController(store)
+        second.register("speed50", handler.resume_batch)
+        sent = {}
+
+        async def send_document(bot, chat_id, path, priority, **kwargs):
+            with open(path, encoding="utf-8") as f:
+                sent[chat_id] = f.read()
+
+        outbox = AsyncMock()
+        outbox.send_document.side_effect = send_document
+        with patch("src.handlers.speed50_handler.drain_controller", second), \
+                patch("src.handlers.speed50_handler.outbox", outbox):
+            tasks = []
+            assert await second.resume(None, lambda coro: tasks.append(asyncio.ensure_future(coro))) == 1
+            await asyncio.gather(*tasks)
+
+        assert handler.ai_service.agenerate_reusable.await_count == 2
+        assert [line for line in sent[7].splitlines() if line.startswith("AV")] == [f"AV {h}" for h in headlines]
+        assert store.pending() == []
+
+    @pytest.mark.asyncio
+    async def test_new_batch_is_parked_while_draining(self, handler, tmp_path):
+        drain = DrainController(CheckpointStore(str(tmp_path)))
+        drain.begin()
+        outbox = AsyncMock()
+        with patch("src.handlers.speed50_handler.drain_controller", drain), \
+                patch("src.handlers.speed50_handler.outbox", outbox):
+            assert await handler.run_batch(None, Checkpoint("speed50", 7, {"headlines": ["ಶೀರ್ಷಿಕೆ"]})) is False
+        handler.ai_service.agenerate_reusable.assert_not_called()
+        assert len(drain.store.pending()) == 1
+        assert drain.checkpointed == 1
+
+class TestSegmentDelivery:
+    @pytest.mark.asyncio
+    async def test_failed_translation_after_delivery_is_not_a_segment_failure(self, tmp_path):
+        handler = SegmentHandler()
+        handler.file_manager.exports_dir = tmp_path
+        handler.segment_service.generate_custom_segment = AsyncMock(return_value=("ಸ್ಕ್ರಿಪ್ಟ್", "news", 2))
+        handler.translation_service.translate = AsyncMock(return_value={"english": "script"})
+        drain = DrainController(CheckpointStore(str(tmp_path / "checkpoints")))
+        outbox = AsyncMock()
+        # The Kannada segment goes out, the translated file does not
+        outbox.send_document.side_effect = [None, RuntimeError("upload failed")]
+        prefs = {
+            "topic": "ವಿಷಯ", "content_type": "a", "info_source": "b", "detail_level": "c",
+            "presentation_style": "d", "content_richness": "e",
+        }
+        with patch("src.handlers.segment_handler.drain_controller", drain), \
+                patch("src.handlers.segment_handler.outbox", outbox), \
+                patch("src.handlers.segment_handler.settings.translation_languages", ["english"]):
+            finished = await handler.run_segment(None, Checkpoint("segment", 7, {"prefs": prefs, "duration": 3}))
+
+        assert finished is True
+        messages = [call.args[2] for call in outbox.send_text.call_args_list]
+        assert messages[-1].startswith("⚠️ ಅನುವಾದ ವಿಫಲವಾಗಿದೆ")
+        assert drain.store.pending() == []
+        assert [path for path in tmp_path.iterdir() if path.is_file()] == []
+
+class TestSpeed50Eager:
+    @pytest.mark.asyncio
+    async def test_pasted_headlines_generate_before_done(self, tmp_path):
+        handler = Speed50Handler()
+        started = []
+        release = asyncio.Event()
+
+        async def generate(prompt, flow, headline, **kwargs):
+            started.append(headline)
+            await release.wait()
+            return f"AV {headline}", None
+
+        handler.ai_service.agenerate_reusable = AsyncMock(side_effect=generate)
+        session = session_manager.get(9)
+        session.add_headlines(["ಶೀರ್ಷಿಕೆ ಒಂದು", "ಶೀರ್ಷಿಕೆ ಎರಡು"], 10, 1000)
+        handler._start_eager(session, 0)
+        await asyncio.sleep(0.01)
+        assert started == ["ಶೀರ್ಷಿಕೆ ಒಂದು", "ಶೀರ್ಷಿಕೆ ಎರಡು"]
+
+        release.set()
+        sent = {}
+
+        async def send_document(bot, chat_id, path, priority, **kwargs):
+            with open(path, encoding="utf-8") as f:
+                sent[chat_id] = f.read()
+
+        outbox = AsyncMock()
+        outbox.send_document.side_effect = send_document
+        checkpoint = Checkpoint("speed50", 9, {"headlines": list(session.headlines)})
+        with patch("src.handlers.speed50_handler.drain_controller", DrainController(CheckpointStore(str(tmp_path)))), \
+                patch("src.handlers.speed50_handler.outbox", outbox):
+            assert await handler.run_batch(None, checkpoint, session.take_eager()) is True
+        session_manager.end(9)
+
+        # Nothing was generated twice
+        assert handler.ai_service.agenerate_reusable.await_count == 2
+        assert [line for line in sent[9].splitlines() if line.startswith("AV")] == [
+            "AV ಶೀರ್ಷಿಕೆ ಒಂದು", "AV ಶೀರ್ಷಿಕೆ ಎರಡು",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_eager_item_is_regenerated(self, tmp_path):
+        handler = Speed50Handler()
+        release = asyncio.Event()
+
+        async def generate(prompt, flow, headline, **kwargs):
+            await release.wait()
+            return f"AV {headline}", None
+
+        handler.ai_service.agenerate_reusable = AsyncMock(side_effect=generate)
+        session = session_manager.get(10)
+        session.add_headlines(["ಶೀರ್ಷಿಕೆ ಒಂದು", "ಶೀರ್ಷಿಕೆ ಎರಡು"], 10, 1000)
+        handler._start_eager(session, 0)
+        eager = session.take_eager()
+        session_manager.end(10)
+        first = eager[0]
+
+        outbox = AsyncMock()
+        checkpoint = Checkpoint("speed50", 10, {"headlines": ["ಶೀರ್ಷಿಕೆ ಒಂದು", "ಶೀರ್ಷಿಕೆ ಎರಡು"]})
+        with patch("src.handlers.speed50_handler.drain_controller", DrainController(CheckpointStore(str(tmp_path)))), \
+                patch("src.handlers.speed50_handler.outbox", outbox):
+            batch = asyncio.ensure_future(handler.run_batch(None, checkpoint, eager))
+            await asyncio.sleep(0.01)
+            # Cancelled while the batch waits on it, as session expiry would
+            first.cancel()
+            await asyncio.sleep(0.01)
+            release.set()
+            assert await batch is True
+        assert checkpoint.done == {0: "AV ಶೀರ್ಷಿಕೆ ಒಂದು", 1: "AV ಶೀರ್ಷಿಕೆ ಎರಡು"}
+        assert handler.ai_service.agenerate_reusable.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_repeat_paste_is_rejected_before_generating(self):
+        handler = Speed50Handler()
+        handler.ai_service.agenerate_reusable = AsyncMock(return_value=("AV", None))
+        text = "ಶೀರ್ಷಿಕೆ ಒಂದು\nಶೀರ್ಷಿಕೆ ಎರಡು"
+        update = AsyncMock()
+        update.message.chat_id = 11
+        update.message.text = text
+        with patch("src.handlers.speed50_handler.input_validator.is_repeat", return_value=True):
+            await handler.handle_speed50_headlines(update, None)
+        session = session_manager.get(11)
+        assert session.headlines == [] and session.eager == {}
+        session_manager.end(11)
+        handler.ai_service.agenerate_reusable.assert_not_awaited()
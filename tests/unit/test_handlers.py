@@ -1,11 +1,15 @@
 """
 Unit tests for handlers
 """
+import asyncio
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from src.handlers.start_handler import StartHandler
 from src.handlers.news_handler import NewsHandler
+from src.handlers.admin_handler import AdminHandler
+from src.core.lanes import GenerationLanes
 from src.config.constants import START, NEWS_CONTENT
+from src.config.settings import settings
 
 class TestStartHandler:
     @pytest.fixture
@@ -65,4 +69,49 @@ class TestNewsHandler:
         # Cleanup
         import os
         if os.path.exists("/tmp/test.txt"):
-            os.remove("/tmp/test.txt")
\ No newline at end of file
+            os.remove("/tmp/test.txt")
+
+class TestAdminHandler:
+    @pytest.fixture
+    def admin_update(self):
+        update = MagicMock()
+        update.effective_chat.id = 42
+        update.message.reply_text = AsyncMock()
+        return update
+    
+    @pytest.mark.asyncio
+    async def test_non_admin_is_ignored(self, admin_update):
+        """Test commands from chats outside the allowlist do nothing"""
+        with patch.object(settings, 'admin_chat_ids', []):
+            await AdminHandler().stats(admin_update, MagicMock(args=[]))
+        admin_update.message.reply_text.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_stats_for_admin(self, admin_update):
+        """Test the stats report covers lanes, caches and sessions"""
+        with patch.object(settings, 'admin_chat_ids', [42]):
+            await AdminHandler().stats(admin_update, MagicMock(args=[]))
+        report = admin_update.message.reply_text.call_args[0][0]
+        assert "Generations in flight" in report
+        assert "Live sessions" in report
+        assert "Process RSS" in report
+    
+    @pytest.mark.asyncio
+    async def test_pause_and_resize_lane(self, admin_update):
+        """Test lanes can be paused and resized at runtime"""
+        lanes = GenerationLanes({"batch": 1})
+        with patch.object(settings, 'admin_chat_ids', [42]), \
+                patch('src.handlers.admin_handler.generation_lanes', lanes):
+            await AdminHandler().pause(admin_update, MagicMock(args=["batch"]))
+            assert lanes.get("batch").paused
+            
+            waiter = asyncio.create_task(lanes.get("batch").acquire())
+            await asyncio.sleep(0)
+            assert lanes.queue_depth == 1
+            
+            await AdminHandler().resume(admin_update, MagicMock(args=["batch"]))
+            await asyncio.wait_for(waiter, 1)
+            assert lanes.in_flight == 1
+            
+            await AdminHandler().concurrency(admin_update, MagicMock(args=["batch", "4"]))
+            assert lanes.get("batch").limit == 4
@@ -0,0 +1,83 @@
+"""
+Unit tests for health reporting and the warm-up stage
+"""
+import asyncio
+import json
+import pytest
+from unittest.mock import patch, MagicMock
+from src.config.settings import settings
+from src.core.bot_manager import ClaudeNewsBot
+from src.core.health import HealthServer, HealthState, OK
+
+async def _get(port: int, path: str):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, body = raw.split(b"\r\n\r\n", 1)
+    return int(head.split()[1]), json.loads(body)
+
+class TestHealthState:
+    def test_ready_needs_checks_and_polling(self):
+        state = HealthState()
+        state.register("gemini")
+        state.accepting = True
+        assert not state.ready
+        state.mark("gemini", OK)
+        assert state.ready
+        state.accepting = False
+        assert not state.ready
+
+class TestHealthServer:
+    @pytest.mark.asyncio
+    async def test_liveness_and_readiness(self):
+        state = HealthState()
+        state.register("gemini")
+        server = HealthServer(state, host="127.0.0.1", port=0)
+        await server.start()
+        try:
+            assert await _get(server.port, "/health") == (200, {"status": "alive", "ready": False})
+            status, body = await _get(server.port, "/health/ready")
+            assert status == 503
+            assert body["checks"] == {"gemini": "pending"}
+
+            state.mark("gemini", OK)
+            state.accepting = True
+            status, body = await _get(server.port, "/health/ready")
+            assert status == 200
+            assert body["status"] == "ready"
+            assert (await _get(server.port, "/nope"))[0] == 404
+        finally:
+            await server.stop()
+
+class TestWarmUp:
+    @pytest.fixture
+    def bot(self):
+        with patch('src.core.bot_manager.health_state', HealthState()) as state:
+            bot = ClaudeNewsBot()
+            bot.health = state
+            yield bot
+
+    @pytest.mark.asyncio
+    async def test_warm_up_pings_gemini_and_primes_http(self, bot):
+        bot.news_handler.ai_service = MagicMock()
+        bot.speed50_handler.ai_service = MagicMock()
+        bot.segment_handler.ai_service = MagicMock()
+        bot.segment_handler.segment_service = MagicMock()
+        with patch.object(settings, 'enable_web_search', True):
+            await bot.warm_up()
+        bot.news_handler.ai_service.ping.assert_called_once()
+        bot.segment_handler.segment_service.warm_up_http.assert_called_once()
+        assert set(bot.health.checks.values()) == {OK}
+
+    @pytest.mark.asyncio
+    async def test_failed_step_is_reported_not_raised(self, bot):
+        bot.news_handler.ai_service = MagicMock()
+        bot.news_handler.ai_service.ping.side_effect = ConnectionError("offline")
+        bot.speed50_handler.ai_service = MagicMock()
+        bot.segment_handler.ai_service = MagicMock()
+        bot.segment_handler.segment_service = MagicMock()
+        await bot.warm_up()
+        assert bot.health.checks["gemini"] == "error: offline"
+        assert bot.health.checks["modules"] == OK
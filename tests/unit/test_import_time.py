@@ -0,0 +1,45 @@
+"""
+Import-time budget for the bot entry point (python -X importtime)
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# Imported on first use or by the post-startup warm-up, never at import time
+DEFERRED_MODULES = ["google.generativeai", "google.api_core", "grpc", "docx", "bs4", "requests"]
+
+# Generous cumulative budget; override on slow CI runners
+BUDGET_MS = int(os.environ.get("IMPORT_BUDGET_MS", "1500"))
+
+def _importtime(module: str):
+    """Return {module: cumulative_us} for a fresh interpreter importing module"""
+    env = dict(os.environ)
+    env.setdefault("TELEGRAM_TOKEN", "test")
+    env.setdefault("GEMINI_API_KEY", "test")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+@pytest.fixture(scope="module")
+def bot_manager_imports():
+    return _importtime("src.core.bot_manager")
+
+@pytest.mark.parametrize("module", DEFERRED_MODULES)
+def test_heavy_module_not_imported(bot_manager_imports, module):
+    assert module not in bot_manager_imports
+
+def test_import_within_budget(bot_manager_imports):
+    assert bot_manager_imports["src.core.bot_manager"] / 1000 < BUDGET_MS
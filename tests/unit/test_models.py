@@ -0,0 +1,85 @@
+"""
+Unit tests for session models
+"""
+import asyncio
+import pytest
+from src.models.segment import SegmentSession
+from src.models.user import ChatSession
+from src.core.conversation_handler import SessionManager
+
+class TestChatSession:
+    def test_slots_prevent_extra_attributes(self):
+        """Test sessions stay compact"""
+        session = ChatSession(1)
+        with pytest.raises(AttributeError):
+            session.extra = "value"
+
+    def test_add_headlines_count_cap(self):
+        """Test headline buffering stops at the count cap"""
+        session = ChatSession(1)
+        accepted = session.add_headlines(["a", "b", "c"], max_count=2, max_chars=100)
+        assert accepted == 2
+        assert session.headlines == ["a", "b"]
+
+    def test_add_headlines_char_cap(self):
+        """Test headline buffering stops at the character cap"""
+        session = ChatSession(1)
+        accepted = session.add_headlines(["aaaa", "bbbb"], max_count=10, max_chars=6)
+        assert accepted == 1
+        assert session.headline_chars == 4
+
+    def test_segment_prefs(self):
+        """Test segment answers map to SegmentService prefs"""
+        session = ChatSession(1)
+        segment = session.start_segment("ಯೋಗ")
+        segment.info_source = "🧠 ಕೇವಲ AI ಜ್ಞಾನ"
+        prefs = segment.to_prefs()
+        assert prefs['topic'] == "ಯೋಗ"
+        assert prefs['info_source'] == "🧠 ಕೇವಲ AI ಜ್ಞಾನ"
+        assert isinstance(session.segment, SegmentSession)
+
+class TestSessionManager:
+    def test_expire_idle(self):
+        """Test idle sessions are expired and counted"""
+        manager = SessionManager(idle_timeout=60)
+        manager.get(1).touch(now=0)
+        manager.get(2).touch(now=100)
+        assert manager.live_sessions == 2
+        assert manager.expire_idle(now=120) == 1
+        assert manager.peek(1) is None
+        assert manager.peek(2) is not None
+
+    def test_end_session(self):
+        """Test ending a session releases it"""
+        manager = SessionManager(idle_timeout=60)
+        manager.get(1).add_headlines(["a"], 10, 100)
+        manager.end(1)
+        assert manager.live_sessions == 0
+
+class TestSegmentSession:
+    @pytest.mark.asyncio
+    async def test_clear_cancels_prefetch(self):
+        """Test aborting a flow cancels its background research"""
+        session = ChatSession(1)
+        segment = session.start_segment("ಬಜೆಟ್")
+        task = asyncio.create_task(asyncio.sleep(10))
+        segment.prefetch = task
+        session.clear()
+        await asyncio.sleep(0)
+        assert task.cancelled()
+
+    @pytest.mark.asyncio
+    async def test_clear_headlines_cancels_eager_generations(self):
+        """Test cancelling Speed 50 drops generations started during pasting"""
+        session = ChatSession(1)
+        session.add_headlines(["a", "b"], 10, 100)
+        tasks = {i: asyncio.create_task(asyncio.sleep(10)) for i in range(2)}
+        session.eager.update(tasks)
+        taken = session.take_eager()
+        session.eager[1] = tasks[1]
+        session.clear_headlines()
+        await asyncio.sleep(0)
+        assert taken[0] is tasks[0] and not tasks[0].cancelled()
+        assert tasks[1].cancelled()
+        assert session.eager == {}
+        tasks[0].cancel()
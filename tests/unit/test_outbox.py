@@ -0,0 +1,112 @@
+"""
+Unit tests for the outbound send scheduler
+"""
+import asyncio
+import pytest
+from telegram.error import RetryAfter
+from src.core.outbox import BATCH, INTERACTIVE, Outbox
+
+class TestOutbox:
+    @pytest.mark.asyncio
+    async def test_per_chat_order_preserved(self):
+        box = Outbox(global_rate=1000, chat_rate=1000, chat_burst=100)
+        sent = []
+
+        async def send(i):
+            await asyncio.sleep(0.001 * (5 - i))
+            sent.append(i)
+            return i
+
+        results = await asyncio.gather(*(box.submit(1, lambda i=i: send(i)) for i in range(5)))
+        assert results == [0, 1, 2, 3, 4]
+        assert sent == [0, 1, 2, 3, 4]
+        await box.close()
+
+    @pytest.mark.asyncio
+    async def test_chat_rate_limited(self):
+        box = Outbox(global_rate=1000, chat_rate=20, chat_burst=1)
+        loop = asyncio.get_running_loop()
+        times = []
+
+        async def send():
+            times.append(loop.time())
+
+        await asyncio.gather(*(box.submit(1, send) for _ in range(4)))
+        assert times[-1] - times[0] >= 3 / 20 * 0.9
+        await box.close()
+
+    @pytest.mark.asyncio
+    async def test_interactive_before_batch(self):
+        box = Outbox(global_rate=5, chat_rate=1000, chat_burst=100)
+        order = []
+
+        async def send(tag):
+            order.append(tag)
+
+        # Drain the global burst so later jobs have to compete for tokens
+        await asyncio.gather(*(box.submit(100 + i, lambda: send("warm")) for i in range(5)))
+        batch = [box.submit(200 + i, lambda: send("batch"), BATCH) for i in range(3)]
+        interactive = [box.submit(300 + i, lambda: send("interactive"), INTERACTIVE) for i in range(2)]
+        await asyncio.gather(*batch, *interactive)
+        assert order[5:7] == ["interactive", "interactive"]
+        await box.close()
+
+    @pytest.mark.asyncio
+    async def test_retry_after_is_retried(self):
+        box = Outbox(global_rate=1000, chat_rate=1000, chat_burst=100, max_retries=2)
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise RetryAfter(0)
+            return "ok"
+
+        assert await box.submit(1, flaky) == "ok"
+        assert len(calls) == 2
+        assert box.stats()["retry_after"] == 1
+        await box.close()
+
+    @pytest.mark.asyncio
+    async def test_retry_after_for_cancelled_submitter(self):
+        box = Outbox(global_rate=1000, chat_rate=1000, chat_burst=100, max_retries=0)
+        started = asyncio.Event()
+        release = asyncio.Event()
+        calls = []
+
+        async def flood():
+            calls.append(1)
+            started.set()
+            await release.wait()
+            raise RetryAfter(0)
+
+        submitter = asyncio.ensure_future(box.submit(1, flood))
+        await started.wait()
+        submitter.cancel()
+        deliveries = list(box._deliveries)
+        release.set()
+        await asyncio.sleep(0.05)
+        # No InvalidStateError in the delivery task, and nothing resent
+        assert [task.exception() for task in deliveries] == [None]
+        assert box.stats()["retry_after"] == 1
+        assert len(calls) == 1
+        assert await box.submit(1, lambda: asyncio.sleep(0, "next")) == "next"
+        await box.close()
+
+    @pytest.mark.asyncio
+    async def test_send_text_splits_long_text(self):
+        box = Outbox(global_rate=1000, chat_rate=1000, chat_burst=100)
+
+        class Bot:
+            def __init__(self):
+                self.texts = []
+
+            async def send_message(self, chat_id, text):
+                self.texts.append(text)
+
+        bot = Bot()
+        text = " ".join(f"ವಾಕ್ಯ {i}." for i in range(2000))
+        await box.send_text(bot, 1, text)
+        assert len(bot.texts) > 1
+        assert " ".join(bot.texts) == text
+        await box.close()
@@ -0,0 +1,281 @@
+"""
+Unit tests for scale-out replicas sharing a SQLite state store
+"""
+import asyncio
+import json
+import threading
+from unittest.mock import AsyncMock, MagicMock
+import pytest
+from telegram import Bot
+from src.core.lanes import ChatOrderedUpdateProcessor
+from src.core.replicas import ReplicaCoordinator, ReplicaRunner, shard_for, shard_owner
+from src.services.state_store import SQLiteStateStore, StateStore
+
+SHARDS = 16
+TTL = 15
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "state.db")
+
+def _replica(store_path, name):
+    # Each replica gets its own store connection, as separate processes would
+    return ReplicaCoordinator(SQLiteStateStore(store_path), name, shard_count=SHARDS, lease_ttl=TTL)
+
+def _settle(replicas, now):
+    # Two rounds: releases from the first round are picked up in the second
+    for _ in range(2):
+        for replica in replicas:
+            replica.rebalance(now)
+
+class TestReplicaCoordinator:
+    def test_single_replica_owns_everything(self, store_path):
+        a = _replica(store_path, "a")
+        a.rebalance(1000)
+        assert a.owned == set(range(SHARDS))
+        assert a.is_poller
+
+    def test_replicas_split_shards_and_one_polls(self, store_path):
+        replicas = [_replica(store_path, name) for name in ("a", "b", "c")]
+        _settle(replicas, 1000)
+        owned = [r.owned for r in replicas]
+        assert set().union(*owned) == set(range(SHARDS))
+        assert sum(len(o) for o in owned) == SHARDS
+        assert all(owned)
+        assert sum(r.is_poller for r in replicas) == 1
+        chat_id = 123456789
+        assert sum(r.owns(chat_id) for r in replicas) == 1
+
+    def test_failover_after_lease_expiry(self, store_path):
+        a, b = _replica(store_path, "a"), _replica(store_path, "b")
+        _settle([a, b], 1000)
+        assert a.is_poller
+        # a stops heartbeating; b takes over once a's leases expire
+        b.rebalance(1000 + TTL / 2)
+        assert b.owned == {s for s in range(SHARDS) if shard_owner(s, ["a", "b"]) == "b"}
+        b.rebalance(1000 + TTL + 1)
+        assert b.owned == set(range(SHARDS))
+        assert b.is_poller
+
+    def test_joining_replica_only_takes_shards(self, store_path):
+        replicas = [_replica(store_path, name) for name in ("a", "b", "c")]
+        _settle(replicas, 1000)
+        before = {r.replica_id: set(r.owned) for r in replicas}
+        d = _replica(store_path, "d")
+        _settle(replicas + [d], 1001)
+        # Existing replicas only lose shards to the newcomer, never to each other
+        for r in replicas:
+            assert r.owned <= before[r.replica_id]
+        assert set().union(*(r.owned for r in replicas + [d])) == set(range(SHARDS))
+        assert len(d.owned) < SHARDS // 2
+
+    def test_clean_shutdown_hands_over_immediately(self, store_path):
+        a, b = _replica(store_path, "a"), _replica(store_path, "b")
+        _settle([a, b], 1000)
+        a.release_all()
+        a.store.heartbeat("a", 0)
+        b.rebalance(1001)
+        assert b.owned == set(range(SHARDS))
+
+class TestSQLiteStateStore:
+    def test_partial_backend_fails_at_construction(self):
+        class HeartbeatOnly(StateStore):
+            def heartbeat(self, replica_id, now):
+                pass
+
+        with pytest.raises(TypeError):
+            HeartbeatOnly()
+
+    def test_claim_is_exclusive(self, store_path):
+        store = SQLiteStateStore(store_path)
+        for i in range(200):
+            store.enqueue(shard_for(i, SHARDS), i, f"update-{i}")
+
+        claimed = []
+        def consume():
+            own = SQLiteStateStore(store_path)
+            owner = threading.current_thread().name
+            while True:
+                rows = own.claim(range(SHARDS), 7, owner, TTL, 1000)
+                if not rows:
+                    return
+                claimed.extend(payload for _, _, payload in rows)
+                own.ack([row_id for row_id, _, _ in rows], owner)
+
+        threads = [threading.Thread(target=consume) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(claimed) == sorted(f"update-{i}" for i in range(200))
+
+    def test_claim_only_requested_shards_in_order(self, store_path):
+        store = SQLiteStateStore(store_path)
+        store.enqueue(1, 10, "first")
+        store.enqueue(2, 20, "other")
+        store.enqueue(1, 10, "second")
+        rows = store.claim([1], 10, "a", TTL, 1000)
+        assert [(chat_id, payload) for _, chat_id, payload in rows] == [(10, "first"), (10, "second")]
+        assert store.claim([1], 10, "a", TTL, 1000) == []
+
+    def test_unacked_claim_is_handed_out_again(self, store_path):
+        a, b = SQLiteStateStore(store_path), SQLiteStateStore(store_path)
+        a.enqueue(1, 10, "first")
+        a.enqueue(1, 10, "second")
+        (first, _, _), (second, _, _) = a.claim([1], 10, "a", TTL, 1000)
+        a.renew_claims([first], "a", TTL, 1000 + TTL / 2)
+        # a dies: the renewed claim holds, the other expires and goes to b
+        assert [payload for _, _, payload in b.claim([1], 10, "b", TTL, 1000 + TTL)] == ["second"]
+        assert b.claim([1], 10, "b", TTL, 1000 + TTL * 1.5) == [(first, 10, "first")]
+        # Only the current holder can ack
+        a.ack([first, second], "a")
+        b.ack([first], "b")
+        assert b.claim([1], 10, "b", TTL, 1000 + TTL * 4) == [(second, 10, "second")]
+
+    def test_released_claim_is_available_at_once(self, store_path):
+        store = SQLiteStateStore(store_path)
+        store.enqueue(1, 10, "update")
+        (row_id, _, _), = store.claim([1], 10, "a", TTL, 1000)
+        store.release_claims([row_id], "a")
+        assert store.claim([1], 10, "b", TTL, 1000) == [(row_id, 10, "update")]
+
+    def test_queue_from_before_claim_leases_is_migrated(self, store_path):
+        import sqlite3
+        conn = sqlite3.connect(store_path)
+        conn.execute(
+            "CREATE TABLE updates (id INTEGER PRIMARY KEY AUTOINCREMENT, shard INTEGER NOT NULL, "
+            "chat_id INTEGER NOT NULL, payload TEXT NOT NULL)"
+        )
+        conn.execute("INSERT INTO updates (shard, chat_id, payload) VALUES (1, 10, 'old')")
+        conn.commit()
+        conn.close()
+        store = SQLiteStateStore(store_path)
+        assert [payload for _, _, payload in store.claim([1], 10, "a", TTL, 1000)] == ["old"]
+
+    def test_rate_limit_shared_across_replicas(self, store_path):
+        a, b = SQLiteStateStore(store_path), SQLiteStateStore(store_path)
+        results = [store.take_token("chat:1", rate=1, capacity=3, now=100) for store in (a, b, a, b)]
+        assert results == [True, True, True, False]
+        assert b.take_token("chat:1", rate=1, capacity=3, now=101)
+
+    def test_counter_windows(self, store_path):
+        a, b = SQLiteStateStore(store_path), SQLiteStateStore(store_path)
+        assert a.incr_counter("quota:1", 5, 60, now=0) == 5
+        assert b.incr_counter("quota:1", 3, 60, now=30) == 8
+        assert a.incr_counter("quota:1", 1, 60, now=61) == 1
+
+
+def _message(update_id, chat_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": "hi",
+            "chat": {"id": chat_id, "type": "private"},
+        },
+    }
+
+def _runner(store_path, name, process_update):
+    app = MagicMock()
+    app.bot = Bot("123:abc")
+    app.update_processor = ChatOrderedUpdateProcessor(8)
+    app.process_update = process_update
+    coordinator = ReplicaCoordinator(SQLiteStateStore(store_path), name, shard_count=SHARDS, lease_ttl=TTL)
+    coordinator.rebalance()
+    return ReplicaRunner(app, coordinator, coordinator.store)
+
+class TestReplicaRunner:
+    @pytest.mark.asyncio
+    async def test_update_is_acked_only_after_handling(self, store_path):
+        gate = asyncio.Event()
+        handled = []
+
+        async def process_update(update):
+            await gate.wait()
+            handled.append(update.update_id)
+
+        runner = _runner(store_path, "a", process_update)
+        store = runner.store
+        store.enqueue(shard_for(5, SHARDS), 5, json.dumps(_message(1, 5)))
+        consume = asyncio.create_task(runner._consume_loop())
+        try:
+            for _ in range(100):
+                if runner._held:
+                    break
+                await asyncio.sleep(0.01)
+            # Claimed but still being handled: nobody else may take it, and it is not gone
+            assert store.claim(range(SHARDS), 10, "b", TTL, 0) == []
+            gate.set()
+            for _ in range(100):
+                if not runner._held:
+                    break
+                await asyncio.sleep(0.01)
+            assert handled == [1]
+            assert store.claim(range(SHARDS), 10, "b", TTL, 10 ** 10) == []
+        finally:
+            consume.cancel()
+            await asyncio.gather(consume, return_exceptions=True)
+
+    @pytest.mark.asyncio
+    async def test_no_new_claims_while_updates_wait(self, store_path):
+        gate = asyncio.Event()
+        handled = []
+
+        async def process_update(update):
+            await gate.wait()
+            handled.append(update.update_id)
+
+        runner = _runner(store_path, "a", process_update)
+        runner.app.update_processor = ChatOrderedUpdateProcessor(1)
+        store = runner.store
+        for i in range(3):
+            store.enqueue(shard_for(i, SHARDS), i, json.dumps(_message(i, i)))
+        consume = asyncio.create_task(runner._consume_loop())
+        try:
+            await asyncio.sleep(0.1)
+            claimed = set(runner._held)
+            store.enqueue(shard_for(9, SHARDS), 9, json.dumps(_message(9, 9)))
+            await asyncio.sleep(0.5)
+            # One update is being handled, the others wait for the processor: no new batch
+            assert len(claimed) == 3 and runner._held == claimed
+            gate.set()
+            for _ in range(100):
+                if len(handled) == 4 and not runner._held:
+                    break
+                await asyncio.sleep(0.01)
+            assert sorted(handled) == [0, 1, 2, 9]
+            assert store.claim(range(SHARDS), 10, "b", TTL, 10 ** 10) == []
+        finally:
+            consume.cancel()
+            await asyncio.gather(consume, return_exceptions=True)
+
+    @pytest.mark.asyncio
+    async def test_waiting_updates_for_moved_shards_are_released(self, store_path):
+        gate = asyncio.Event()
+        handled = []
+
+        async def process_update(update):
+            handled.append(update.update_id)
+            await gate.wait()
+
+        runner = _runner(store_path, "a", process_update)
+        runner.app.update_processor = ChatOrderedUpdateProcessor(1)
+        store = runner.store
+        store.enqueue(shard_for(1, SHARDS), 1, json.dumps(_message(1, 1)))
+        store.enqueue(shard_for(2, SHARDS), 2, json.dumps(_message(2, 2)))
+        consume = asyncio.create_task(runner._consume_loop())
+        try:
+            for _ in range(100):
+                if handled:
+                    break
+                await asyncio.sleep(0.01)
+            assert handled == [1]
+            runner.coordinator.owned.discard(shard_for(2, SHARDS))
+            await runner._drop_moved()
+            rows = store.claim(range(SHARDS), 10, "b", TTL, 0)
+            assert [chat_id for _, chat_id, _ in rows] == [2]
+            gate.set()
+            await asyncio.sleep(0.1)
+            assert handled == [1]
+        finally:
+            consume.cancel()
+            await asyncio.gather(consume, return_exceptions=True)
@@ -0,0 +1,204 @@
+"""
+Unit tests for article retrieval, using local fixture pages
+"""
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from src.config.settings import settings
+from src.services.prewarm_service import ResearchPrewarmer, TopicHistory, seconds_until_next_prewarm
+from src.services.search_service import ArticleFetcher, HTTPCache, SearchCache, extract_main_text
+
+ARTICLE_PAGE = b"""<html><head><title>Rain</title><script>var x = 1;</script></head><body>
+<nav><p>Home | Politics | Sports | Karnataka | Business | Entertainment</p></nav>
+<article>
+  <h1>Heavy rain in Bengaluru</h1>
+  <p>Heavy rain lashed Bengaluru on Monday evening, flooding several underpasses in the city.</p>
+  <p>Share</p>
+  <p>The weather department has forecast more showers across south interior Karnataka this week.</p>
+</article>
+<footer><p>Copyright 2024 Example News Private Limited. All rights reserved worldwide.</p></footer>
+</body></html>"""
+
+PLAIN_PAGE = """<html><body>
+<div class="sidebar"><p>Trending: ten stories you should not miss this weekend at all</p></div>
+<div class="story">
+  <p>ಬೆಂಗಳೂರಿನಲ್ಲಿ ಸೋಮವಾರ ಸಂಜೆ ಭಾರಿ ಮಳೆಯಾಗಿದ್ದು, ನಗರದ ಹಲವು ಅಂಡರ್‌ಪಾಸ್‌ಗಳು ಜಲಾವೃತಗೊಂಡಿವೆ.</p>
+  <p>ಈ ವಾರ ದಕ್ಷಿಣ ಒಳನಾಡಿನಲ್ಲಿ ಇನ್ನಷ್ಟು ಮಳೆಯಾಗುವ ಸಾಧ್ಯತೆ ಇದೆ ಎಂದು ಹವಾಮಾನ ಇಲಾಖೆ ತಿಳಿಸಿದೆ.</p>
+</div>
+</body></html>""".encode("utf-8")
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    pages = {"/article": ARTICLE_PAGE, "/plain": PLAIN_PAGE, "/big": b"<p>" + b"x" * 200000 + b"</p>"}
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append((self.path, self.headers.get("If-None-Match")))
+        body = self.pages.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = f'"{self.path}-v1"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def fixture_server():
+    _FixtureHandler.requests_seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+class TestExtractMainText:
+    def test_prefers_article_element(self):
+        text = extract_main_text(ARTICLE_PAGE)
+        assert "flooding several underpasses" in text
+        assert "forecast more showers" in text
+        assert "Share" not in text
+        assert "Copyright" not in text
+        assert "var x" not in text
+
+    def test_falls_back_to_densest_paragraph_block(self):
+        text = extract_main_text(PLAIN_PAGE)
+        assert text.startswith("ಬೆಂಗಳೂರಿನಲ್ಲಿ")
+        assert "Trending" not in text
+
+    def test_caps_characters(self):
+        assert len(extract_main_text(ARTICLE_PAGE, max_chars=50)) == 50
+
+    def test_empty_input(self):
+        assert extract_main_text(b"") == ""
+
+class TestArticleFetcher:
+    @pytest.fixture
+    def fetcher(self, tmp_path):
+        return ArticleFetcher(cache=HTTPCache(str(tmp_path / "cache"), fresh_seconds=0), max_bytes=4096)
+
+    def test_conditional_request_uses_etag(self, fetcher, fixture_server):
+        url = f"{fixture_server}/article"
+        first = fetcher.fetch(url)
+        second = fetcher.fetch(url)
+
+        assert "flooding several underpasses" in first
+        assert second == first
+        assert _FixtureHandler.requests_seen == [("/article", None), ("/article", '"/article-v1"')]
+        assert fetcher.cache.cache_stats() == {"hits": 1, "misses": 1, "revalidated": 1}
+
+    def test_fresh_entry_skips_network(self, tmp_path, fixture_server):
+        fetcher = ArticleFetcher(cache=HTTPCache(str(tmp_path / "cache"), fresh_seconds=3600))
+        url = f"{fixture_server}/plain"
+        fetcher.fetch(url)
+        fetcher.fetch(url)
+        assert len(_FixtureHandler.requests_seen) == 1
+
+    def test_body_is_capped(self, fetcher, fixture_server):
+        text = fetcher.fetch(f"{fixture_server}/big")
+        assert len(text) <= 4096
+
+    def test_failures_return_empty(self, fetcher, fixture_server):
+        assert fetcher.fetch(f"{fixture_server}/missing") == ""
+        assert fetcher.fetch("http://127.0.0.1:1/unreachable") == ""
+
+    @pytest.mark.asyncio
+    async def test_fetch_many(self, fetcher, fixture_server):
+        urls = [f"{fixture_server}/article", f"{fixture_server}/plain", f"{fixture_server}/missing"]
+        articles = await fetcher.fetch_many(urls)
+        assert set(articles) == set(urls[:2])
+
+    def test_flush_clears_disk_cache(self, fetcher, fixture_server):
+        url = f"{fixture_server}/article"
+        fetcher.fetch(url)
+        fetcher.cache.flush()
+        assert fetcher.cache.get(url) is None
+
+class TestSearchCache:
+    def test_topics_match_loosely_and_expire(self):
+        cache = SearchCache(max_entries=2, ttl=60)
+        hits = [{"title": "t", "snippet": "s", "url": "https://example.com/a"}]
+        cache.put("Karnataka  Budget", hits, now=0)
+        assert cache.get("karnataka budget", now=30) == hits
+        assert cache.get("karnataka budget", now=61) is None
+        cache.put("budget", hits, now=0, ttl=3600)
+        assert cache.get("budget", now=61) == hits
+
+    def test_bounded(self):
+        cache = SearchCache(max_entries=2, ttl=60)
+        for topic in ("a", "b", "c"):
+            cache.put(topic, [], now=0)
+        assert cache.get("a", now=1) is None
+        assert cache.cache_stats()["entries"] == 2
+
+class TestResearchPrewarmer:
+    @pytest.fixture
+    def history(self, tmp_path):
+        return TopicHistory(str(tmp_path / "bot.db"))
+
+    def test_top_topics_from_recent_history(self, history):
+        day = 86400
+        for _ in range(3):
+            history.record("ಮುಂಗಾರು", now=10 * day)
+        history.record("Budget ", now=10 * day)
+        history.record("budget", now=9 * day)
+        for _ in range(5):
+            history.record("ಚುನಾವಣೆ", now=1 * day)
+        assert history.top(5, days=7, now=10 * day) == ["ಮುಂಗಾರು", "budget"]
+        assert history.top(1, days=30, now=10 * day) == ["ಚುನಾವಣೆ"]
+        assert history.prune(7, now=10 * day) == 1
+
+    @pytest.mark.asyncio
+    async def test_run_refreshes_configured_then_recurring_topics(self, history):
+        history.record("ಇಂದಿನ ರಾಜಕೀಯ")
+        history.record("ಯೋಗದ ಲಾಭಗಳು")
+        history.record("Monsoon")
+        service = AsyncMock()
+        service.classify_topic_type = MagicMock(
+            side_effect=lambda topic: "factual" if "ರಾಜಕೀಯ" in topic else "general"
+        )
+        prewarmer = ResearchPrewarmer(service, history)
+        with patch.object(settings, "prewarm_topics", ["monsoon", "ಬಜೆಟ್"]), \
+                patch.object(settings, "prewarm_times", ["06:30"]):
+            report = await prewarmer.run(budget=10, pause=0)
+        topics = [call.args[0] for call in service.web_research.await_args_list]
+        # Configured topics first; of the history, only topics the segment flow would search
+        assert topics == ["monsoon", "ಬಜೆಟ್", "ಇಂದಿನ ರಾಜಕೀಯ"]
+        for call in service.web_research.await_args_list:
+            assert call.kwargs["refresh"] is True
+            # Warm hits last until the next run, never less than the live TTL
+            assert settings.search_cache_ttl_seconds <= call.kwargs["ttl"] <= 86400 + 10
+        assert report["warmed"] == 3
+
+    def test_next_prewarm(self):
+        now = datetime(2024, 6, 1, 7, 0).astimezone()
+        with patch.object(settings, "prewarm_times", ["06:30", "16:30"]):
+            assert seconds_until_next_prewarm(now) == 9.5 * 3600
+        with patch.object(settings, "prewarm_times", ["06:30"]):
+            assert seconds_until_next_prewarm(now) == 23.5 * 3600
+        with patch.object(settings, "prewarm_times", []):
+            assert seconds_until_next_prewarm(now) is None
+
+    @pytest.mark.asyncio
+    async def test_run_stops_at_budget(self, history):
+        service = AsyncMock()
+        prewarmer = ResearchPrewarmer(service, history)
+        with patch.object(settings, "prewarm_topics", ["a", "b", "c"]):
+            report = await prewarmer.run(budget=0.1, pause=0.06)
+        assert report["warmed"] == 2
+        assert report["topics"] == 3
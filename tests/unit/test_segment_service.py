@@ -2,8 +2,9 @@
 Unit tests for segment service
 """
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from src.services.segment_service import SegmentService
+from src.models.segment import SegmentResearch
 
 class TestSegmentService:
     @pytest.fixture
@@ -36,21 +37,21 @@ class TestSegmentService:
         assert result["sections"] == 5
         assert result["detail"] == "comprehensive"
     
-    @patch('src.services.segment_service.requests.get')
-    def test_search_duckduckgo_success(self, mock_get, segment_service):
+    @patch('src.services.segment_service.http_session')
+    def test_search_duckduckgo_success(self, mock_session, segment_service):
         """Test successful web search"""
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.content = b'<html><body></body></html>'
-        mock_get.return_value = mock_response
+        mock_session.return_value.get.return_value = mock_response
         
         result = segment_service.search_duckduckgo("test topic")
         assert isinstance(result, str)
     
-    @patch('src.services.segment_service.requests.get')
-    def test_search_duckduckgo_failure(self, mock_get, segment_service):
+    @patch('src.services.segment_service.http_session')
+    def test_search_duckduckgo_failure(self, mock_session, segment_service):
         """Test web search failure handling"""
-        mock_get.side_effect = Exception("Network error")
+        mock_session.return_value.get.side_effect = Exception("Network error")
         
         result = segment_service.search_duckduckgo("test topic")
         assert result == ""
@@ -74,4 +75,96 @@ class TestSegmentService:
         
         assert segment_text == "Generated segment content"
         assert isinstance(category, str)
-        assert isinstance(sources, str)
\ No newline at end of file
+        assert isinstance(sources, str)
+    
+    @pytest.mark.asyncio
+    async def test_prefetch_research_general_topic(self, segment_service):
+        """Test prefetch skips the web search for general topics"""
+        with patch.object(segment_service, 'search_duckduckgo') as mock_search:
+            research = await segment_service.prefetch_research("ಯೋಗದ ಪ್ರಯೋಜನಗಳು")
+        mock_search.assert_not_called()
+        assert research.topic_type == "general"
+        assert research.web_results is None
+    
+    @pytest.mark.asyncio
+    async def test_generate_custom_segment_reuses_research(self, segment_service):
+        """Test prefetched web results are reused instead of searching again"""
+        user_prefs = {
+            'topic': 'ಇಂದಿನ ರಾಜಕೀಯ ಸುದ್ದಿ',
+            'content_type': '📰 ಇತ್ತೀಚಿನ ಸುದ್ದಿ/ಘಟನೆಗಳು',
+            'info_source': '🔍 ವೆಬ್ ಸರ್ಚ್ + AI ಜ್ಞಾನ',
+            'detail_level': '📋 ಮಧ್ಯಮ ವಿವರಣೆ',
+            'presentation_style': '📺 ಟಿವಿ ನ್ಯೂಸ್ ಶೈಲಿ',
+            'content_richness': '📝 ಉದಾಹರಣೆಗಳೊಂದಿಗೆ'
+        }
+        research = SegmentResearch(user_prefs['topic'], "factual", "politics", "Title: cached")
+        segment_service.ai_service = MagicMock()
+        segment_service.ai_service.agenerate_strict = AsyncMock(return_value="Generated segment content.")
+        
+        with patch.object(segment_service, 'search_duckduckgo') as mock_search:
+            segment_text, category, sources = await segment_service.generate_custom_segment(
+                user_prefs, 5, research
+            )
+        
+        mock_search.assert_not_called()
+        assert "Title: cached" in segment_service.ai_service.agenerate_strict.call_args_list[0][0][0]
+        assert category == "politics"
+    
+    @pytest.mark.asyncio
+    async def test_short_segment_is_continued(self, segment_service):
+        """Test a short segment gets a continuation appended instead of a redo"""
+        segment_service.ai_service = MagicMock()
+        segment_service.ai_service.agenerate_strict = AsyncMock(return_value="ಎರಡನೇ ಭಾಗ. " * 50)
+        
+        text = await segment_service.complete_to_length("ಯೋಗ", 2, "ಮೊದಲ ಭಾಗ. " * 100, 300)
+        
+        assert segment_service.ai_service.agenerate_strict.await_count == 1
+        prompt = segment_service.ai_service.agenerate_strict.call_args[0][0]
+        assert "ಮೊದಲ ಭಾಗ" in prompt
+        assert segment_service.ai_service.agenerate_strict.call_args.kwargs["target_words"] == 300
+        assert text.startswith("ಮೊದಲ ಭಾಗ.")
+        assert "ಎರಡನೇ ಭಾಗ" in text
+    
+    @pytest.mark.asyncio
+    async def test_truncated_segment_is_completed_within_budget(self, segment_service):
+        """Test continuation stops after the configured number of attempts"""
+        segment_service.ai_service = MagicMock()
+        segment_service.ai_service.agenerate_strict = AsyncMock(return_value="ಇನ್ನಷ್ಟು ಪದಗಳು")
+        
+        with patch('src.services.segment_service.settings') as mock_settings:
+            mock_settings.segment_continuation_attempts = 2
+            mock_settings.segment_length_tolerance = 0.85
+            text = await segment_service.complete_to_length("ಯೋಗ", 5, "ಯೋಗವು ಆರೋಗ್ಯಕ್ಕೆ", 750)
+        
+        assert segment_service.ai_service.agenerate_strict.await_count == 2
+        assert text == "ಯೋಗವು ಆರೋಗ್ಯಕ್ಕೆ ಇನ್ನಷ್ಟು ಪದಗಳು ಇನ್ನಷ್ಟು ಪದಗಳು"
+    
+    @pytest.mark.asyncio
+    async def test_full_length_segment_untouched(self, segment_service):
+        """Test output that meets the target is not continued"""
+        segment_service.ai_service = MagicMock()
+        segment_service.ai_service.agenerate_strict = AsyncMock()
+        text = "ಪದ ಪದ ಪದ. " * 100
+        
+        assert await segment_service.complete_to_length("ಯೋಗ", 2, text, 300) == text
+        segment_service.ai_service.agenerate_strict.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_web_research_includes_articles(self, segment_service):
+        """Test fetched article text is added under its search result"""
+        results = [
+            {"title": "Rain", "snippet": "Heavy rain", "url": "https://www.thehindu.com/rain"},
+            {"title": "Traffic", "snippet": "Jams", "url": "https://www.ndtv.com/traffic"},
+        ]
+        with patch.object(segment_service, 'search_results', return_value=results), \
+                patch('src.services.segment_service.article_fetcher') as mock_fetcher:
+            mock_fetcher.fetch_many = AsyncMock(return_value={"https://www.thehindu.com/rain": "Full article text"})
+            web_results = await segment_service.web_research("ಮಳೆ")
+        
+        assert "Article:\nFull article text" in web_results
+        assert "Source: https://www.ndtv.com/traffic" in web_results
+    
+    def test_result_url_unwraps_redirect(self, segment_service):
+        """Test DuckDuckGo redirect links resolve to the article URL"""
+        href = "//duckduckgo.com/l/?uddg=https%3A%2F%2Fwww.thehindu.com%2Fnews%2Frain&rut=abc"
+        assert segment_service._result_url(href) == "https://www.thehindu.com/news/rain"
@@ -1,10 +1,27 @@
 """
 Unit tests for services
 """
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
 import pytest
-from unittest.mock import patch, MagicMock
-from src.services.ai_service import AIService
+from unittest.mock import patch, MagicMock, AsyncMock
+from google.api_core import exceptions as google_exceptions
+from src.services.ai_service import AIService, PKG_INSTRUCTIONS
+from src.services.ai_resilience import CircuitBreaker, DailyQuotaError, LatencyTracker, QuotaExceededError
+from src.services.model_router import ModelRouter, RouteStats
+from src.services.prompt_cache import PromptCache
 from src.services.category_detector import CategoryDetector
+from src.services.category_classifier import CategoryModel, load_samples
+from src.services.backup_service import BackupService, BackupError
+from src.services.translation_service import TranslationCache, TranslationService, split_sections
+from src.services.semantic_cache import SemanticCache, cosine, ngram_vector
+from src.services.usage_service import UsageLedger
+from src.services.state_store import SQLiteStateStore
+from src.config.settings import settings
 
 class TestAIService:
     @pytest.fixture
@@ -58,4 +75,516 @@ class TestCategoryDetector:
         """Test default category for unknown content"""
         content = "unknown content"
         result = category_detector.detect_category("", content)
-        assert result == "general"
\ No newline at end of file
+        assert result == "general"
+
+class TestCategoryClassifier:
+    @pytest.fixture(scope="class")
+    def model(self):
+        return CategoryModel.train(load_samples(settings.category_samples_path))
+
+    def test_predicts_training_labels(self, model):
+        texts = ["ಬಸ್ ಅಪಘಾತದಲ್ಲಿ ಇಬ್ಬರು ಸಾವು", "ಸಿನಿಮಾ ಬಿಡುಗಡೆ ದಿನಾಂಕ ಘೋಷಣೆ"]
+        labels = [label for label, _ in model.predict(texts)]
+        assert labels == ["accidents", "cinema"]
+
+    def test_posteriors_are_probabilities(self, model):
+        for _, confidence in model.predict(["ರಾಜಕೀಯ ಪಕ್ಷದ ಸಭೆ", "unknown content", ""]):
+            assert 0.0 < confidence <= 1.0
+
+    def test_save_load_roundtrip(self, model, tmp_path):
+        path = tmp_path / "category.bin"
+        model.save(str(path))
+        loaded = CategoryModel.load(str(path))
+        assert loaded.labels == model.labels
+        texts = ["ಪೊಲೀಸರಿಂದ ಆರೋಪಿ ಬಂಧನ", "ಬ್ಯಾಂಕ್ ಬಡ್ಡಿ ದರ ಇಳಿಕೆ"]
+        assert loaded.predict(texts) == model.predict(texts)
+
+    def test_load_rejects_other_files(self, tmp_path):
+        path = tmp_path / "category.bin"
+        path.write_bytes(b"not a model at all")
+        with pytest.raises(ValueError):
+            CategoryModel.load(str(path))
+
+    def test_detector_batches_and_falls_back(self, model):
+        detector = CategoryDetector(model)
+        texts = ["ಬಸ್ ಅಪಘಾತದಲ್ಲಿ ಇಬ್ಬರು ಸಾವು", "unknown content"]
+        with patch.object(settings, "category_min_confidence", 1.01):
+            assert detector.detect_categories(texts) == ["accidents", "general"]
+        with patch.object(settings, "category_min_confidence", 0.0):
+            assert detector.detect_categories(texts)[0] == "accidents"
+        assert detector.detect_category("sports", "ಬಸ್ ಅಪಘಾತ") == "sports"
+class TestAIResilience:
+    @pytest.fixture
+    def ai_service(self):
+        with patch('src.services.ai_service.genai.configure'):
+            with patch('src.services.ai_service.genai.GenerativeModel'):
+                service = AIService()
+                service.warm_up()
+        service.latency = LatencyTracker()
+        service.breaker = CircuitBreaker(failure_ratio=0.5, min_calls=2, window=4, reset_seconds=60)
+        return service
+    
+    def test_latency_percentile(self):
+        """Test rolling percentile calculation"""
+        tracker = LatencyTracker()
+        for value in range(1, 101):
+            tracker.record("av", value / 100)
+        assert tracker.percentile("av", 95) == pytest.approx(0.95, abs=0.01)
+        assert tracker.percentile("pkg", 95) is None
+    
+    def test_quota_error_is_typed(self, ai_service):
+        """Test quota errors map to the quota message without string sniffing"""
+        ai_service.model.generate_content.side_effect = google_exceptions.ResourceExhausted("limit")
+        result = ai_service.generate_content("test prompt")
+        assert "API ಮಿತಿ" in result
+        assert ai_service.breaker.error_counts == {"QuotaExceededError": 1}
+    
+    def test_breaker_switches_to_fallback(self, ai_service):
+        """Test an open breaker routes calls to the fallback model"""
+        ai_service.model.generate_content.side_effect = google_exceptions.ServiceUnavailable("down")
+        ai_service.generate_content("p")
+        ai_service.generate_content("p")
+        assert ai_service.breaker.state == CircuitBreaker.OPEN
+        
+        ai_service.fallback_model = MagicMock()
+        ai_service.fallback_model.generate_content.return_value.text = "fallback"
+        assert ai_service.generate_content("p") == "fallback"
+        
+        ai_service.fallback_model = None
+        assert "ತಾತ್ಕಾಲಿಕ ತೊಂದರೆ" in ai_service.generate_content("p")
+    
+    def test_half_open_probe_is_released_by_bad_request(self, ai_service):
+        """Test a probe failing on bad input does not leave the breaker stuck half-open"""
+        breaker = CircuitBreaker(min_calls=2, window=4, reset_seconds=1)
+        breaker.record_failure(0)
+        breaker.record_failure(0)
+        assert breaker.allow(5) and not breaker.allow(5.5)
+        breaker.release()
+        assert breaker.allow(5.5)
+        # An unresolved probe expires after reset_seconds
+        assert not breaker.allow(6) and breaker.allow(6.5)
+        
+        ai_service.breaker = breaker
+        ai_service.model.generate_content.side_effect = google_exceptions.InvalidArgument("bad")
+        breaker.release()
+        ai_service.generate_content("p")
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        ai_service.model.generate_content.side_effect = None
+        ai_service.model.generate_content.return_value.text = "ok"
+        assert ai_service.generate_content("p") == "ok"
+        assert breaker.state == CircuitBreaker.CLOSED
+    
+    def test_hedge_fires_after_tail_latency(self, ai_service):
+        """Test a slow call is hedged and the faster duplicate wins"""
+        for _ in range(30):
+            ai_service.latency.record("av", 0.01)
+        release = threading.Event()
+        calls = []
+        
+        def slow_then_fast(prompt, safety_settings=None):
+            calls.append(prompt)
+            response = MagicMock()
+            if len(calls) == 1:
+                release.wait(2)
+                response.text = "slow"
+            else:
+                response.text = "fast"
+            return response
+        
+        ai_service.model.generate_content.side_effect = slow_then_fast
+        assert ai_service.generate_content("p", "av") == "fast"
+        assert ai_service.hedges_fired == 1
+        release.set()
+
+class TestUsageLedger:
+    @pytest.fixture
+    def ledger(self, tmp_path):
+        return UsageLedger(db_path=str(tmp_path / "bot.db"), flush_batch=100)
+
+    @pytest.fixture
+    def ai_service(self, ledger):
+        with patch('src.services.ai_service.genai.configure'):
+            with patch('src.services.ai_service.genai.GenerativeModel'):
+                service = AIService()
+                service.warm_up()
+        service.latency = LatencyTracker()
+        service.breaker = CircuitBreaker()
+        service.usage = ledger
+        response = MagicMock()
+        response.text = "script"
+        response.usage_metadata.prompt_token_count = 120
+        response.usage_metadata.candidates_token_count = 30
+        response.usage_metadata.total_token_count = 150
+        service.model.generate_content.return_value = response
+        return service
+
+    def test_calls_are_booked_per_chat_and_flow(self, ai_service, ledger):
+        ai_service.generate_content("p", "av", chat_id=7)
+        ai_service.generate_content("p", "av", chat_id=7)
+        ai_service.generate_content("p", "pkg", chat_id=8)
+        summary = ledger.summary()
+        assert summary["av"]["calls"] == 2
+        assert summary["av"]["prompt_tokens"] == 240
+        assert summary["av"]["candidate_tokens"] == 60
+        assert summary["pkg"]["total_tokens"] == 150
+        assert ledger.used_today(7) == 300
+
+    def test_flush_batches_rows_into_sqlite(self, ledger):
+        ledger.record(7, "av", 100, 20, 120, 0.5)
+        ledger.record(7, "av", 100, 20, 120, 0.5)
+        ledger.record(8, "speed50", 10, 5, 15, 0.1)
+        assert ledger.flush() == 2
+        assert ledger.flush() == 0
+        ledger.record(7, "av", 1, 1, 2, 0.1)
+        ledger.flush()
+        with sqlite3.connect(ledger.db_path) as conn:
+            rows = conn.execute(
+                "SELECT chat_id, flow, calls, total_tokens, latency_ms FROM token_usage ORDER BY chat_id"
+            ).fetchall()
+        assert rows == [(7, "av", 3, 242, 1100), (8, "speed50", 1, 15, 100)]
+
+    def test_flush_when_batch_is_full(self, tmp_path):
+        ledger = UsageLedger(db_path=str(tmp_path / "bot.db"), flush_batch=2)
+        ledger.record(1, "av", 1, 1, 2, 0.1)
+        assert ledger.flushed_rows == 0
+        ledger.record(2, "av", 1, 1, 2, 0.1)
+        assert ledger.flushed_rows == 2
+
+    def test_quota_blocks_before_the_call(self, ai_service, ledger):
+        with patch.object(settings, "usage_daily_token_quota", 200):
+            assert ai_service.generate_content("p", "av", chat_id=7) == "script"
+            assert ai_service.generate_content("p", "av", chat_id=7) == "script"
+            calls = ai_service.model.generate_content.call_count
+            result = ai_service.generate_content("p", "av", chat_id=7)
+            assert "ಮಿತಿ" in result
+            assert ai_service.model.generate_content.call_count == calls
+            assert ledger.quota_rejections == 1
+            # Other chats and calls outside a chat are unaffected
+            assert ai_service.generate_content("p", "av", chat_id=8) == "script"
+            assert ai_service.generate_content("p", "av") == "script"
+        assert ai_service.breaker.state == CircuitBreaker.CLOSED
+
+    def test_quota_survives_restart(self, ledger):
+        ledger.record(7, "av", 100, 50, 150, 0.2)
+        ledger.flush()
+        restarted = UsageLedger(db_path=str(ledger.db_path))
+        with patch.object(settings, "usage_quota_overrides", {7: 150}):
+            with pytest.raises(DailyQuotaError):
+                restarted.check_quota(7)
+            restarted.check_quota(8)
+
+    def test_quota_is_shared_across_replicas(self, tmp_path):
+        store = SQLiteStateStore(str(tmp_path / "state.db"))
+        a = UsageLedger(db_path=str(tmp_path / "a.db"))
+        b = UsageLedger(db_path=str(tmp_path / "b.db"))
+        a.attach_store(store)
+        b.attach_store(SQLiteStateStore(str(tmp_path / "state.db")))
+        with patch.object(settings, "usage_daily_token_quota", 200):
+            a.record(7, "av", 100, 20, 120, 0.5, now=1000)
+            b.record(7, "av", 100, 20, 120, 0.5, now=1000)
+            assert a.used_today(7, now=1000) == b.used_today(7, now=1000) == 240
+            with pytest.raises(DailyQuotaError):
+                b.check_quota(7, now=1000)
+            assert b.used_today(7, now=1000 + 86400) == 0
+
+class TestModelRouter:
+    @pytest.fixture
+    def router(self):
+        with patch('src.services.model_router.genai.GenerativeModel'):
+            return ModelRouter()
+    
+    def test_speed50_uses_quick_route(self, router):
+        """Test short Speed 50 prompts go to the quick model"""
+        assert router.select("speed50", 500).name == "quick"
+    
+    def test_segment_routes_by_target_length(self, router):
+        """Test segment length picks the short or long route"""
+        assert router.select("segment", 3000, target_words=300).name == "segment_short"
+        assert router.select("segment", 3000, target_words=2250).name == "segment_long"
+    
+    def test_unknown_flow_uses_default(self, router):
+        """Test unmatched flows fall through to the default route"""
+        assert router.select("other", 100).name == "default"
+    
+    def test_route_stats(self, router):
+        """Test per-route latency and cost accounting"""
+        stats = RouteStats()
+        route = router.select("pkg", 100)
+        stats.record(route, 1.5, input_tokens=1000, output_tokens=1000)
+        snapshot = stats.snapshot()["package"]
+        assert snapshot["calls"] == 1
+        assert snapshot["p95"] == 1.5
+        assert snapshot["cost"] == pytest.approx(route.cost(1000, 1000))
+
+class StubCacheClient:
+    """Stands in for the Gemini caching API"""
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.created = []
+        self.refreshed = 0
+        self.model = MagicMock()
+    
+    def create(self, model_name, name, text, ttl_seconds):
+        if self.fail:
+            raise RuntimeError("Cached content is too small")
+        self.created.append((model_name, name))
+        return MagicMock(name=f"cachedContents/{name}")
+    
+    def refresh(self, handle, ttl_seconds):
+        self.refreshed += 1
+    
+    def model_from(self, handle, generation_config=None):
+        return self.model
+
+class TestPromptCache:
+    def test_create_once_and_refresh_before_ttl(self):
+        """Test prefixes are uploaded once and refreshed inside the margin"""
+        client = StubCacheClient()
+        cache = PromptCache(client=client, ttl_seconds=100, refresh_margin=10, min_tokens=0)
+        cache.enabled = True
+        cache.register("pkg", "STATIC")
+        assert cache.model_for("pkg", "models/m", now=0) is client.model
+        assert cache.model_for("pkg", "models/m", now=50) is client.model
+        assert len(client.created) == 1
+        cache.model_for("pkg", "models/m", now=95)
+        assert client.refreshed == 1
+        assert len(client.created) == 1
+    
+    def test_failure_falls_back_locally(self):
+        """Test unavailable caching returns None and backs off"""
+        client = StubCacheClient(fail=True)
+        cache = PromptCache(client=client, ttl_seconds=100, refresh_margin=10, retry_seconds=60, min_tokens=0)
+        cache.enabled = True
+        cache.register("pkg", "STATIC")
+        assert cache.model_for("pkg", "models/m", now=0) is None
+        client.fail = False
+        assert cache.model_for("pkg", "models/m", now=30) is None
+        assert cache.model_for("pkg", "models/m", now=61) is client.model
+    
+    def test_small_prefix_is_never_uploaded(self):
+        """Test prefixes below the API minimum are sent inline without a create call"""
+        client = StubCacheClient()
+        cache = PromptCache(client=client, min_tokens=1000)
+        cache.enabled = True
+        cache.register("pkg", "STATIC")
+        assert cache.model_for("pkg", "models/m", now=0) is None
+        assert client.created == []
+        assert cache.cache_stats()["too_small"] == 1
+    
+    def test_upload_does_not_block_other_callers(self):
+        """Test callers arriving during an upload fall back instead of waiting on it"""
+        client = StubCacheClient()
+        uploading, release = threading.Event(), threading.Event()
+        create = client.create
+        
+        def slow_create(*args):
+            uploading.set()
+            release.wait(2)
+            return create(*args)
+        
+        client.create = slow_create
+        cache = PromptCache(client=client, ttl_seconds=100, refresh_margin=10, min_tokens=0)
+        cache.enabled = True
+        cache.register("pkg", "STATIC")
+        results = []
+        uploader = threading.Thread(target=lambda: results.append(cache.model_for("pkg", "models/m", now=0)))
+        uploader.start()
+        assert uploading.wait(2)
+        assert cache.model_for("pkg", "models/m", now=0) is None
+        release.set()
+        uploader.join(2)
+        assert results == [client.model]
+        assert len(client.created) == 1
+    
+    def test_ai_service_sends_only_variable_part(self):
+        """Test a cached prefix is not resent with the prompt"""
+        with patch('src.services.ai_service.genai.configure'):
+            with patch('src.services.ai_service.genai.GenerativeModel'):
+                service = AIService()
+                service.warm_up()
+        client = StubCacheClient()
+        client.model.generate_content.return_value.text = "PKG"
+        service.prompt_cache = PromptCache(client=client, min_tokens=0)
+        service.prompt_cache.enabled = True
+        service.prompt_cache.register("pkg", PKG_INSTRUCTIONS)
+        
+        prompt = service.generate_pkg_prompt("politics", "ಸುದ್ದಿ")
+        assert service.generate_content(prompt, "pkg", cached_prefix="pkg") == "PKG"
+        sent = client.model.generate_content.call_args[0][0]
+        assert PKG_INSTRUCTIONS not in sent
+        assert "ಸುದ್ದಿ" in sent
+
+
+class TestBackupService:
+    @pytest.fixture
+    def service(self, tmp_path):
+        db = tmp_path / "bot.db"
+        conn = sqlite3.connect(db)
+        conn.execute("CREATE TABLE t (v TEXT)")
+        conn.execute("INSERT INTO t VALUES ('ಕನ್ನಡ')")
+        conn.commit()
+        conn.close()
+        (tmp_path / "templates").mkdir()
+        (tmp_path / "templates" / "a.txt").write_text("template")
+        (tmp_path / "exports").mkdir()
+        with patch.object(settings, 'database_url', f"sqlite:///{db}"), \
+             patch.object(settings, 'templates_dir', str(tmp_path / "templates")), \
+             patch.object(settings, 'exports_dir', str(tmp_path / "exports")):
+            yield BackupService(backup_dir=str(tmp_path / "backups"), keep=2)
+
+    def test_incremental_skips_unchanged(self, service):
+        first = service.run_backup(datetime(2024, 1, 1))
+        second = service.run_backup(datetime(2024, 1, 2))
+        assert first["archive"] is not None
+        assert second["archive"] is None
+        assert second["files"] == first["files"]
+
+    def test_restore_verifies_and_follows_chain(self, service, tmp_path):
+        service.run_backup(datetime(2024, 1, 1))
+        (tmp_path / "templates" / "b.txt").write_text("new")
+        service.run_backup(datetime(2024, 1, 2))
+        restored = service.restore(str(tmp_path / "restore"))
+        assert sorted(restored) == ["db/bot.db", "templates/a.txt", "templates/b.txt"]
+        conn = sqlite3.connect(tmp_path / "restore" / "db" / "bot.db")
+        assert conn.execute("SELECT v FROM t").fetchone()[0] == "ಕನ್ನಡ"
+        conn.close()
+
+    def test_prune_keeps_referenced_archives(self, service, tmp_path):
+        service.run_backup(datetime(2024, 1, 1))
+        for day in (2, 3, 4):
+            (tmp_path / "templates" / "a.txt").write_text(f"template {day}")
+            service.run_backup(datetime(2024, 1, day))
+        archives = sorted(p.name for p in service.backup_dir.glob("*.tar.gz"))
+        # Day 1 still holds the unchanged db; day 2's a.txt was superseded
+        assert archives == ["backup-20240101T000000.tar.gz", "backup-20240103T000000.tar.gz",
+                            "backup-20240104T000000.tar.gz"]
+        assert len(service.manifests()) == 2
+        service.restore(str(tmp_path / "restore"))
+
+    def test_restore_detects_corruption(self, service, tmp_path):
+        manifest = service.run_backup(datetime(2024, 1, 1))
+        path = service.manifests()[-1]
+        manifest["files"]["templates/a.txt"]["sha256"] = "0" * 64
+        path.write_text(json.dumps(manifest))
+        with pytest.raises(BackupError):
+            service.restore(str(tmp_path / "restore"))
+
+
+class TestTranslationService:
+    @pytest.fixture
+    def service(self):
+        ai_service = MagicMock()
+        return TranslationService(ai_service, cache=TranslationCache(100))
+
+    def test_split_sections_at_mic_markers(self):
+        script = "🎙 ಆಂಕರ್ ಇಂಟ್ರೋ:\n" + "ಅ" * 50 + "\n🎙 ಹಿನ್ನೆಲೆ:\n" + "ಬ" * 50 + "\n"
+        chunks = split_sections(script, max_chars=80)
+        assert len(chunks) == 2
+        assert all(chunk.startswith("🎙") for chunk in chunks)
+        assert "".join(chunks) == script
+        assert split_sections(script, max_chars=1000) == [script]
+
+    def test_split_unmarked_long_script_at_paragraphs(self):
+        paragraph = "ಇದು ಒಂದು ವಾಕ್ಯ. " * 20
+        script = "\n\n".join([paragraph] * 12)
+        chunks = split_sections(script, max_chars=1000)
+        assert len(chunks) > 1
+        assert all(len(chunk) <= 1000 for chunk in chunks)
+        assert "".join(chunks) == script
+        # Paragraphs are kept whole when they fit
+        assert all(chunk.rstrip().endswith(".") for chunk in chunks)
+
+    @pytest.mark.asyncio
+    async def test_languages_translate_concurrently(self, service):
+        async def slow_translate(prompt, prompt_class, chat_id=None):
+            await asyncio.sleep(0.2)
+            return "translated"
+        service.ai_service.agenerate_strict = slow_translate
+
+        start = time.monotonic()
+        result = await service.translate("🎙 ವರದಿ:\nಸುದ್ದಿ", ["english", "hindi", "telugu"])
+        assert time.monotonic() - start < 0.4
+        assert result == {"english": "translated", "hindi": "translated", "telugu": "translated"}
+
+    @pytest.mark.asyncio
+    async def test_cached_by_content_hash(self, service):
+        service.ai_service.agenerate_strict = AsyncMock(return_value="hello")
+        await service.translate("ಸುದ್ದಿ", ["english"])
+        await service.translate("ಸುದ್ದಿ", ["english"])
+        assert service.ai_service.agenerate_strict.await_count == 1
+        assert service.cache.cache_stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_language_is_none(self, service):
+        async def flaky(prompt, prompt_class, chat_id=None):
+            if "Hindi" in prompt:
+                raise QuotaExceededError("quota")
+            return "ok"
+        service.ai_service.agenerate_strict = flaky
+        result = await service.translate("ಸುದ್ದಿ", ["english", "hindi"])
+        assert result == {"english": "ok", "hindi": None}
+
+class TestSemanticCache:
+    STORY = (
+        "ಬೆಂಗಳೂರಿನಲ್ಲಿ ಸೋಮವಾರ ಸಂಜೆ ಭಾರಿ ಮಳೆಯಾಗಿದ್ದು, ನಗರದ 12 ಅಂಡರ್‌ಪಾಸ್‌ಗಳು ಜಲಾವೃತಗೊಂಡಿವೆ. "
+        "ಈ ವಾರ ದಕ್ಷಿಣ ಒಳನಾಡಿನಲ್ಲಿ ಇನ್ನಷ್ಟು ಮಳೆಯಾಗುವ ಸಾಧ್ಯತೆ ಇದೆ ಎಂದು ಹವಾಮಾನ ಇಲಾಖೆ ತಿಳಿಸಿದೆ."
+    )
+    OTHER = "ಮೈಸೂರು ದಸರಾ ಉತ್ಸವಕ್ಕೆ ಸಿದ್ಧತೆ ಭರದಿಂದ ಸಾಗಿದ್ದು, ಜಂಬೂ ಸವಾರಿಗೆ ಆನೆಗಳ ತಾಲೀಮು ಆರಂಭವಾಗಿದೆ."
+
+    @pytest.fixture
+    def cache(self):
+        cache = SemanticCache(max_entries=3)
+        cache.store("av", self.STORY, "script")
+        return cache
+
+    def test_near_match_hits(self, cache):
+        edited = self.STORY.replace("12", "14").replace(",", "")
+        value, similarity = cache.lookup("av", edited, 0.9)
+        assert value == "script"
+        assert 0.9 <= similarity < 1.0
+
+    def test_reordered_sentences_hit(self, cache):
+        first, second = self.STORY.split(". ")
+        assert cache.lookup("av", f"{second} {first}.", 0.9) is not None
+
+    def test_different_story_misses(self, cache):
+        assert cache.lookup("av", self.OTHER, 0.9) is None
+        assert cache.cache_stats()["misses"] == 1
+
+    def test_flows_are_separate(self, cache):
+        assert cache.lookup("pkg", self.STORY, 0.9) is None
+
+    def test_bounded_and_evicts_from_index(self, cache):
+        for i in range(3):
+            cache.store("av", f"{self.OTHER} {i}", f"other {i}")
+        assert cache.cache_stats()["entries"] == 3
+        assert cache.lookup("av", self.STORY, 0.9) is None
+        assert all(("av", 1) not in bucket for bucket in cache._buckets.values())
+
+    def test_similarity_of_vectors(self):
+        assert cosine(ngram_vector(self.STORY), ngram_vector(self.STORY)) == pytest.approx(1.0, abs=1e-5)
+        assert cosine(ngram_vector(self.STORY), ngram_vector(self.OTHER)) < 0.5
+
+    @pytest.mark.asyncio
+    async def test_agenerate_reusable_flags_reuse(self):
+        service = AIService()
+        service.agenerate_strict = AsyncMock(return_value=" fresh script ")
+        cache = SemanticCache(max_entries=10)
+        with patch('src.services.ai_service.semantic_cache', cache):
+            first = await service.agenerate_reusable("prompt", "av", self.STORY)
+            second = await service.agenerate_reusable("prompt", "av", self.STORY.replace("12", "13"))
+            unknown = await service.agenerate_reusable("prompt", "unlisted", self.STORY)
+        assert first == ("fresh script", None)
+        assert second[0] == "fresh script" and second[1] is not None
+        assert unknown == ("fresh script", None)
+        assert service.agenerate_strict.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_agenerate_reusable_does_not_cache_errors(self):
+        service = AIService()
+        service.agenerate_strict = AsyncMock(side_effect=QuotaExceededError("quota"))
+        cache = SemanticCache(max_entries=10)
+        with patch('src.services.ai_service.semantic_cache', cache):
+            text, reused = await service.agenerate_reusable("prompt", "av", self.STORY)
+        assert reused is None
+        assert cache.cache_stats()["entries"] == 0
@@ -0,0 +1,119 @@
+"""
+Unit tests for update middleware (rate limit, traffic recording) and trace replay
+"""
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop
+from src.config.constants import MENU_SPEED50
+from src.config.settings import settings
+from src.core.middleware import SLOW_DOWN_MESSAGE, ChatRateLimiter, TrafficRecorder
+from src.core.replay import TraceReplayer, compare, load_trace
+
+def make_update(text=None, document=None, chat_id=42):
+    message = {"message_id": 1, "date": 0, "chat": {"id": chat_id, "type": "private"}}
+    if text is not None:
+        message["text"] = text
+    if document is not None:
+        message["document"] = document
+    return Update.de_json({"update_id": 1, "message": message}, None)
+
+class TestChatRateLimiter:
+    async def _flood(self, limiter, count, chat_id=42):
+        """Returns (handled, replies) for count updates from one chat"""
+        context = MagicMock()
+        handled = 0
+        with patch("src.core.middleware.outbox.send_text", new=AsyncMock()) as send_text:
+            for _ in range(count):
+                try:
+                    await limiter.check(make_update("hi", chat_id=chat_id), context)
+                    handled += 1
+                except ApplicationHandlerStop:
+                    pass
+        return handled, [call.args[2] for call in send_text.call_args_list]
+
+    @pytest.mark.asyncio
+    async def test_over_limit_updates_stop_with_one_reply(self):
+        limiter = ChatRateLimiter(per_minute=3)
+        handled, replies = await self._flood(limiter, 6)
+        assert handled == 3
+        assert replies == [SLOW_DOWN_MESSAGE]
+        assert limiter.limited == 3
+
+    @pytest.mark.asyncio
+    async def test_admin_chats_are_not_limited(self):
+        limiter = ChatRateLimiter(per_minute=3)
+        with patch.object(settings, "admin_chat_ids", [42]):
+            handled, replies = await self._flood(limiter, 6)
+        assert handled == 6 and replies == []
+
+    @pytest.mark.asyncio
+    async def test_shared_store_keeps_the_budget_across_replicas(self, tmp_path):
+        from src.services.state_store import SQLiteStateStore
+        path = str(tmp_path / "state.db")
+        first, second = ChatRateLimiter(per_minute=3), ChatRateLimiter(per_minute=3)
+        first.attach_store(SQLiteStateStore(path))
+        second.attach_store(SQLiteStateStore(path))
+        assert (await self._flood(first, 2))[0] == 2
+        handled, replies = await self._flood(second, 2)
+        assert handled == 1 and replies == [SLOW_DOWN_MESSAGE]
+
+class TestTrafficRecorder:
+    def test_free_text_is_reduced_to_its_shape(self, tmp_path):
+        recorder = TrafficRecorder(str(tmp_path), salt="s")
+        text = "ಮೊದಲ ಶೀರ್ಷಿಕೆ\nಎರಡನೇ ಶೀರ್ಷಿಕೆ"
+        record = recorder.describe(make_update(text))
+        assert record == {"k": "u", "c": recorder.chat_alias(42), "s": "text", "n": len(text), "l": 2, "h": 2}
+        assert "42" not in record["c"]
+
+    def test_choices_commands_and_documents(self, tmp_path):
+        recorder = TrafficRecorder(str(tmp_path), salt="s")
+        assert recorder.describe(make_update(MENU_SPEED50))["v"] == MENU_SPEED50
+        assert recorder.describe(make_update("/start@news_bot now"))["v"] == "/start"
+        document = {"file_id": "f", "file_unique_id": "u", "file_name": "ಸುದ್ದಿ.DOCX", "file_size": 5120}
+        record = recorder.describe(make_update(document=document))
+        assert (record["s"], record["x"], record["b"]) == ("document", ".docx", 5120)
+        assert "file_name" not in json.dumps(record)
+
+    def test_alias_is_stable_only_with_a_salt(self, tmp_path):
+        assert TrafficRecorder(str(tmp_path), salt="s").chat_alias(7) == TrafficRecorder(str(tmp_path), salt="s").chat_alias(7)
+        assert TrafficRecorder(str(tmp_path), salt="").chat_alias(7) != TrafficRecorder(str(tmp_path), salt="").chat_alias(7)
+
+    def test_flush_writes_header_then_records(self, tmp_path):
+        recorder = TrafficRecorder(str(tmp_path), salt="s", flush_every=100)
+        recorder.record_model_call(42, "speed50", 1.25, 900, 300)
+        recorder.record_model_call(42, "av", 0.5, 900, 0, error="GeminiTimeoutError")
+        assert recorder.flush() == 2
+        updates, calls = load_trace([str(recorder.path_for())])
+        lines = recorder.path_for().read_text(encoding="utf-8").splitlines()
+        assert json.loads(lines[0]) == {"k": "h", "v": 1}
+        assert updates == []
+        assert [(call["f"], call["ms"], call.get("e")) for call in calls] == [
+            ("speed50", 1250, None), ("av", 500, "GeminiTimeoutError"),
+        ]
+
+class TestTraceReplay:
+    def test_compare_p95(self):
+        baseline = {"latency_ms": {"all": {"p95": 200.0}, "text": {"p95": 50.0}}}
+        report = {"latency_ms": {"all": {"p95": 250.0}, "choice": {"p95": 3.0}}}
+        assert compare(baseline, report) == [("all", 200.0, 250.0, 25.0)]
+
+    @pytest.mark.asyncio
+    async def test_replays_speed50_batch_through_the_bot(self, tmp_path):
+        chat = "c0ffee"
+        updates = [
+            {"k": "u", "c": chat, "s": "command", "v": "/start", "t": 0.0},
+            {"k": "u", "c": chat, "s": "text", "v": MENU_SPEED50, "t": 0.1},
+            {"k": "u", "c": chat, "s": "text", "v": "📋 Paste Headlines", "t": 0.2},
+            {"k": "u", "c": chat, "s": "text", "n": 120, "l": 3, "h": 3, "t": 0.3},
+            {"k": "u", "c": chat, "s": "text", "v": "done", "t": 0.4},
+        ]
+        calls = [{"k": "m", "c": chat, "f": "speed50", "t": 0.4, "ms": 5, "in": 900, "out": 200}]
+        with patch.object(settings, "log_file", str(tmp_path / "bot.log")):
+            report = await TraceReplayer(updates, calls, speed=0).run()
+
+        assert report["handled"] == 5
+        assert report["model_calls"] == 3
+        assert report["telegram_calls"]["sendDocument"] == 1
+        assert set(report["latency_ms"]) == {"command", "choice", "headlines", "all"}
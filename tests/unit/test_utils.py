@@ -0,0 +1,234 @@
+"""
+Unit tests for utilities
+"""
+import json
+import logging
+import os
+import queue
+import pytest
+from unittest.mock import patch
+from src.config.settings import settings
+from src.utils.docx_writer import shared_template
+from src.utils.file_manager import FileManager
+from src.utils.formatter import split_message, utf16_len
+from src.utils.text_processor import count_words, format_reading_time, reading_time_seconds, verify_length
+from src.utils.validator import InputValidator
+from src.utils.logger import ErrorSampler, JsonFormatter, NonBlockingQueueHandler, TextFormatter
+
+def _record(msg="Search error: %s", args=("boom",), level=logging.ERROR, **extra):
+    record = logging.LogRecord("src.test", level, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+class TestLogging:
+    def test_sampler_limits_repeated_template(self):
+        sampler = ErrorSampler(burst=3, window=60)
+        with patch('src.utils.logger.time.monotonic', return_value=0.0):
+            passed = [sampler.filter(_record(args=(i,))) for i in range(10)]
+        assert passed.count(True) == 3
+
+    def test_sampler_reports_suppressed_after_window(self):
+        sampler = ErrorSampler(burst=1, window=60)
+        with patch('src.utils.logger.time.monotonic', return_value=0.0):
+            sampler.filter(_record())
+            sampler.filter(_record())
+            sampler.filter(_record())
+        record = _record()
+        with patch('src.utils.logger.time.monotonic', return_value=61.0):
+            assert sampler.filter(record)
+        assert record.suppressed == 2
+
+    def test_sampler_ignores_info(self):
+        sampler = ErrorSampler(burst=1, window=60)
+        assert all(sampler.filter(_record(level=logging.INFO)) for _ in range(5))
+
+    def test_json_formatter_includes_context(self):
+        line = JsonFormatter().format(_record(chat_id=42, flow="segment", latency_ms=120))
+        entry = json.loads(line)
+        assert entry["msg"] == "Search error: boom"
+        assert entry["chat_id"] == 42
+        assert entry["flow"] == "segment"
+        assert entry["latency_ms"] == 120
+
+    def test_text_formatter_appends_context(self):
+        line = TextFormatter("%(message)s").format(_record(flow="speed50"))
+        assert line == "Search error: boom [flow=speed50]"
+
+    def test_queue_handler_drops_when_full(self):
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+        handler.handle(_record())
+        handler.handle(_record())
+        assert handler.dropped == 1
+
+class TestDocxExport:
+    @pytest.fixture
+    def file_manager(self, tmp_path):
+        with patch.object(settings, 'exports_dir', str(tmp_path / "exports")), \
+             patch.object(settings, 'uploads_dir', str(tmp_path / "uploads")), \
+             patch.object(settings, 'templates_dir', str(tmp_path / "templates")), \
+             patch.object(settings, 'export_format', "docx"):
+            yield FileManager()
+
+    def test_news_script_uses_template_styles(self, file_manager):
+        from docx import Document
+        filename = file_manager.export_filename("news_output_1")
+        path = file_manager.assemble_output_file("News Script", "ರಾಜಕೀಯ", "AV ಸಾಲು", "PKG 1\nPKG 2 <&>", filename)
+        paragraphs = [(p.style.name, p.text) for p in Document(path).paragraphs]
+        assert filename == "news_output_1.docx"
+        assert ("Heading 1", "SPEED 50") in paragraphs
+        assert paragraphs[-2:] == [("Normal", "PKG 1"), ("Normal", "PKG 2 <&>")]
+        assert not list(file_manager.exports_dir.glob("*.part"))
+
+    def test_custom_template_content_is_kept(self, file_manager, tmp_path):
+        from docx import Document
+        template = Document()
+        template.add_paragraph("ಸುದ್ದಿ ವಾಹಿನಿ")
+        (tmp_path / "templates").mkdir()
+        template.save(str(tmp_path / "templates" / settings.docx_template))
+        assert shared_template() is shared_template()
+
+        path = file_manager.write_speed50_file(
+            [f"ಶೀರ್ಷಿಕೆ {i}" for i in range(300)], [f"AV {i}" for i in range(300)], "speed50.docx"
+        )
+        texts = [p.text for p in Document(path).paragraphs]
+        assert texts[0] == "ಸುದ್ದಿ ವಾಹಿನಿ"
+        assert texts[-2:] == ["300. ಶೀರ್ಷಿಕೆ 299", "AV 299"]
+
+class TestExportSweep:
+    @pytest.fixture
+    def file_manager(self, tmp_path):
+        with patch.object(settings, 'exports_dir', str(tmp_path / "exports")), \
+             patch.object(settings, 'uploads_dir', str(tmp_path / "uploads")):
+            yield FileManager()
+
+    def _write(self, directory, name, size, last_used):
+        path = directory / name
+        path.write_bytes(b"x" * size)
+        os.utime(path, (last_used, last_used))
+        return path
+
+    def test_removes_expired_files(self, file_manager):
+        old = self._write(file_manager.exports_dir, "old.txt", 100, 0)
+        fresh = self._write(file_manager.exports_dir, "fresh.txt", 100, 99_900)
+        with patch.object(settings, 'export_max_age_seconds', 3600):
+            report = file_manager.sweep_exports(now=100_000)
+        assert not old.exists()
+        assert fresh.exists()
+        assert report["removed"] == 1
+        assert report["reclaimed_bytes"] == 100
+
+    def test_count_cap_deletes_least_recently_used(self, file_manager):
+        paths = [self._write(file_manager.exports_dir, f"f{i}.txt", 10, 90_000 + i) for i in range(5)]
+        with patch.object(settings, 'export_max_files', 2):
+            file_manager.sweep_exports(now=100_000)
+        assert [p.exists() for p in paths] == [False, False, False, True, True]
+
+    def test_size_cap_spares_files_in_flight(self, file_manager):
+        old = self._write(file_manager.exports_dir, "old.txt", 600, 90_000)
+        sending = self._write(file_manager.exports_dir, "sending.txt", 600, 99_990)
+        with patch.object(settings, 'export_max_total_bytes', 1000):
+            file_manager.sweep_exports(now=100_000)
+        assert not old.exists()
+        assert sending.exists()
+
+    def test_gzip_retained(self, file_manager):
+        path = self._write(file_manager.exports_dir, "keep.txt", 5000, 99_000)
+        with patch.object(settings, 'export_gzip_retained', True):
+            report = file_manager.sweep_exports(now=100_000)
+        assert not path.exists()
+        assert (file_manager.exports_dir / "keep.txt.gz").exists()
+        assert report["compressed"] == 1
+        assert report["reclaimed_bytes"] > 0
+
+class TestSplitMessage:
+    def test_short_text_untouched(self):
+        assert split_message("ನಮಸ್ಕಾರ") == ["ನಮಸ್ಕಾರ"]
+
+    def test_splits_at_sections(self):
+        text = "🎙 ಆಂಕರ್ ಇಂಟ್ರೋ:\n" + "ಅ" * 60 + "\n🎙 ವರದಿ:\n" + "ಬ" * 60
+        chunks = split_message(text, limit=100)
+        assert len(chunks) == 2
+        assert chunks[1].startswith("🎙 ವರದಿ")
+
+    def test_splits_at_sentences_and_keeps_order(self):
+        sentences = [f"ವಾಕ್ಯ ಸಂಖ್ಯೆ {i} ಇಲ್ಲಿದೆ." for i in range(200)]
+        text = " ".join(sentences)
+        chunks = split_message(text, limit=500)
+        assert all(utf16_len(chunk) <= 500 for chunk in chunks)
+        assert all(chunk.endswith(".") for chunk in chunks)
+        assert " ".join(chunks) == text
+
+    def test_counts_emoji_as_two_units(self):
+        chunks = split_message("🎙" * 10, limit=4)
+        assert chunks == ["🎙🎙"] * 5
+
+    def test_hard_splits_unbroken_text(self):
+        chunks = split_message("ಕ" * 250, limit=100)
+        assert [len(c) for c in chunks] == [100, 100, 50]
+
+class TestTextProcessor:
+    def test_count_words_keeps_kannada_words_whole(self):
+        assert count_words("🎙 ಕನ್ನಡ ನಾಡಿನ 2024ರ ಸುದ್ದಿ • ಹೌದು।") == 5
+
+    def test_count_words_empty(self):
+        assert count_words("") == 0
+
+    def test_reading_time(self):
+        text = "ಪದ " * 300
+        assert reading_time_seconds(text) == 120
+        assert format_reading_time(120) == "2 ನಿಮಿಷಗಳು"
+        assert format_reading_time(90) == "1 ನಿಮಿಷ 30 ಸೆಕೆಂಡುಗಳು"
+
+    def test_verify_length(self):
+        check = verify_length("ಪದ " * 80 + "ಮುಗಿಯಿತು.", 100, 0.85)
+        assert check["ok"] is False
+        assert check["missing"] == 19
+        assert verify_length("ಪದ " * 90 + "ಮುಗಿಯಿತು.", 100, 0.85)["ok"] is True
+
+    def test_verify_length_flags_truncation(self):
+        check = verify_length("ಪದ " * 120, 100, 0.85)
+        assert check["truncated"] is True
+        assert check["ok"] is False
+
+class TestInputValidator:
+    @pytest.fixture
+    def validator(self):
+        return InputValidator(min_chars=20, max_chars=200, min_script_ratio=0.5, repeat_window=60)
+
+    def test_rejects_short_and_long_text(self, validator):
+        assert validator.check_text("👍") is not None
+        assert validator.check_text("ಸುದ್ದಿ " * 100) is not None
+        assert validator.rejected == {"too_short": 1, "too_long": 1}
+
+    def test_rejects_symbol_heavy_text(self, validator):
+        assert validator.check_text("🔥🔥🔥🔥🔥 12345 67890 !!!! ???? ಹೌದು") is not None
+
+    def test_accepts_kannada_and_english(self, validator):
+        assert validator.check_text("ಬೆಂಗಳೂರಿನಲ್ಲಿ ಇಂದು ಭಾರಿ ಮಳೆಯಾಗಿದೆ, ಸಂಚಾರ ಅಸ್ತವ್ಯಸ್ತ") is None
+        assert validator.check_text("Heavy rain lashed Bengaluru on Monday evening") is None
+
+    def test_clean_headlines_drops_junk(self, validator):
+        lines = [
+            "ರಾಜ್ಯದಲ್ಲಿ ಹೊಸ ಮೆಟ್ರೋ ಮಾರ್ಗ ಉದ್ಘಾಟನೆ",
+            "----------",
+            "++...++",
+            "12/05/2024",
+            "10:30 AM",
+            "ಪುಟ 3",
+            "ರಾಜ್ಯದಲ್ಲಿ  ಹೊಸ ಮೆಟ್ರೋ ಮಾರ್ಗ ಉದ್ಘಾಟನೆ",
+            "ಹೌದು",
+            "Farmers protest in Mandya over water release",
+        ]
+        kept, dropped = validator.clean_headlines(lines)
+        assert kept == [lines[0], lines[-1]]
+        assert dropped == 7
+
+    def test_repeat_detection(self, validator):
+        text = "ಬೆಂಗಳೂರಿನಲ್ಲಿ ಇಂದು ಭಾರಿ ಮಳೆ"
+        assert not validator.is_repeat(1, "news", text, now=0)
+        validator.remember(1, "news", text, now=0)
+        assert validator.is_repeat(1, "news", "  ಬೆಂಗಳೂರಿನಲ್ಲಿ ಇಂದು  ಭಾರಿ ಮಳೆ ", now=10)
+        assert not validator.is_repeat(2, "news", text, now=10)
+        assert not validator.is_repeat(1, "speed50", text, now=10)
+        assert not validator.is_repeat(1, "news", text, now=100)